@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+CV戦略ベンチマーク
+
+train_models と同じ特徴量・候補モデルで、各CV戦略（cv_harness.make_cv_splits）の
+所要時間・AUC（95%信頼区間）・選ばれる最良モデルを、全日 Leave-One-Day-Out と比較する。
+フォールドキャッシュは使わない（毎回すべて計算した時間を測る）。
+
+使い方:
+    python ml/benchmark_cv.py
+    python ml/benchmark_cv.py --folds 5 --n-jobs 1 --json cv_benchmark.json
+
+ANTHROPIC_API_KEY は不要（ローカルの ml/data/training_data.json を使用）。
+Claude特徴量はキャッシュ済みの分だけ使われる。
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import time
+from pathlib import Path
+
+ML_DIR = Path(__file__).parent
+sys.path.insert(0, str(ML_DIR))
+
+
+def prepare_recommender(data_path: Path):
+    """学習データを読み込んで特徴量を準備（ログは抑制）"""
+    # API 呼び出しを避けるため、ベンチマーク中は API キーを外す
+    os.environ.pop("ANTHROPIC_API_KEY", None)
+    from menu_recommender import MenuRecommender
+
+    recommender = MenuRecommender()
+    with contextlib.redirect_stdout(io.StringIO()):
+        recommender.load_data(str(data_path), use_supabase=False)
+        recommender.prepare_features()
+    return recommender
+
+
+def main():
+    from cv_harness import cross_validate_models, make_cv_splits
+
+    parser = argparse.ArgumentParser(description="CV戦略ベンチマーク")
+    parser.add_argument("--data", type=str, default=str(ML_DIR / "data" / "training_data.json"))
+    parser.add_argument("--folds", type=int, default=5, help="group_kfold / rolling / sampled のフォールド数")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="CVの並列数")
+    parser.add_argument("--json", type=str, default=None, help="結果を JSON で保存するパス")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("⏱️  CV戦略ベンチマーク")
+    print("=" * 70)
+
+    recommender = prepare_recommender(Path(args.data))
+    X = recommender.X
+    y, groups = recommender.y, recommender.groups
+    print(f"📊 {len(recommender.training_data)}日分 / {len(y)}行 / 特徴量 {X.shape[1]}")
+
+    strategies = ["lodo", "group_kfold", "rolling", "sampled"]
+    rows = []
+    for strategy in strategies:
+        _, splits = make_cv_splits(groups, strategy, n_splits=args.folds)
+        start = time.perf_counter()
+        results = cross_validate_models(
+            recommender._candidate_models(), X, y, groups, cv=splits, n_jobs=args.n_jobs, scale=True
+        )
+        elapsed = time.perf_counter() - start
+        # 全フォールドが評価できないモデル（平均 NaN）は除外（train_models と同じ）
+        means = {name: r["mean"] for name, r in results.items() if not math.isnan(r["mean"])}
+        best = max(means, key=means.get) if means else None
+        rows.append({
+            "strategy": strategy,
+            "folds": len(splits),
+            "seconds": elapsed,
+            "best_model": best,
+            "models": {
+                name: {k: r[k] for k in ("mean", "std", "ci_low", "ci_high", "n_folds")}
+                for name, r in results.items()
+            },
+        })
+
+    baseline = rows[0]
+    print(f"\n{'戦略':14s} {'fold':>5s} {'時間(s)':>8s} {'対LODO':>7s}  最良モデル")
+    print("-" * 70)
+    for row in rows:
+        same = "✅" if row["best_model"] == baseline["best_model"] else "⚠️ "
+        ratio = row["seconds"] / baseline["seconds"] if baseline["seconds"] else float("nan")
+        print(f"{row['strategy']:14s} {row['folds']:5d} {row['seconds']:8.2f} {ratio:6.2f}x  "
+              f"{same} {row['best_model'] or '（有効なCVスコアなし）'}")
+
+    print("\n📊 AUC-ROC 平均 [95%信頼区間]:")
+    for row in rows:
+        print(f"  {row['strategy']}:")
+        for name, m in row["models"].items():
+            print(f"     {name:20s} {m['mean']:.4f} [{m['ci_low']:.4f}, {m['ci_high']:.4f}]"
+                  f" ({m['n_folds']}fold)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"days": len(recommender.training_data), "rows": rows}, f,
+                      ensure_ascii=False, indent=2)
+        print(f"\n✅ 結果を保存: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+MLパイプラインのベンチマーク（合成データでのスケールアップ）
+
+ml/data/training_data.json をもとに、実データの 10倍・100倍・1000倍 の日数の合成学習データ
+（同じ栄養素キー、実メニュー名の単語分布から組み立てたメニュー名）を作り、各段階の時間を計測する:
+
+    claude_cache_load               Claude解析キャッシュの読み込み（合成メニュー数分のエントリ）
+    prepare_features                特徴量行列の構築
+    train_models                    CV + 最良モデルの学習（--max-train-rows を超える分は古い日を除外）
+    predict                         MenuRecommender.predict（1日分）
+    generate_ai_selections_for_date 1日分の推薦生成（スコアリング + セット最適化）
+    select_best_menu_set            セット最適化のみ
+
+結果は JSON で保存し、--compare で以前の結果（別コミットで実行したもの）と比較できる。
+
+使い方:
+    python ml/benchmark_pipeline.py
+    python ml/benchmark_pipeline.py --scales 1 10 100 --output bench_new.json --compare bench_old.json
+
+    # 1000倍は特徴量行列が 5GB 以上になり、既定のメモリ上限（--max-memory-gb 2）では
+    # Claudeキャッシュ以外の段階をスキップする。メモリに余裕のある環境で上限を上げて実行
+    python ml/benchmark_pipeline.py --scales 1000 --max-memory-gb 8
+
+ANTHROPIC_API_KEY は外して実行する（API 呼び出しなし、Claude特徴量はゼロ埋め）。
+"""
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+ML_DIR = Path(__file__).parent
+sys.path.insert(0, str(ML_DIR))
+
+DEFAULT_SCALES = [10, 100, 1000]
+DEFAULT_OUTPUT = ML_DIR / "data" / "benchmark_pipeline.json"
+# 1日単位で計測する段階の計測日数
+SAMPLE_DAYS = 20
+# 数値の栄養素に掛けるゆらぎ（合成メニュー）
+NUTRITION_JITTER = 0.15
+# メニューの出現頻度の偏り（Zipf の指数）
+POPULARITY_EXPONENT = 1.1
+# train_models の既定の行数上限と CV フォールド数（10倍で全日・既定フォールドだと1コアで数分かかる）
+MAX_TRAIN_ROWS = 10000
+CV_FOLDS = 5
+STAGES = [
+    "claude_cache_load", "prepare_features", "train_models", "predict",
+    "generate_ai_selections_for_date", "select_best_menu_set",
+]
+
+
+class _LocalLoader:
+    """build_historical_set_profile 用に合成データを返すローダー（SupabaseDataLoader と同じインターフェース）"""
+
+    def __init__(self, training_data):
+        self.training_data = training_data
+
+    def get_training_data(self, limit=None):
+        return self.training_data[-limit:] if limit else self.training_data
+
+
+def synthesize_training_data(base: list, scale: int, seed: int = 0) -> list:
+    """
+    実データの scale 倍の日数の合成学習データを作る
+
+    - メニューの種類も scale 倍（実メニュー + 実メニュー名の単語分布から組み立てた名前）
+    - 栄養素は実メニューの値に ±NUTRITION_JITTER のゆらぎを加えたもの（キーは同じ）
+    - 日ごとのメニュー数・選択数は実データの分布から、選択は栄養素に依存する隠れた嗜好で決める
+    """
+    from menu_recommender import MenuFeatureExtractor
+
+    rng = np.random.default_rng(seed)
+    extractor = MenuFeatureExtractor()
+    real = {}
+    for day in base:
+        for menu in day["allMenus"]:
+            real[menu["name"]] = menu["nutrition"]
+    real_names = list(real)
+
+    token_counts = Counter()
+    lengths = []
+    for name in real_names:
+        words = extractor.extract_words(name)
+        token_counts.update(words)
+        lengths.append(max(len(words), 1))
+    tokens = list(token_counts)
+    token_p = np.array([token_counts[t] for t in tokens], dtype=float)
+    token_p /= token_p.sum()
+
+    pool = [{"name": name, "nutrition": real[name]} for name in real_names]
+    seen = set(real_names)
+    while len(pool) < len(real_names) * scale:
+        n_tokens = lengths[rng.integers(len(lengths))]
+        # 「・」区切りにして extract_words で元の単語に分かれるようにする
+        # （直接つなぐと同じ文字種の単語が1語になり、語彙が実データと違う分布で膨らむ）
+        name = "・".join(tokens[i] for i in rng.choice(len(tokens), size=n_tokens, p=token_p))
+        if name in seen:
+            continue
+        seen.add(name)
+        template = real[real_names[rng.integers(len(real_names))]]
+        nutrition = {
+            k: (round(v * rng.uniform(1 - NUTRITION_JITTER, 1 + NUTRITION_JITTER), 1)
+                if isinstance(v, (int, float)) else v)
+            for k, v in template.items()
+        }
+        pool.append({"name": name, "nutrition": nutrition})
+
+    popularity = 1.0 / np.arange(1, len(pool) + 1) ** POPULARITY_EXPONENT
+    popularity = popularity[rng.permutation(len(pool))]
+    popularity /= popularity.sum()
+    # 隠れた嗜好（たんぱく質・野菜が多く、脂質が少ないほど選ばれやすい）
+    taste = np.array([
+        (m["nutrition"].get("たんぱく質", 0) or 0) / 20
+        + (m["nutrition"].get("野菜重量", 0) or 0) / 100
+        - (m["nutrition"].get("脂質", 0) or 0) / 20
+        for m in pool
+    ])
+
+    menu_counts = [len(day["allMenus"]) for day in base]
+    selected_counts = [sum(1 for m in day["allMenus"] if m["selected"]) for day in base]
+    start = date.fromisoformat(base[0]["date"])
+    days = []
+    for d in range(len(base) * scale):
+        n_menus = menu_counts[rng.integers(len(menu_counts))]
+        idx = rng.choice(len(pool), size=min(n_menus, len(pool)), replace=False, p=popularity)
+        utility = taste[idx] + rng.gumbel(size=len(idx))
+        chosen = set(np.argsort(-utility)[:selected_counts[rng.integers(len(selected_counts))]].tolist())
+        day_date = (start + timedelta(days=d)).isoformat()
+        days.append({
+            "date": day_date,
+            "dateLabel": day_date,
+            "allMenus": [
+                {"name": pool[i]["name"], "nutrition": pool[i]["nutrition"], "selected": k in chosen}
+                for k, i in enumerate(idx.tolist())
+            ],
+        })
+    return days
+
+
+def _per_day(fn, days: list) -> dict:
+    """1日単位の処理を計測（ms の平均・中央値・最大）"""
+    runs = []
+    for day in days:
+        t0 = time.perf_counter()
+        fn(day)
+        runs.append((time.perf_counter() - t0) * 1000)
+    return {
+        "days": len(runs),
+        "ms_mean": statistics.mean(runs),
+        "ms_median": statistics.median(runs),
+        "ms_max": max(runs),
+    }
+
+
+def _progress(stages: dict, stage: str):
+    """計測済みの段階を表示（倍率が大きいと1段階に数分かかるため）"""
+    if stage in stages:
+        value, unit = _stage_value(stages[stage])
+        print(f"   {stage:34s} {value:>10.3f}{unit}", flush=True)
+
+
+def _estimate_feature_bytes(training_data: list, text_mode: str) -> int:
+    """prepare_features のピークメモリの目安（静的特徴量行列 + 結合後の行列）"""
+    from menu_recommender import CLAUDE_FEATURE_NAMES, HASH_DIM, MenuFeatureExtractor
+
+    rows = sum(len(day["allMenus"]) for day in training_data)
+    if text_mode == "hashed":
+        text_dim = HASH_DIM
+    else:
+        extractor = MenuFeatureExtractor()
+        counts = Counter()
+        for name in {m["name"] for day in training_data for m in day["allMenus"]}:
+            counts.update(extractor.extract_words(name))
+        text_dim = sum(1 for c in counts.values() if c >= 2)
+    n_features = 13 + text_dim + 13 + len(CLAUDE_FEATURE_NAMES) + 3
+    return rows * n_features * 8 * 2
+
+
+def bench_claude_cache_load(training_data: list) -> dict:
+    """合成メニュー数分の Claude 解析キャッシュを一時ファイルに書き、読み込み時間を計測"""
+    import claude_analyzer
+
+    with open(claude_analyzer.CACHE_FILE, "r", encoding="utf-8") as f:
+        real_cache = list(json.load(f).values())
+    names = sorted({m["name"] for day in training_data for m in day["allMenus"]})
+    cache = {name: {**real_cache[i % len(real_cache)], "name": name} for i, name in enumerate(names)}
+
+    original = claude_analyzer.CACHE_FILE
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "claude_menu_cache.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+        claude_analyzer.CACHE_FILE = path
+        try:
+            analyzer = claude_analyzer.ClaudeMenuAnalyzer.__new__(claude_analyzer.ClaudeMenuAnalyzer)
+            t0 = time.perf_counter()
+            loaded = analyzer._load_cache()
+            seconds = time.perf_counter() - t0
+        finally:
+            claude_analyzer.CACHE_FILE = original
+        size = path.stat().st_size
+    return {"seconds": seconds, "entries": len(loaded), "bytes": size}
+
+
+def run_scale(base: list, scale: int, args) -> dict:
+    """1つの倍率で全段階を計測"""
+    from generate_ai_selections import (
+        _extract_nutrition_totals, build_historical_set_profile,
+        generate_ai_selections_for_date, select_best_menu_set,
+    )
+    from menu_recommender import MenuRecommender
+
+    t0 = time.perf_counter()
+    training_data = synthesize_training_data(base, scale, seed=args.seed)
+    result = {
+        "scale": scale,
+        "days": len(training_data),
+        "rows": sum(len(day["allMenus"]) for day in training_data),
+        "unique_menus": len({m["name"] for day in training_data for m in day["allMenus"]}),
+        "synthesize_seconds": time.perf_counter() - t0,
+        "stages": {},
+    }
+    stages = result["stages"]
+    print(f"\n📊 {scale}倍: {result['days']}日 / {result['rows']}行 / {result['unique_menus']}メニュー"
+          f"（合成 {result['synthesize_seconds']:.1f}s）", flush=True)
+
+    if "claude_cache_load" in args.stages:
+        stages["claude_cache_load"] = bench_claude_cache_load(training_data)
+        _progress(stages, "claude_cache_load")
+
+    estimate = _estimate_feature_bytes(training_data, args.text_mode)
+    if estimate > args.max_memory_gb * 1024 ** 3:
+        reason = f"特徴量行列の推定 {estimate / 1024 ** 3:.1f}GB が --max-memory-gb を超える"
+        for stage in STAGES[1:]:
+            if stage in args.stages:
+                stages[stage] = {"skipped": reason}
+        print(f"   ⚠️  {reason}（以降の段階をスキップ）")
+        return result
+
+    recommender = MenuRecommender(text_mode=args.text_mode)
+    recommender.training_data = training_data
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        recommender.prepare_features()
+    stages["prepare_features"] = {
+        "seconds": time.perf_counter() - t0,
+        "features": int(recommender.X.shape[1]),
+    }
+    _progress(stages, "prepare_features")
+
+    # 学習は直近 --max-train-rows 行分の日に限定（推論系の段階に学習済みモデルが必要なため）
+    rows_per_day = np.bincount(recommender.groups)
+    keep_days = int(np.searchsorted(np.cumsum(rows_per_day[::-1]), args.max_train_rows, side="right"))
+    keep_days = min(max(keep_days, 2), len(rows_per_day))
+    first_row = int(rows_per_day[:len(rows_per_day) - keep_days].sum())
+    if first_row:
+        recommender.X = recommender.X[first_row:]
+        recommender.y = recommender.y[first_row:]
+        recommender.groups = recommender.groups[first_row:] - recommender.groups[first_row]
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        recommender.train_models(refit_all=False, use_cv_cache=False, n_jobs=args.n_jobs,
+                                 cv_folds=args.cv_folds)
+    stages["train_models"] = {
+        "seconds": time.perf_counter() - t0,
+        "rows": int(len(recommender.y)),
+        "days": keep_days if first_row else len(rows_per_day),
+        "best_model": recommender.best_model_name,
+        "timings": dict(getattr(recommender, "training_timings", {})),
+    }
+    if "train_models" not in args.stages:
+        stages.pop("train_models")
+    _progress(stages, "train_models")
+
+    sample = training_data[-SAMPLE_DAYS:]
+    serving = [[{k: v for k, v in m.items() if k != "selected"} for m in day["allMenus"]] for day in sample]
+    if "predict" in args.stages:
+        stages["predict"] = _per_day(recommender.predict, serving)
+        _progress(stages, "predict")
+
+    profile = build_historical_set_profile(_LocalLoader(training_data))
+    if "generate_ai_selections_for_date" in args.stages:
+        with contextlib.redirect_stdout(io.StringIO()):
+            stages["generate_ai_selections_for_date"] = _per_day(
+                lambda menus: generate_ai_selections_for_date(
+                    recommender, "2000-01-01", {"menus": menus}, profile=profile
+                ),
+                serving,
+            )
+        _progress(stages, "generate_ai_selections_for_date")
+
+    if "select_best_menu_set" in args.stages:
+        scored_days = []
+        for menus in serving:
+            menu_scores = [
+                {**row, "nutritionTotals": _extract_nutrition_totals(row["nutrition"])}
+                for row in recommender.predict(copy.deepcopy(menus))
+            ]
+            scored_days.append(menu_scores)
+        stages["select_best_menu_set"] = _per_day(
+            lambda menu_scores: select_best_menu_set(menu_scores, profile, recommender), scored_days
+        )
+        _progress(stages, "select_best_menu_set")
+    return result
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ML_DIR,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _stage_value(stage: dict):
+    """比較に使う値（秒、または1日あたりの ms）"""
+    if "seconds" in stage:
+        return stage["seconds"], "s"
+    if "ms_mean" in stage:
+        return stage["ms_mean"], "ms/日"
+    return None, ""
+
+
+def print_results(results: dict, baseline: dict = None):
+    base_scales = {r["scale"]: r for r in (baseline or {}).get("scales", [])}
+    header = f"{'倍率':>6s}  {'段階':34s} {'値':>12s}"
+    if baseline:
+        header += f"  {'比較':>8s}  (基準 {baseline.get('git_commit') or '?'})"
+    print("\n" + header)
+    print("-" * len(header))
+    for row in results["scales"]:
+        for stage in STAGES:
+            data = row["stages"].get(stage)
+            if data is None:
+                continue
+            value, unit = _stage_value(data)
+            if value is None:
+                print(f"{row['scale']:>5d}x  {stage:34s} {'スキップ':>12s}")
+                continue
+            line = f"{row['scale']:>5d}x  {stage:34s} {value:>8.3f}{unit:>4s}"
+            old = base_scales.get(row["scale"], {}).get("stages", {}).get(stage)
+            old_value = _stage_value(old)[0] if old else None
+            if old_value:
+                ratio = value / old_value
+                mark = "⚠️ " if ratio > 1.2 else "  "
+                line += f"  {mark}{ratio:5.2f}x"
+            print(line)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MLパイプラインのベンチマーク（合成データ）")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="実データに対する日数の倍率")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="計測する段階")
+    parser.add_argument("--data", type=str, default=str(ML_DIR / "data" / "training_data.json"))
+    parser.add_argument("--text-mode", choices=["vocab", "hashed"], default="vocab")
+    parser.add_argument("--max-train-rows", type=int, default=MAX_TRAIN_ROWS,
+                        help="train_models に使う最大行数（直近の日から）")
+    parser.add_argument("--max-memory-gb", type=float, default=2.0, help="特徴量行列の推定メモリの上限")
+    parser.add_argument("--cv-folds", type=int, default=CV_FOLDS, help="train_models の CV フォールド数の上限")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="CVの並列数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=str(DEFAULT_OUTPUT), help="結果の JSON")
+    parser.add_argument("--compare", type=str, default=None, help="比較する以前の結果の JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # API 呼び出しを避けるため、ベンチマーク中は API キーを外す
+    os.environ.pop("ANTHROPIC_API_KEY", None)
+
+    print("=" * 70)
+    print("⏱️  MLパイプライン ベンチマーク（合成データ）")
+    print("=" * 70)
+
+    with open(args.data, "r", encoding="utf-8") as f:
+        base = json.load(f)
+
+    import sklearn
+
+    results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "cpu_count": os.cpu_count(),
+        "base_days": len(base),
+        "settings": {
+            k: getattr(args, k) for k in ("text_mode", "max_train_rows", "max_memory_gb", "cv_folds", "n_jobs", "seed")
+        },
+        "scales": [],
+    }
+    for scale in args.scales:
+        results["scales"].append(run_scale(base, scale, args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 結果を保存: {output}")
+
+
+if __name__ == "__main__":
+    main()
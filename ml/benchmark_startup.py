@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+ML エントリーポイントの起動時間ベンチマーク
+
+各エントリーポイントが読み込むモジュールを `python -X importtime` 付きの
+別プロセスで計測し、累積インポート時間と重いモジュールの上位を表示する。
+重い依存（pandas / scikit-learn / matplotlib / supabase）を遅延インポートに
+保てているかの確認用。
+
+使い方:
+    python ml/benchmark_startup.py
+    python ml/benchmark_startup.py --repeat 5 --json startup.json
+
+    # 予算超過で終了コード1（CI やコミット前の確認用）
+    python ml/benchmark_startup.py --max-ms 500
+
+計測中は ANTHROPIC_API_KEY を外した環境で実行するため、API 呼び出しは発生しない。
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ML_DIR = Path(__file__).parent
+
+# (名前, 実行するコード, 予算チェックの対象か)
+TARGETS = [
+    ("import menu_recommender", "import menu_recommender", True),
+    ("import generate_ai_selections", "import generate_ai_selections", True),
+    ("import validate_model", "import validate_model", True),
+    ("import claude_preference_analyzer", "import claude_preference_analyzer", True),
+    (
+        "update_weekly --dry-run imports",
+        "import update_weekly; from claude_analyzer import CACHE_FILE",
+        True,
+    ),
+    (
+        "update_weekly --regen-only imports + load_model",
+        "import update_weekly, generate_ai_selections; "
+        "from menu_recommender import MenuRecommender; "
+        "MenuRecommender.load_model().best_model",
+        False,
+    ),
+]
+
+# 起動時に読み込まれていないことを確認する重いパッケージ
+HEAVY_PACKAGES = ["pandas", "sklearn", "matplotlib", "supabase", "anthropic"]
+
+
+def _child_env() -> dict:
+    env = dict(os.environ)
+    env.pop("ANTHROPIC_API_KEY", None)
+    return env
+
+
+def run_importtime(code: str) -> dict:
+    """-X importtime 付きでコードを実行し、壁時計時間とインポート内訳を返す"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ML_DIR,
+        env=_child_env(),
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        try:
+            imports.append({
+                "module": name.strip(),
+                # importtime は区切りの空白1つ + ネスト1段につき2スペースで字下げする
+                "depth": (len(name) - len(name.lstrip()) - 3) // 2,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+            })
+        except ValueError:
+            continue  # ヘッダ行
+
+    top_level_us = sum(i["cumulative_us"] for i in imports if i["depth"] == 0)
+    loaded = {i["module"].split(".")[0] for i in imports}
+    return {
+        "ok": proc.returncode == 0,
+        "stderr_tail": [] if proc.returncode == 0 else proc.stderr.strip().splitlines()[-1:],
+        "wall_ms": wall_ms,
+        "import_ms": top_level_us / 1000,
+        "heavy_loaded": [p for p in HEAVY_PACKAGES if p in loaded],
+        "top_imports": sorted(
+            (i for i in imports if i["depth"] == 0),
+            key=lambda i: -i["cumulative_us"],
+        )[:5],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ML エントリーポイントの起動時間ベンチマーク")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（中央値を採用）")
+    parser.add_argument("--json", type=str, default=None, help="結果を JSON で保存するパス")
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        default=None,
+        help="予算チェック対象のインポート時間上限(ms)。超過時は終了コード1",
+    )
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("⏱️  ML エントリーポイント起動時間ベンチマーク")
+    print("=" * 70)
+
+    results = []
+    for name, code, budgeted in TARGETS:
+        runs = [run_importtime(code) for _ in range(args.repeat)]
+        last = runs[-1]
+        result = {
+            "name": name,
+            "ok": all(r["ok"] for r in runs),
+            "budgeted": budgeted,
+            "import_ms": statistics.median(r["import_ms"] for r in runs),
+            "wall_ms": statistics.median(r["wall_ms"] for r in runs),
+            "heavy_loaded": last["heavy_loaded"],
+            "top_imports": last["top_imports"],
+        }
+        if not result["ok"]:
+            result["error"] = last["stderr_tail"]
+        results.append(result)
+
+    print(f"\n{'対象':50s} {'import(ms)':>11s} {'wall(ms)':>9s}  重い依存")
+    print("-" * 90)
+    for r in results:
+        status = "" if r["ok"] else "  ❌ " + " ".join(r.get("error", []))
+        heavy = ",".join(r["heavy_loaded"]) or "-"
+        print(f"{r['name']:50s} {r['import_ms']:11.1f} {r['wall_ms']:9.1f}  {heavy}{status}")
+
+    print("\n📊 各対象の重いトップレベルインポート:")
+    for r in results:
+        tops = ", ".join(f"{i['module'].strip()} {i['cumulative_us'] / 1000:.0f}ms" for i in r["top_imports"][:3])
+        print(f"   {r['name']}: {tops}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 結果を保存: {args.json}")
+
+    if args.max_ms is not None:
+        over = [r for r in results if r["budgeted"] and r["import_ms"] > args.max_ms]
+        if over:
+            print(f"\n❌ 予算 {args.max_ms:.0f}ms 超過: {', '.join(r['name'] for r in over)}")
+            sys.exit(1)
+        print(f"\n✅ 全対象が予算 {args.max_ms:.0f}ms 以内")
+
+
+if __name__ == "__main__":
+    main()
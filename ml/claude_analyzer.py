@@ -19,6 +19,9 @@ Claude Haiku によるメニュー意味解析モジュール
     from claude_analyzer import ClaudeMenuAnalyzer
     analyzer = ClaudeMenuAnalyzer()
     features = analyzer.get_features("蒸し鶏&ブロッコリー")
+
+キャッシュにないメニューは、オフライン近似モデル (claude_surrogate.py) が
+学習済みであればその予測値で代替する。
 """
 
 import json
@@ -27,6 +30,8 @@ import time
 from pathlib import Path
 from typing import Optional
 
+from instrumentation import count, traced
+
 # --- 定数 ---
 MODEL_NAME = "claude-haiku-4-5-20251001"
 CACHE_FILE = Path(__file__).parent / "data" / "claude_menu_cache.json"
@@ -79,10 +84,42 @@ SYSTEM_PROMPT = """\
 """
 
 
+def result_to_feature_dict(result: dict) -> dict:
+    """Claude解析結果を特徴量辞書に変換"""
+    features = dict(ZERO_FEATURES)
+
+    # 調理法 one-hot
+    cooking = result.get("cooking_method", "")
+    for method in COOKING_METHODS:
+        key = f"claude_cook_{method}"
+        features[key] = 1.0 if cooking == method else 0.0
+
+    # 主食材 one-hot
+    protein = result.get("main_protein", "")
+    for p in MAIN_PROTEINS:
+        key = f"claude_prot_{p}"
+        features[key] = 1.0 if protein == p else 0.0
+
+    # ジャンル one-hot
+    cuisine = result.get("cuisine_style", "")
+    for c in CUISINE_STYLES:
+        key = f"claude_cuisine_{c}"
+        features[key] = 1.0 if cuisine == c else 0.0
+
+    # スカラー値
+    features["claude_light_heavy"] = result.get("light_heavy", 0.5)
+    features["claude_refreshing"] = result.get("refreshing", 0.5)
+    features["claude_spicy"] = result.get("spicy", 0.0)
+    features["claude_sweet"] = result.get("sweet", 0.0)
+    features["claude_health_impression"] = result.get("health_impression", 0.5)
+
+    return features
+
+
 class ClaudeMenuAnalyzer:
     """Claude Haiku を使ったメニュー意味解析"""
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, use_surrogate: bool = True):
         self.api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
         if not self.api_key:
             raise ValueError(
@@ -92,7 +129,17 @@ class ClaudeMenuAnalyzer:
             )
         self._client = None
         self.cache = self._load_cache()
-        self._stats = {"cache_hits": 0, "api_calls": 0, "menus_analyzed": 0}
+        # キャッシュを書き換えるたびに増やす（嗜好スコアのコンパイル結果の無効化に使う）
+        self.cache_version = 0
+        self._stats = {
+            "cache_hits": 0,
+            "surrogate_hits": 0,
+            "api_calls": 0,
+            "menus_analyzed": 0,
+            "api_skipped": 0,
+        }
+        self.use_surrogate = use_surrogate
+        self._surrogate = None
 
     @property
     def client(self):
@@ -102,6 +149,16 @@ class ClaudeMenuAnalyzer:
             self._client = anthropic.Anthropic(api_key=self.api_key)
         return self._client
 
+    @property
+    def surrogate(self):
+        """遅延読み込みでオフライン近似モデルを取得（未学習なら None）"""
+        if not self.use_surrogate:
+            return None
+        if self._surrogate is None:
+            from claude_surrogate import ClaudeFeatureSurrogate
+            self._surrogate = ClaudeFeatureSurrogate.load() or False
+        return self._surrogate or None
+
     # --- キャッシュ管理 ---
     def _load_cache(self) -> dict:
         """キャッシュファイルを読み込み"""
@@ -122,35 +179,66 @@ class ClaudeMenuAnalyzer:
             json.dump(self.cache, f, ensure_ascii=False, indent=2)
 
     # --- 単一メニューの特徴量取得 ---
-    def get_features(self, menu_name: str) -> dict:
+    def get_features(self, menu_name: str, nutrition: Optional[dict] = None) -> dict:
         """
         メニュー名に対応する特徴量辞書を返す。
-        キャッシュにない場合はゼロベクトルを返す（バッチ解析を推奨）。
+        キャッシュにない場合は近似モデルの予測値、近似モデルもなければ
+        ゼロベクトルを返す（バッチ解析を推奨）。
         """
         if menu_name in self.cache:
             self._stats["cache_hits"] += 1
             return self._to_feature_dict(self.cache[menu_name])
+        surrogate = self.surrogate
+        if surrogate is not None:
+            self._stats["surrogate_hits"] += 1
+            result, _ = surrogate.predict(menu_name, nutrition)
+            return self._to_feature_dict(result)
         return dict(ZERO_FEATURES)
 
-    def get_feature_vector(self, menu_name: str) -> list:
+    def get_feature_vector(self, menu_name: str, nutrition: Optional[dict] = None) -> list:
         """メニュー名に対する特徴量をリスト（数値ベクトル）として返す"""
-        features = self.get_features(menu_name)
+        features = self.get_features(menu_name, nutrition)
         return [features[name] for name in FEATURE_NAMES]
 
+    def surrogate_confidence(self, menu: dict) -> float:
+        """近似モデルによる予測の信頼度 (0-1)。近似モデルがなければ 0"""
+        surrogate = self.surrogate
+        if surrogate is None:
+            return 0.0
+        _, confidence = surrogate.predict(menu["name"], menu.get("nutrition"))
+        return confidence
+
     # --- バッチ解析 ---
-    def analyze_menus(self, menus: list, force: bool = False):
+    @traced("claude.analyze_menus")
+    def analyze_menus(self, menus: list, force: bool = False,
+                      min_surrogate_confidence: Optional[float] = None):
         """
         メニューリストをバッチ解析し、キャッシュに保存する。
 
         Args:
             menus: [{"name": "...", "nutrition": {...}}, ...]
             force: Trueならキャッシュ済みメニューも再解析
+            min_surrogate_confidence: 指定時、近似モデルの信頼度がこの値以上の
+                メニューはAPI解析を省略する（予測値で代替）
         """
         # 未解析メニューを抽出
         if force:
             to_analyze = menus
         else:
             to_analyze = [m for m in menus if m["name"] not in self.cache]
+        count("claude.cache_hits", len(menus) - len(to_analyze))
+
+        if to_analyze and min_surrogate_confidence is not None and self.surrogate is not None:
+            uncertain = [
+                m for m in to_analyze
+                if self.surrogate_confidence(m) < min_surrogate_confidence
+            ]
+            skipped = len(to_analyze) - len(uncertain)
+            if skipped:
+                self._stats["api_skipped"] += skipped
+                count("claude.surrogate_skipped", skipped)
+                print(f"🧮 近似モデルで代替（信頼度 >= {min_surrogate_confidence}）: {skipped} 件")
+            to_analyze = uncertain
 
         if not to_analyze:
             print(f"✅ 全メニューがキャッシュ済みです ({len(menus)} 件)")
@@ -171,14 +259,18 @@ class ClaudeMenuAnalyzer:
                     name = result.get("name", "")
                     if name:
                         self.cache[name] = result
+                        self.cache_version += 1
                         self._stats["menus_analyzed"] += 1
                 self._stats["api_calls"] += 1
             except Exception as e:
                 print(f"  ⚠️  バッチ {batch_num} 解析エラー: {e}")
-                # エラー時もパイプラインを止めない（ゼロベクトルで代替）
-                for menu in batch:
-                    if menu["name"] not in self.cache:
-                        self.cache[menu["name"]] = self._empty_result(menu["name"])
+                # エラー時もパイプラインを止めない。近似モデルがあれば
+                # キャッシュに残さず次回再解析、なければ中立値で代替
+                if self.surrogate is None:
+                    for menu in batch:
+                        if menu["name"] not in self.cache:
+                            self.cache[menu["name"]] = self._empty_result(menu["name"])
+                            self.cache_version += 1
 
             # レート制限対策
             if i + BATCH_SIZE < len(to_analyze):
@@ -188,8 +280,11 @@ class ClaudeMenuAnalyzer:
         print(f"✅ Claude解析完了: {self._stats['menus_analyzed']} メニュー解析, "
               f"{self._stats['api_calls']} API呼び出し")
 
+    @traced("claude.api_call")
     def _call_claude(self, batch: list) -> list:
         """Claude Haiku にバッチ解析を依頼"""
+        count("claude.api_calls")
+        count("claude.api_menus", len(batch))
         # ユーザープロンプトを構築
         menu_lines = []
         for menu in batch:
@@ -286,39 +381,14 @@ class ClaudeMenuAnalyzer:
     # --- 特徴量変換 ---
     def _to_feature_dict(self, result: dict) -> dict:
         """Claude解析結果を特徴量辞書に変換"""
-        features = dict(ZERO_FEATURES)
-
-        # 調理法 one-hot
-        cooking = result.get("cooking_method", "")
-        for method in COOKING_METHODS:
-            key = f"claude_cook_{method}"
-            features[key] = 1.0 if cooking == method else 0.0
-
-        # 主食材 one-hot
-        protein = result.get("main_protein", "")
-        for p in MAIN_PROTEINS:
-            key = f"claude_prot_{p}"
-            features[key] = 1.0 if protein == p else 0.0
-
-        # ジャンル one-hot
-        cuisine = result.get("cuisine_style", "")
-        for c in CUISINE_STYLES:
-            key = f"claude_cuisine_{c}"
-            features[key] = 1.0 if cuisine == c else 0.0
-
-        # スカラー値
-        features["claude_light_heavy"] = result.get("light_heavy", 0.5)
-        features["claude_refreshing"] = result.get("refreshing", 0.5)
-        features["claude_spicy"] = result.get("spicy", 0.0)
-        features["claude_sweet"] = result.get("sweet", 0.0)
-        features["claude_health_impression"] = result.get("health_impression", 0.5)
-
-        return features
+        return result_to_feature_dict(result)
 
     def print_stats(self):
         """統計情報を表示"""
         print(f"\n📊 Claude解析統計:")
         print(f"   キャッシュヒット: {self._stats['cache_hits']}")
+        print(f"   近似モデル代替: {self._stats['surrogate_hits']}")
+        print(f"   API解析省略（高信頼度）: {self._stats['api_skipped']}")
         print(f"   API呼び出し回数: {self._stats['api_calls']}")
         print(f"   解析メニュー数: {self._stats['menus_analyzed']}")
         print(f"   キャッシュ総数: {len(self.cache)}")
@@ -378,6 +448,11 @@ def main():
 
     print(f"\n✅ キャッシュ保存先: {CACHE_FILE}")
 
+    # キャッシュ更新に合わせて近似モデルを再学習
+    from claude_surrogate import ClaudeFeatureSurrogate
+    surrogate = ClaudeFeatureSurrogate.fit(analyzer.cache, all_menus)
+    surrogate.save()
+
 
 if __name__ == "__main__":
     main()
@@ -8,20 +8,272 @@ meal_history の選択パターンを分析し、ユーザーの食事嗜好を
 学習データが更新されたタイミング（menu_recommender.py 実行時）で
 再生成する。結果は ml/data/user_preference_profile.json に保存。
 
+incremental=True で生成すると、選択/非選択メニューの十分統計量
+（栄養素の合計・件数、メニュー名ワード数、メニュー別選択回数）を
+プロファイルに保持し、次回は新しい日付分だけを加算する。Claude には
+生のメニュー一覧ではなく統計サマリーを送るため、履歴が増えても
+プロンプト長は一定に保たれる。
+
+嗜好スコアの計算は CompiledPreferenceModel にまとめてあり、プロファイルを
+Claude 特徴量の one-hot 配置に揃えた重みベクトルへ変換して一括計算する。
+
 環境変数:
     ANTHROPIC_API_KEY: Anthropic API キー（必須）
 """
 
+import hashlib
 import json
 import os
 from pathlib import Path
 from typing import Optional
-from collections import Counter
+from collections import Counter, deque
+
+import numpy as np
+
+from claude_analyzer import FEATURE_NAMES, result_to_feature_dict
 
 # 嗜好プロファイルの保存先
 PROFILE_FILE = Path(__file__).parent / "data" / "user_preference_profile.json"
 MODEL_NAME = "claude-haiku-4-5-20251001"
 
+NEUTRAL_SCORE = 0.5
+HEALTH_FEATURE_IDX = FEATURE_NAMES.index("claude_health_impression")
+
+NUTRITION_STAT_KEYS = ["エネルギー", "たんぱく質", "脂質", "炭水化物", "食塩相当量", "野菜重量"]
+CATEGORY_KEYS = ["cooking_method", "main_protein", "cuisine_style"]
+
+# 統計サマリープロンプトに載せる件数の上限
+SUMMARY_TOP_SELECTED = 30
+SUMMARY_TOP_NOT_SELECTED = 15
+SUMMARY_TOP_WORDS = 20
+
+# 嗜好分析プロンプト共通の回答形式
+PROFILE_RESPONSE_FORMAT = """この社員の食事嗜好を分析し、以下のJSON形式で返してください:
+{
+  "taste_preference": "この人の味の好みの傾向（50字以内）",
+  "nutrition_tendency": "栄養面での傾向（50字以内）",
+  "preferred_cooking_methods": ["好む調理法を重要順に最大3つ"],
+  "preferred_proteins": ["好む食材を重要順に最大3つ"],
+  "preferred_cuisines": ["好むジャンルを重要順に最大3つ"],
+  "avoidance_patterns": ["避ける傾向のある要素を最大3つ"],
+  "set_combination_tendency": "メニューの組み合わせ方の傾向（50字以内）",
+  "health_consciousness": 0.0~1.0の数値（健康意識の高さ）,
+  "adventurousness": 0.0~1.0の数値（新しいメニューへの挑戦度）
+}
+
+JSONのみを返してください。"""
+
+
+def _day_hash(day_data: dict) -> str:
+    """1日分の内容（メニュー名・選択・栄養素）のハッシュ。過去日の修正の検知に使う"""
+    menus = [
+        [menu.get("name"), bool(menu.get("selected")), menu.get("nutrition", {})]
+        for menu in day_data.get("allMenus", [])
+    ]
+    payload = json.dumps(menus, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _extract_words(menu_name: str) -> list:
+    from menu_recommender import MenuFeatureExtractor
+    return MenuFeatureExtractor().extract_words(menu_name)
+
+
+class PreferenceStats:
+    """
+    嗜好プロファイル用の十分統計量。
+
+    日単位で加算でき、JSON としてプロファイルに保存する。カテゴリ分布は
+    メニュー別回数と Claude 解析キャッシュから集計時に求めるため、
+    後からキャッシュに追加されたメニューも反映される。
+    """
+
+    GROUPS = ("selected", "not_selected")
+
+    def __init__(self):
+        self.dates = []
+        self.day_hashes = {}  # 日付 → 集計時の内容のハッシュ
+        self.menu_counts = {group: Counter() for group in self.GROUPS}
+        self.nutrition_sum = {group: {k: 0.0 for k in NUTRITION_STAT_KEYS} for group in self.GROUPS}
+        self.nutrition_n = {group: {k: 0 for k in NUTRITION_STAT_KEYS} for group in self.GROUPS}
+        self.selected_words = Counter()
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        stats = cls()
+        stats.dates = list(data.get("dates", []))
+        stats.day_hashes = dict(data.get("day_hashes", {}))
+        for group in cls.GROUPS:
+            stats.menu_counts[group] = Counter(data.get("menu_counts", {}).get(group, {}))
+            stats.nutrition_sum[group].update(data.get("nutrition_sum", {}).get(group, {}))
+            stats.nutrition_n[group].update(data.get("nutrition_n", {}).get(group, {}))
+        stats.selected_words = Counter(data.get("selected_words", {}))
+        return stats
+
+    def to_dict(self) -> dict:
+        return {
+            "dates": self.dates,
+            "day_hashes": self.day_hashes,
+            "menu_counts": {group: dict(c) for group, c in self.menu_counts.items()},
+            "nutrition_sum": self.nutrition_sum,
+            "nutrition_n": self.nutrition_n,
+            "selected_words": dict(self.selected_words),
+        }
+
+    @property
+    def total_selections(self) -> int:
+        return sum(self.menu_counts["selected"].values())
+
+    def add_day(self, day_data: dict):
+        """1日分の選択結果を加算する"""
+        self.dates.append(day_data.get("date"))
+        self.day_hashes[day_data.get("date")] = _day_hash(day_data)
+        for menu in day_data.get("allMenus", []):
+            group = "selected" if menu.get("selected") else "not_selected"
+            self.menu_counts[group][menu["name"]] += 1
+            nutrition = menu.get("nutrition", {})
+            for key in NUTRITION_STAT_KEYS:
+                value = nutrition.get(key, 0)
+                if isinstance(value, (int, float)):
+                    self.nutrition_sum[group][key] += value or 0
+                    self.nutrition_n[group][key] += 1
+            if group == "selected":
+                self.selected_words.update(_extract_words(menu["name"]))
+
+    def nutrition_avg(self, group: str) -> dict:
+        return {
+            key: round(self.nutrition_sum[group][key] / self.nutrition_n[group][key], 1)
+            if self.nutrition_n[group][key] else 0
+            for key in NUTRITION_STAT_KEYS
+        }
+
+    def category_distribution(self, group: str, claude_cache: dict = None) -> dict:
+        """Claude 解析カテゴリごとの回数（キャッシュ未登録メニューは除外）"""
+        distribution = {key: Counter() for key in CATEGORY_KEYS}
+        for name, count in self.menu_counts[group].items():
+            cached = (claude_cache or {}).get(name)
+            if cached:
+                for key in CATEGORY_KEYS:
+                    distribution[key][cached.get(key, "?")] += count
+        return distribution
+
+    def local_stats(self) -> dict:
+        """_compute_local_stats と同じ形式の統計"""
+        return {
+            "selected_nutrition_avg": self.nutrition_avg("selected"),
+            "not_selected_nutrition_avg": self.nutrition_avg("not_selected"),
+            "top_words": self.selected_words.most_common(20),
+        }
+
+
+class AhoCorasickMatcher:
+    """複数パターンの部分文字列一致をテキスト長に比例する時間で判定する"""
+
+    def __init__(self, patterns: list):
+        # goto[state] = {文字: 次状態}, fail[state] = 失敗遷移先, out[state] = 一致あり
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [False]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build_failure_links()
+
+    def _add(self, pattern: str):
+        state = 0
+        for ch in pattern:
+            if ch not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(False)
+                self.goto[state][ch] = len(self.goto) - 1
+            state = self.goto[state][ch]
+        self.out[state] = True
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] or self.out[self.fail[nxt]]
+
+    def search(self, text: str) -> bool:
+        """いずれかのパターンが text に含まれていれば True"""
+        if self.out[0]:
+            return True
+        state = 0
+        for ch in text:
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            if self.out[state]:
+                return True
+        return False
+
+
+class CompiledPreferenceModel:
+    """
+    嗜好プロファイルをベクトル化したスコアラー。
+
+    Claude 特徴量 (FEATURE_NAMES) の one-hot 列に揃えた加点ベクトルと、
+    回避パターンの Aho–Corasick 照合器を作り、キャッシュ済みメニュー全件の
+    スコアをコンパイル時に一括計算しておく。スコアの定義は
+    PreferenceAnalyzer.get_preference_score の従来仕様と同じで、
+    キャッシュにないメニューは中立値 0.5。
+    """
+
+    def __init__(self, analysis: dict, claude_cache: dict = None):
+        claude_cache = claude_cache or {}
+
+        # 調理法・食材・ジャンルの順位加点（one-hot 列に対応）
+        self.bonus = np.zeros(len(FEATURE_NAMES))
+        for prefix, key, base, step in (
+            ("claude_cook_", "preferred_cooking_methods", 0.15, 0.03),
+            ("claude_prot_", "preferred_proteins", 0.15, 0.03),
+            ("claude_cuisine_", "preferred_cuisines", 0.1, 0.02),
+        ):
+            preferred = analysis.get(key, [])
+            for rank, value in reversed(list(enumerate(preferred))):
+                column = f"{prefix}{value}"
+                if column in FEATURE_NAMES:
+                    self.bonus[FEATURE_NAMES.index(column)] = base - rank * step
+
+        self.health_consciousness = analysis.get("health_consciousness", 0.5)
+        self.avoidance = AhoCorasickMatcher(analysis.get("avoidance_patterns", []))
+
+        self.names = list(claude_cache.keys())
+        self.index = {name: i for i, name in enumerate(self.names)}
+        if self.names:
+            features = np.array([
+                [result_to_feature_dict(claude_cache[name])[f] for f in FEATURE_NAMES]
+                for name in self.names
+            ], dtype=float)
+            avoided = np.array([self.avoidance.search(name) for name in self.names])
+        else:
+            features = np.zeros((0, len(FEATURE_NAMES)))
+            avoided = np.zeros(0, dtype=bool)
+
+        health_match = 1.0 - np.abs(self.health_consciousness - features[:, HEALTH_FEATURE_IDX])
+        self.scores = np.clip(
+            NEUTRAL_SCORE + features @ self.bonus - 0.1 * avoided + 0.05 * health_match,
+            0.0, 1.0,
+        )
+
+    def score(self, menu_name: str) -> float:
+        idx = self.index.get(menu_name)
+        return float(self.scores[idx]) if idx is not None else NEUTRAL_SCORE
+
+    def score_batch(self, names: list) -> np.ndarray:
+        """メニュー名リストの嗜好スコアを一括で返す"""
+        idx = np.fromiter((self.index.get(n, -1) for n in names), dtype=np.intp, count=len(names))
+        if not len(self.scores):
+            return np.full(len(names), NEUTRAL_SCORE)
+        return np.where(idx >= 0, self.scores[idx], NEUTRAL_SCORE)
+
 
 class PreferenceAnalyzer:
     """ユーザー嗜好プロファイルを生成する"""
@@ -36,6 +288,8 @@ class PreferenceAnalyzer:
             )
         self._client = None
         self.profile = self._load_profile()
+        self._compiled = None
+        self._compiled_key = None
 
     @property
     def client(self):
@@ -59,14 +313,20 @@ class PreferenceAnalyzer:
         with open(PROFILE_FILE, "w", encoding="utf-8") as f:
             json.dump(self.profile, f, ensure_ascii=False, indent=2)
 
-    def generate_profile(self, training_data: list, claude_cache: dict = None):
+    def generate_profile(self, training_data: list, claude_cache: dict = None,
+                         incremental: bool = False):
         """
         学習データからユーザー嗜好プロファイルを生成する。
 
         Args:
             training_data: menu_recommender の load_data() で取得したデータ
             claude_cache: claude_analyzer のキャッシュ（あれば使用）
+            incremental: True なら保存済みの統計量に新しい日付分だけを加算し、
+                Claude には統計サマリーを送る
         """
+        if incremental:
+            return self._generate_profile_incremental(training_data, claude_cache)
+
         print("\n🧠 ユーザー嗜好プロファイル生成中...")
 
         # 選択メニューと非選択メニューを分類
@@ -106,6 +366,71 @@ class PreferenceAnalyzer:
         print(f"✅ 嗜好プロファイル保存: {PROFILE_FILE}")
         return self.profile
 
+    def _generate_profile_incremental(self, training_data: list, claude_cache: dict = None):
+        """統計量の差分更新でプロファイルを生成する"""
+        print("\n🧠 ユーザー嗜好プロファイル生成中（差分更新）...")
+
+        dates = [day.get("date") for day in training_data]
+        if None in dates or len(set(dates)) != len(dates):
+            print("  ⚠️  日付が一意でないため全件から再生成します")
+            return self.generate_profile(training_data, claude_cache)
+
+        stats = None
+        saved = self.profile.get("running_stats")
+        if saved:
+            stats = PreferenceStats.from_dict(saved)
+            # 学習データから消えた日付がある（期間を絞った再学習など）場合は作り直す
+            if not set(stats.dates) <= set(dates):
+                print("  ↻ 保存済み統計量の期間が学習データと一致しないため再集計します")
+                stats = None
+            else:
+                # 集計済みの日の内容が修正されていれば作り直す（ハッシュのない旧形式も同様）
+                hashes = {day.get("date"): _day_hash(day) for day in training_data}
+                if any(stats.day_hashes.get(d) != hashes[d] for d in stats.dates):
+                    print("  ↻ 集計済みの日付の内容が変わっているため再集計します")
+                    stats = None
+        if stats is None:
+            stats = PreferenceStats()
+
+        known = set(stats.dates)
+        new_days = [day for day in training_data if day.get("date") not in known]
+        previous_failed = "error" in (self.profile.get("claude_analysis") or {})
+        if not new_days and "claude_analysis" in self.profile and not previous_failed:
+            print(f"  ✅ 新しい日付なし（{len(known)}日分集計済み）: 既存プロファイルを使用")
+            return self.profile
+
+        for day in new_days:
+            stats.add_day(day)
+        print(f"  📈 統計量を更新: +{len(new_days)}日（累計 {len(stats.dates)}日）")
+
+        if not stats.total_selections:
+            print("⚠️  選択メニューがないため、プロファイルを生成できません")
+            return
+
+        claude_profile = self._analyze_stats_with_claude(stats, claude_cache)
+
+        total_days = len(stats.dates)
+        profile = {
+            "total_selections": stats.total_selections,
+            "total_days": total_days,
+            "avg_selections_per_day": round(stats.total_selections / max(total_days, 1), 1),
+            "local_stats": stats.local_stats(),
+            "claude_analysis": claude_profile,
+            "running_stats": stats.to_dict(),
+        }
+        if "error" in claude_profile:
+            # 分析に失敗した場合は集計結果を保存しない（次回、同じ日付分を含めて再分析する）
+            print("  ⚠️  Claude嗜好分析に失敗したため、統計量は更新せず次回再分析します")
+            if saved:
+                profile["running_stats"] = saved
+            else:
+                del profile["running_stats"]
+        self.profile = profile
+
+        self._save_profile()
+        print(f"✅ 嗜好プロファイル保存: {PROFILE_FILE}")
+        return self.profile
+
     def _compute_local_stats(self, selected: list, not_selected: list) -> dict:
         """ローカル統計によるプロファイル生成"""
         # 栄養素の平均
@@ -174,21 +499,78 @@ class PreferenceAnalyzer:
 ## 選ばなかったメニュー（一部, {len(not_selected)}品中のサンプル）:
 {chr(10).join(f"- {s}" for s in not_selected_sample)}
 
-この社員の食事嗜好を分析し、以下のJSON形式で返してください:
-{{
-  "taste_preference": "この人の味の好みの傾向（50字以内）",
-  "nutrition_tendency": "栄養面での傾向（50字以内）",
-  "preferred_cooking_methods": ["好む調理法を重要順に最大3つ"],
-  "preferred_proteins": ["好む食材を重要順に最大3つ"],
-  "preferred_cuisines": ["好むジャンルを重要順に最大3つ"],
-  "avoidance_patterns": ["避ける傾向のある要素を最大3つ"],
-  "set_combination_tendency": "メニューの組み合わせ方の傾向（50字以内）",
-  "health_consciousness": 0.0~1.0の数値（健康意識の高さ）,
-  "adventurousness": 0.0~1.0の数値（新しいメニューへの挑戦度）
-}}
+""" + PROFILE_RESPONSE_FORMAT
+        return self._request_profile(prompt)
+
+    def _analyze_stats_with_claude(self, stats: PreferenceStats,
+                                   claude_cache: dict = None) -> dict:
+        """統計サマリー（件数上限つき）で Claude にユーザー嗜好を分析"""
+        labels = {"cooking_method": "調理法", "main_protein": "主食材", "cuisine_style": "ジャンル"}
+
+        def fmt_distribution(counter: Counter) -> str:
+            total = sum(counter.values())
+            if not total:
+                return "不明"
+            return ", ".join(f"{k} {v / total:.0%}" for k, v in counter.most_common())
+
+        def fmt_nutrition(avg: dict) -> str:
+            return ", ".join(f"{k}:{v}" for k, v in avg.items())
+
+        selected_dist = stats.category_distribution("selected", claude_cache)
+        not_selected_dist = stats.category_distribution("not_selected", claude_cache)
+        category_lines = [
+            f"{labels[key]}: 選択 [{fmt_distribution(selected_dist[key])}] / "
+            f"非選択 [{fmt_distribution(not_selected_dist[key])}]"
+            for key in CATEGORY_KEYS
+        ]
+
+        top_selected = []
+        for name, count in stats.menu_counts["selected"].most_common(SUMMARY_TOP_SELECTED):
+            detail = f"{name} ×{count}"
+            if claude_cache and name in claude_cache:
+                cached = claude_cache[name]
+                detail += (
+                    f" [{cached.get('cooking_method','?')}/"
+                    f"{cached.get('cuisine_style','?')}/"
+                    f"{cached.get('main_protein','?')}]"
+                )
+            top_selected.append(detail)
+
+        top_not_selected = [
+            f"{name} ×{count}"
+            for name, count in stats.menu_counts["not_selected"].most_common(SUMMARY_TOP_NOT_SELECTED)
+        ]
+        top_words = ", ".join(
+            f"{w}({c})" for w, c in stats.selected_words.most_common(SUMMARY_TOP_WORDS)
+        )
+        n_not_selected = sum(stats.menu_counts["not_selected"].values())
 
-JSONのみを返してください。"""
+        prompt = f"""以下はある社員が社食で{len(stats.dates)}日間に選んだメニューの統計サマリーです。
+
+## 件数
+選択 {stats.total_selections}品 / 非選択 {n_not_selected}品
+
+## 平均栄養
+- 選択: {fmt_nutrition(stats.nutrition_avg("selected"))}
+- 非選択: {fmt_nutrition(stats.nutrition_avg("not_selected"))}
+
+## カテゴリ分布
+{chr(10).join(f"- {line}" for line in category_lines)}
+
+## 選んだメニュー名の頻出ワード
+{top_words}
+
+## よく選ぶメニュー（上位{SUMMARY_TOP_SELECTED}件）
+{chr(10).join(f"- {s}" for s in top_selected)}
+
+## よく見送るメニュー（上位{SUMMARY_TOP_NOT_SELECTED}件）
+{chr(10).join(f"- {s}" for s in top_not_selected)}
 
+""" + PROFILE_RESPONSE_FORMAT
+        return self._request_profile(prompt)
+
+    def _request_profile(self, prompt: str) -> dict:
+        """嗜好分析プロンプトを送信し、結果のJSONを辞書で返す"""
         try:
             response = self.client.messages.create(
                 model=MODEL_NAME,
@@ -218,62 +600,54 @@ JSONのみを返してください。"""
                 "adventurousness": 0.5,
             }
 
-    def get_preference_score(self, menu_name: str, claude_cache: dict = None) -> float:
+    def compile(self, claude_cache: dict = None, cache_version: int = None) -> Optional[CompiledPreferenceModel]:
+        """
+        現在のプロファイルとキャッシュから CompiledPreferenceModel を返す。
+        プロファイルの再生成やキャッシュの変更があれば作り直す。
+
+        Args:
+            cache_version: ClaudeMenuAnalyzer.cache_version（キャッシュの書き換えごとに増える）。
+                省略時はキャッシュ件数の変化だけで判定する（同じメニューの再解析は検知できない）
+        """
+        if not self.profile or "claude_analysis" not in self.profile:
+            return None
+        key = (id(self.profile), id(claude_cache), len(claude_cache or {}), cache_version)
+        if self._compiled is None or self._compiled_key != key:
+            self._compiled = CompiledPreferenceModel(self.profile["claude_analysis"], claude_cache)
+            self._compiled_key = key
+        return self._compiled
+
+    def get_preference_score(self, menu_name: str, claude_cache: dict = None, cache_version: int = None) -> float:
         """
         メニュー名と嗜好プロファイルの一致度スコアを返す (0-1)。
         Claude解析キャッシュがあればセマンティック一致も考慮。
         """
-        if not self.profile or "claude_analysis" not in self.profile:
-            return 0.5  # プロファイルなし → 中立値
-
-        analysis = self.profile["claude_analysis"]
-        score = 0.5
-        matches = 0
-
-        # Claude キャッシュ由来の一致チェック
-        if claude_cache and menu_name in claude_cache:
-            cached = claude_cache[menu_name]
-
-            # 調理法一致
-            preferred_methods = analysis.get("preferred_cooking_methods", [])
-            if cached.get("cooking_method") in preferred_methods:
-                rank = preferred_methods.index(cached["cooking_method"])
-                score += (0.15 - rank * 0.03)
-                matches += 1
-
-            # 食材一致
-            preferred_proteins = analysis.get("preferred_proteins", [])
-            if cached.get("main_protein") in preferred_proteins:
-                rank = preferred_proteins.index(cached["main_protein"])
-                score += (0.15 - rank * 0.03)
-                matches += 1
-
-            # ジャンル一致
-            preferred_cuisines = analysis.get("preferred_cuisines", [])
-            if cached.get("cuisine_style") in preferred_cuisines:
-                rank = preferred_cuisines.index(cached["cuisine_style"])
-                score += (0.1 - rank * 0.02)
-                matches += 1
-
-            # 回避パターン
-            avoidance = analysis.get("avoidance_patterns", [])
-            for pattern in avoidance:
-                if pattern in menu_name:
-                    score -= 0.1
-                    break
-
-            # 健康意識との一致
-            health_consciousness = analysis.get("health_consciousness", 0.5)
-            menu_health = cached.get("health_impression", 0.5)
-            # 健康意識が高い人に健康的メニュー → ボーナス
-            health_match = 1.0 - abs(health_consciousness - menu_health)
-            score += health_match * 0.05
-
-        return max(0.0, min(1.0, score))
+        compiled = self.compile(claude_cache, cache_version)
+        if compiled is None:
+            return NEUTRAL_SCORE  # プロファイルなし → 中立値
+        return compiled.score(menu_name)
+
+    def get_preference_scores(self, menu_names: list, claude_cache: dict = None,
+                              cache_version: int = None) -> np.ndarray:
+        """複数メニューの嗜好スコアを一括計算する"""
+        compiled = self.compile(claude_cache, cache_version)
+        if compiled is None:
+            return np.full(len(menu_names), NEUTRAL_SCORE)
+        return compiled.score_batch(menu_names)
 
 
 def main():
     """スタンドアロン実行: 学習データから嗜好プロファイルを生成"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ユーザー嗜好プロファイル生成")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="保存済み統計量を使わず、全メニュー一覧から再生成する",
+    )
+    args = parser.parse_args()
+
     print("=" * 60)
     print("🧠 ユーザー嗜好プロファイル生成")
     print("=" * 60)
@@ -303,7 +677,7 @@ def main():
         print(f"\n❌ {e}")
         return
 
-    profile = analyzer.generate_profile(training_data, claude_cache)
+    profile = analyzer.generate_profile(training_data, claude_cache, incremental=not args.full)
 
     if profile:
         print("\n📋 生成されたプロファイル:")
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Claude 解析結果のオフライン近似モデル（サロゲート）
+
+Claude 解析キャッシュ (ml/data/claude_menu_cache.json) を教師データとして、
+メニュー名の文字 n-gram と栄養情報から FEATURE_NAMES の 25 次元を予測する。
+推論は NumPy の行列演算のみで完結し、ネットワーク呼び出しは発生しない。
+
+キャッシュ未登録メニューに対して ClaudeMenuAnalyzer.get_features が
+ZERO_FEATURES の代わりにこのモデルの予測値を返す。予測の信頼度
+（3つのカテゴリ分類の最大確率の最小値を、メニュー名のトークンのうちモデルが知っている割合と
+栄養情報の有無で割り引いた値）が閾値未満のメニューだけを実際の API 解析に回す。
+
+使い方:
+    # キャッシュから学習してホールドアウト精度を表示・保存
+    python ml/claude_surrogate.py
+
+    # モジュールとして使用
+    from claude_surrogate import ClaudeFeatureSurrogate
+    surrogate = ClaudeFeatureSurrogate.load()
+    result, confidence = surrogate.predict("蒸し鶏&ブロッコリー", nutrition)
+"""
+
+import json
+import re
+import unicodedata
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from claude_analyzer import (
+    CACHE_FILE,
+    COOKING_METHODS,
+    MAIN_PROTEINS,
+    CUISINE_STYLES,
+)
+
+# --- 定数 ---
+SURROGATE_FILE = Path(__file__).parent / "model" / "claude_surrogate.npz"
+MENUS_DIR = Path(__file__).parent.parent / "menus"
+
+# この信頼度以上の予測は API 解析を省略してよいとみなす
+DEFAULT_CONFIDENCE_THRESHOLD = 0.7
+
+NUTRITION_KEYS = ["エネルギー", "たんぱく質", "脂質", "炭水化物", "飽和脂肪酸", "食塩相当量", "野菜重量"]
+SCALAR_KEYS = ["light_heavy", "refreshing", "spicy", "sweet", "health_impression"]
+
+# (キャッシュのキー, カテゴリ一覧)
+CATEGORY_HEADS = [
+    ("cooking_method", COOKING_METHODS),
+    ("main_protein", MAIN_PROTEINS),
+    ("cuisine_style", CUISINE_STYLES),
+]
+
+MIN_TOKEN_COUNT = 2
+# メニュー名のトークンのうち語彙にある割合がこれ未満なら信頼度 0（知らない名前を推測で済ませない）
+MIN_TOKEN_COVERAGE = 0.5
+# 語彙にある割合がこれ未満なら信頼度を割合に比例して下げる
+FULL_TOKEN_COVERAGE = 0.7
+# 栄養情報がない場合の信頼度の係数（栄養は学習データの平均で代用する）
+MISSING_NUTRITION_FACTOR = 0.8
+
+
+def extract_tokens(menu_name: str) -> set:
+    """メニュー名から文字 1-gram / 2-gram と連続文字種の単語を抽出"""
+    name = unicodedata.normalize("NFKC", menu_name).lower()
+    tokens = set(name)
+    tokens.update(name[i:i + 2] for i in range(len(name) - 1))
+    tokens.update(
+        f"w:{w}" for w in re.findall(r"[ァ-ンー]+|[ぁ-んー]+|[一-龯]+|[a-z]+", name)
+    )
+    tokens.discard(" ")
+    return tokens
+
+
+def _has_nutrition(nutrition: Optional[dict]) -> bool:
+    """NUTRITION_KEYS のいずれかに数値があるか"""
+    return any(isinstance((nutrition or {}).get(key), (int, float)) for key in NUTRITION_KEYS)
+
+
+def _nutrition_vector(nutrition: Optional[dict]) -> np.ndarray:
+    """栄養辞書を数値ベクトルに変換（非数値は0）"""
+    nutrition = nutrition or {}
+    values = []
+    for key in NUTRITION_KEYS:
+        v = nutrition.get(key, 0)
+        values.append(float(v) if isinstance(v, (int, float)) else 0.0)
+    return np.log1p(np.maximum(np.array(values), 0.0))
+
+
+def _is_placeholder(result: dict) -> bool:
+    """API エラー時に保存された中立値（_empty_result）かどうか"""
+    return (
+        result.get("cooking_method") == "その他"
+        and result.get("main_protein") == "その他"
+        and result.get("cuisine_style") == "その他"
+    )
+
+
+def load_menus_by_name(menus_dir: Path = MENUS_DIR) -> dict:
+    """menus/ 配下の全メニューを名前で引ける辞書にまとめる"""
+    menus = {}
+    for menu_file in sorted(menus_dir.glob("menus_*.json")):
+        with open(menu_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for menu in data.get("menus", []):
+            name = menu.get("name", "")
+            if name and name not in menus:
+                menus[name] = menu
+    return menus
+
+
+class ClaudeFeatureSurrogate:
+    """Claude 解析結果を近似する線形モデル（推論は NumPy のみ）"""
+
+    def __init__(self):
+        self.token_to_idx = {}
+        self.nutrition_mean = np.zeros(len(NUTRITION_KEYS))
+        self.nutrition_scale = np.ones(len(NUTRITION_KEYS))
+        # 各ヘッドの重み: (語彙数 + 栄養次元, 出力次元) と切片
+        self.weights = {}
+        self.biases = {}
+
+    # --- 入力ベクトル ---
+    def _token_indices(self, menu_name: str) -> np.ndarray:
+        return np.array(
+            [self.token_to_idx[t] for t in extract_tokens(menu_name) if t in self.token_to_idx],
+            dtype=np.intp,
+        )
+
+    def token_coverage(self, menu_name: str) -> float:
+        """メニュー名のトークンのうち語彙にあるものの割合"""
+        tokens = extract_tokens(menu_name)
+        if not tokens:
+            return 0.0
+        return sum(t in self.token_to_idx for t in tokens) / len(tokens)
+
+    def _scaled_nutrition(self, nutrition: Optional[dict]) -> np.ndarray:
+        return (_nutrition_vector(nutrition) - self.nutrition_mean) / self.nutrition_scale
+
+    def _design_matrix(self, names: list, nutritions: list):
+        """学習用の疎行列（トークン one-hot + 標準化栄養）を作成"""
+        from scipy import sparse
+
+        rows, cols = [], []
+        for i, name in enumerate(names):
+            idx = self._token_indices(name)
+            rows.extend([i] * len(idx))
+            cols.extend(idx.tolist())
+        tokens = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)),
+            shape=(len(names), len(self.token_to_idx)),
+        )
+        nutrition = np.vstack([self._scaled_nutrition(n) for n in nutritions])
+        return sparse.hstack([tokens, sparse.csr_matrix(nutrition)]).tocsr()
+
+    # --- 学習 ---
+    @classmethod
+    def fit(cls, cache: dict, menus_by_name: dict):
+        """
+        Claude 解析キャッシュから学習する。
+
+        Args:
+            cache: claude_menu_cache.json の内容 {name: result}
+            menus_by_name: {name: {"name", "nutrition"}}（栄養情報の参照用）
+        """
+        from collections import Counter
+        from sklearn.linear_model import LogisticRegression, Ridge
+
+        entries = [(name, r) for name, r in cache.items() if not _is_placeholder(r)]
+        if not entries:
+            raise ValueError("学習に使えるClaude解析結果がありません")
+
+        names = [name for name, _ in entries]
+        nutritions = [menus_by_name.get(name, {}).get("nutrition", {}) for name in names]
+
+        model = cls()
+        token_counter = Counter()
+        for name in names:
+            token_counter.update(extract_tokens(name))
+        vocab = sorted(t for t, c in token_counter.items() if c >= MIN_TOKEN_COUNT)
+        model.token_to_idx = {t: i for i, t in enumerate(vocab)}
+
+        raw = np.vstack([_nutrition_vector(n) for n in nutritions])
+        model.nutrition_mean = raw.mean(axis=0)
+        model.nutrition_scale = np.where(raw.std(axis=0) > 0, raw.std(axis=0), 1.0)
+
+        X = model._design_matrix(names, nutritions)
+
+        for key, labels in CATEGORY_HEADS:
+            y = np.array([labels.index(r.get(key)) if r.get(key) in labels else len(labels) - 1
+                          for _, r in entries])
+            clf = LogisticRegression(C=2.0, max_iter=2000)
+            clf.fit(X, y)
+            # 学習データに出現しないクラスも含めた重みに展開
+            W = np.zeros((X.shape[1], len(labels)))
+            b = np.full(len(labels), -1e3)
+            W[:, clf.classes_] = clf.coef_.T if len(clf.classes_) > 2 else np.hstack(
+                [-clf.coef_.T / 2, clf.coef_.T / 2]
+            )
+            b[clf.classes_] = clf.intercept_ if len(clf.classes_) > 2 else np.array(
+                [-clf.intercept_[0] / 2, clf.intercept_[0] / 2]
+            )
+            model.weights[key] = W
+            model.biases[key] = b
+
+        Y = np.array([[float(r.get(k, 0.5)) for k in SCALAR_KEYS] for _, r in entries])
+        reg = Ridge(alpha=1.0)
+        reg.fit(X, Y)
+        model.weights["scalars"] = reg.coef_.T
+        model.biases["scalars"] = reg.intercept_
+
+        print(f"🧮 サロゲート学習完了: {len(entries)} メニュー, 語彙 {len(vocab)}")
+        return model
+
+    # --- 推論 ---
+    def _linear(self, head: str, token_idx: np.ndarray, nutrition: np.ndarray) -> np.ndarray:
+        W = self.weights[head]
+        n_tokens = len(self.token_to_idx)
+        return W[token_idx].sum(axis=0) + nutrition @ W[n_tokens:] + self.biases[head]
+
+    def predict(self, menu_name: str, nutrition: Optional[dict] = None) -> tuple:
+        """
+        キャッシュと同じ形式の解析結果と信頼度 (0-1) を返す。
+
+        信頼度は調理法・主食材・ジャンルの各予測確率の最小値を、メニュー名のトークンのうち
+        語彙にある割合（MIN_TOKEN_COVERAGE 未満なら 0、FULL_TOKEN_COVERAGE 未満なら比例して減らす）と
+        栄養情報の有無（なければ MISSING_NUTRITION_FACTOR 倍）で割り引いた値。
+        栄養情報がない場合は学習データの平均（標準化後 0）を入力にする。
+        """
+        token_idx = self._token_indices(menu_name)
+        has_nutrition = _has_nutrition(nutrition)
+        scaled = self._scaled_nutrition(nutrition) if has_nutrition else np.zeros(len(NUTRITION_KEYS))
+
+        result = {"name": menu_name, "source": "surrogate"}
+        confidence = 1.0
+        for key, labels in CATEGORY_HEADS:
+            logits = self._linear(key, token_idx, scaled)
+            probs = np.exp(logits - logits.max())
+            probs /= probs.sum()
+            best = int(np.argmax(probs))
+            result[key] = labels[best]
+            confidence = min(confidence, float(probs[best]))
+
+        scalars = np.clip(self._linear("scalars", token_idx, scaled), 0.0, 1.0)
+        for key, value in zip(SCALAR_KEYS, scalars):
+            result[key] = round(float(value), 1)
+
+        # 名前の大半を知らないメニューは信頼しない
+        coverage = self.token_coverage(menu_name)
+        if coverage < MIN_TOKEN_COVERAGE:
+            confidence = 0.0
+        elif coverage < FULL_TOKEN_COVERAGE:
+            confidence *= coverage / FULL_TOKEN_COVERAGE
+        if not has_nutrition:
+            confidence *= MISSING_NUTRITION_FACTOR
+        return result, confidence
+
+    # --- 保存・読み込み ---
+    def save(self, path: Path = SURROGATE_FILE):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tokens = sorted(self.token_to_idx, key=self.token_to_idx.get)
+        arrays = {
+            "tokens": np.array(tokens, dtype=str),
+            "nutrition_mean": self.nutrition_mean,
+            "nutrition_scale": self.nutrition_scale,
+        }
+        for head in self.weights:
+            arrays[f"W_{head}"] = self.weights[head]
+            arrays[f"b_{head}"] = self.biases[head]
+        np.savez_compressed(path, **arrays)
+        print(f"✅ サロゲートモデル保存: {path}")
+
+    @classmethod
+    def load(cls, path: Path = SURROGATE_FILE):
+        """保存済みモデルを読み込む（存在しなければ None）"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        model = cls()
+        with np.load(path, allow_pickle=False) as data:
+            model.token_to_idx = {t: i for i, t in enumerate(data["tokens"].tolist())}
+            model.nutrition_mean = data["nutrition_mean"]
+            model.nutrition_scale = data["nutrition_scale"]
+            for key in data.files:
+                if key.startswith("W_"):
+                    model.weights[key[2:]] = data[key]
+                elif key.startswith("b_"):
+                    model.biases[key[2:]] = data[key]
+        return model
+
+
+def evaluate_holdout(cache: dict, menus_by_name: dict, test_ratio: float = 0.2, seed: int = 42):
+    """ホールドアウトでカテゴリ正解率と信頼度閾値ごとの精度を表示"""
+    names = sorted(name for name, r in cache.items() if not _is_placeholder(r))
+    rng = np.random.default_rng(seed)
+    rng.shuffle(names)
+    n_test = max(1, int(len(names) * test_ratio))
+    test_names, train_names = names[:n_test], names[n_test:]
+
+    model = ClaudeFeatureSurrogate.fit({n: cache[n] for n in train_names}, menus_by_name)
+
+    rows = []
+    for name in test_names:
+        pred, confidence = model.predict(name, menus_by_name.get(name, {}).get("nutrition"))
+        truth = cache[name]
+        correct = [pred[key] == truth.get(key) for key, _ in CATEGORY_HEADS]
+        mae = np.mean([abs(pred[k] - float(truth.get(k, 0.5))) for k in SCALAR_KEYS])
+        rows.append((confidence, correct, mae))
+
+    print(f"\n📊 ホールドアウト評価 ({len(test_names)} メニュー):")
+    for i, (key, _) in enumerate(CATEGORY_HEADS):
+        acc = np.mean([r[1][i] for r in rows])
+        print(f"   {key:16s}: 正解率 {acc:.1%}")
+    print(f"   数値特徴量 MAE   : {np.mean([r[2] for r in rows]):.3f}")
+
+    print("\n   信頼度閾値ごとの全カテゴリ一致率:")
+    for threshold in (0.0, 0.4, 0.5, 0.6, 0.7, 0.8):
+        kept = [r for r in rows if r[0] >= threshold]
+        if kept:
+            acc = np.mean([all(r[1]) for r in kept])
+            print(f"   >= {threshold:.1f}: 対象 {len(kept)/len(rows):5.1%}, 一致率 {acc:.1%}")
+
+    # 栄養情報なし・語彙にない名前で API 解析を省略してしまう割合（低いほどよい）
+    no_nutrition = [
+        (model.predict(name)[1], all(model.predict(name)[0][key] == cache[name].get(key) for key, _ in CATEGORY_HEADS))
+        for name in test_names
+    ]
+    kept = [correct for confidence, correct in no_nutrition if confidence >= DEFAULT_CONFIDENCE_THRESHOLD]
+    print(f"\n   栄養情報なし: 閾値 {DEFAULT_CONFIDENCE_THRESHOLD} 以上 {len(kept)/len(no_nutrition):5.1%}"
+          + (f", 一致率 {np.mean(kept):.1%}" if kept else ""))
+    rng_unknown = np.random.default_rng(seed)
+    alphabet = list("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ")
+    unknown_names = ["xyz", "y", "ABCDEFG"] + [
+        "".join(rng_unknown.choice(alphabet, size=rng_unknown.integers(1, 10))) for _ in range(50)
+    ]
+    skipped = sum(model.predict(name)[1] >= DEFAULT_CONFIDENCE_THRESHOLD for name in unknown_names)
+    print(f"   語彙にない名前（英字のランダム文字列 {len(unknown_names)}件）: 閾値以上 {skipped}件")
+
+
+def main():
+    """キャッシュからサロゲートを学習して保存"""
+    print("=" * 60)
+    print("🧮 Claude 特徴量サロゲートモデルの学習")
+    print("=" * 60)
+
+    if not CACHE_FILE.exists():
+        print(f"❌ Claude解析キャッシュがありません: {CACHE_FILE}")
+        return
+
+    with open(CACHE_FILE, "r", encoding="utf-8") as f:
+        cache = json.load(f)
+    menus_by_name = load_menus_by_name()
+    print(f"📦 キャッシュ: {len(cache)} メニュー / 栄養情報: {len(menus_by_name)} メニュー")
+
+    evaluate_holdout(cache, menus_by_name)
+
+    model = ClaudeFeatureSurrogate.fit(cache, menus_by_name)
+    model.save()
+
+
+if __name__ == "__main__":
+    main()
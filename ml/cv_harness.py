@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+クロスバリデーション実行ハーネス
+
+(モデル, フォールド) の組を joblib で並列実行し、フォールド単位のスコアを
+JSON キャッシュに保存する。キャッシュキーは
+「フォールドの学習/評価データ（スケーリング前）のハッシュ + モデルのクラス名とパラメータ
++ フォールド内スケーリングの有無」なので、データもパラメータも変わらないフォールドは再計算されない。
+scale=True ではスケーラーをフォールドの学習データだけで学習する（StandardScaler + モデルの
+Pipeline）。全データで学習したスケーラーで変換した X を渡すと、評価日の情報が学習側に漏れるうえ、
+1日追加されるだけで全行の値が変わってキャッシュも効かなくなる。
+
+フォールド分割は make_cv_splits() で選択できる（lodo / group_kfold / rolling / sampled）。
+学習日数が増えても CV コストが一定になるよう、既定の 'auto' は MAX_CV_FOLDS 日までは
+Leave-One-Day-Out、それを超えたら直近 MAX_CV_FOLDS 日を評価日とする rolling-origin に切り替える。
+
+注意: menu_recommender の特徴量には学習データ全体に依存する列（選択頻度 = 選択回数 / 全日数、
+共起スコア、嗜好スコア）があるため、1日追加されると既存の日の行も変わり、どの分割戦略でも
+（学習日が固定される rolling でも）週次再学習ではキャッシュはほぼ効かない。効くのは同じデータでの再実行
+（validate_model --full の繰り返し、パラメータ・分割戦略の比較）なので、MenuRecommender.train_models は
+既定ではキャッシュを使わない（use_cv_cache=True / menu_recommender.py --cv-cache で有効化）。
+"""
+
+import hashlib
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+CACHE_FILE = Path(__file__).parent / "data" / "cv_fold_cache.json"
+CACHE_VERSION = 4
+# キャッシュの最大エントリ数（古いものから削除）
+MAX_CACHE_ENTRIES = 5000
+
+CV_STRATEGIES = ("auto", "lodo", "group_kfold", "rolling", "sampled")
+# 'auto' で LODO を使う最大日数 / rolling・sampled の評価日数
+MAX_CV_FOLDS = 20
+# rolling-origin で最初の評価日より前に必要な学習日数
+MIN_TRAIN_DAYS = 5
+# AUC 信頼区間のブートストラップ回数
+N_BOOTSTRAP = 1000
+# 予測レイテンシを測るバッチの行数（評価データの行を繰り返して作る）
+LATENCY_BATCH_ROWS = 1000
+
+
+def model_key(model) -> str:
+    """モデルのクラス名とパラメータからキーを作る"""
+    params = model.get_params(deep=False)
+    payload = json.dumps(
+        {"class": type(model).__name__, "params": {k: repr(v) for k, v in sorted(params.items())}},
+        sort_keys=True,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def fold_key(X, y, train_idx, test_idx, scoring: str) -> str:
+    """フォールドの学習/評価データの内容からキーを作る"""
+    h = hashlib.sha1()
+    h.update(scoring.encode("utf-8"))
+    for idx in (train_idx, test_idx):
+        h.update(np.ascontiguousarray(X[idx], dtype=np.float64).tobytes())
+        h.update(np.ascontiguousarray(y[idx], dtype=np.int64).tobytes())
+        h.update(b"|")
+    return h.hexdigest()[:24]
+
+
+class FoldCache:
+    """フォールド単位のCVスコアキャッシュ（JSON）"""
+
+    def __init__(self, path=CACHE_FILE):
+        self.path = Path(path)
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == CACHE_VERSION:
+                    self.entries = data.get("entries", {})
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"⚠️  CVキャッシュ読み込み失敗（再計算します）: {e}")
+
+    def get(self, key):
+        """フォールド結果（_score_fold の戻り値）を返す。未計算なら None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry["used"] = datetime.now().isoformat(timespec="seconds")
+        result = dict(entry["result"])
+        result["score"] = float("nan") if result["score"] is None else result["score"]
+        return result
+
+    def put(self, key, result: dict):
+        score = result["score"]
+        self.entries[key] = {
+            "result": {**result, "score": None if np.isnan(score) else float(score)},
+            "used": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def save(self):
+        if len(self.entries) > MAX_CACHE_ENTRIES:
+            keep = sorted(self.entries.items(), key=lambda kv: kv[1]["used"], reverse=True)
+            self.entries = dict(keep[:MAX_CACHE_ENTRIES])
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "entries": self.entries}, f)
+
+
+def make_cv_splits(groups, strategy: str = "auto", n_splits: int = MAX_CV_FOLDS,
+                   window: int = None, random_state: int = 42):
+    """
+    日付グループからCVのフォールド分割を作る
+
+    Args:
+        groups: 各行の日付グループ（値の昇順 = 時系列順であること）
+        strategy:
+            'lodo'        全日で Leave-One-Day-Out（フォールド数 = 日数）
+            'group_kfold' 日単位の K-fold（フォールド数 = n_splits）
+            'rolling'     直近 n_splits 日をそれぞれ評価日とし、その日より前の日で学習
+                          （window 指定時は直前 window 日のみで学習）。評価日より前に
+                          MIN_TRAIN_DAYS 日ない日は評価しないので、日数が MIN_TRAIN_DAYS 以下で
+                          フォールドが作れない場合は 'lodo' にフォールバックする
+            'sampled'     ランダムに選んだ n_splits 日で Leave-One-Day-Out
+            'auto'        日数 <= n_splits なら 'lodo'、超えたら 'rolling'
+        n_splits: フォールド数の上限
+        window: rolling の学習日数（None なら過去全日）
+        random_state: sampled の乱数シード
+
+    Returns:
+        (実際に使った戦略名, [(train_idx, test_idx), ...])
+    """
+    if strategy not in CV_STRATEGIES:
+        raise ValueError(f"未知のCV戦略: {strategy}（{', '.join(CV_STRATEGIES)} のいずれか）")
+
+    groups = np.asarray(groups)
+    days = np.unique(groups)
+    if strategy == "auto":
+        strategy = "lodo" if len(days) <= n_splits else "rolling"
+
+    if strategy == "group_kfold":
+        from sklearn.model_selection import GroupKFold
+
+        k = min(n_splits, len(days))
+        return strategy, list(GroupKFold(n_splits=k).split(groups, groups=groups))
+
+    if strategy == "lodo":
+        test_days = days
+    elif strategy == "sampled":
+        rng = np.random.default_rng(random_state)
+        test_days = np.sort(rng.choice(days, size=min(n_splits, len(days)), replace=False))
+    else:  # rolling
+        first = max(MIN_TRAIN_DAYS, len(days) - n_splits)
+        test_days = days[first:]
+
+    splits = []
+    for day in test_days:
+        test_idx = np.flatnonzero(groups == day)
+        if strategy == "rolling":
+            pos = np.searchsorted(days, day)
+            train_days = days[max(0, pos - window):pos] if window else days[:pos]
+            train_idx = np.flatnonzero(np.isin(groups, train_days))
+        else:
+            train_idx = np.flatnonzero(groups != day)
+        splits.append((train_idx, test_idx))
+    if not splits and strategy == "rolling":
+        return make_cv_splits(groups, "lodo")
+    return strategy, splits
+
+
+def bootstrap_ci(scores, n_bootstrap: int = N_BOOTSTRAP, alpha: float = 0.05, seed: int = 0):
+    """フォールドスコア平均のブートストラップ信頼区間（NaN は除外）"""
+    valid = np.asarray(scores, dtype=float)
+    valid = valid[~np.isnan(valid)]
+    if len(valid) == 0:
+        return float("nan"), float("nan")
+    if len(valid) == 1:
+        return float(valid[0]), float(valid[0])
+    rng = np.random.default_rng(seed)
+    means = valid[rng.integers(0, len(valid), size=(n_bootstrap, len(valid)))].mean(axis=1)
+    return float(np.quantile(means, alpha / 2)), float(np.quantile(means, 1 - alpha / 2))
+
+
+def _score_fold(model, X, y, train_idx, test_idx, scoring: str, scale: bool = False) -> dict:
+    """
+    1フォールドを学習・評価
+
+    Args:
+        scale: True なら StandardScaler をフォールドの学習データだけで学習する（Pipeline）
+
+    Returns:
+        {'score', 'fit_seconds', 'predict_ms_per_1000', 'n_test'}
+        predict_ms_per_1000 は学習したモデルの predict_proba を LATENCY_BATCH_ROWS 行のバッチで
+        1回呼んだ時間（数十行の評価データで測ると呼び出しごとの固定費が支配的になるため）
+        学習データ・評価データが単一クラスで AUC 等を計算できない場合 score は NaN
+    """
+    from sklearn.base import clone
+    from sklearn.metrics import get_scorer
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    result = {"score": float("nan"), "fit_seconds": 0.0, "predict_ms_per_1000": float("nan"),
+              "n_test": int(len(test_idx))}
+    if len(np.unique(y[train_idx])) < 2 or len(np.unique(y[test_idx])) < 2:
+        return result
+    estimator = make_pipeline(StandardScaler(), clone(model)) if scale else clone(model)
+    t0 = time.perf_counter()
+    estimator.fit(X[train_idx], y[train_idx])
+    result["fit_seconds"] = time.perf_counter() - t0
+    result["score"] = float(get_scorer(scoring)(estimator, X[test_idx], y[test_idx]))
+    batch = X[np.resize(test_idx, LATENCY_BATCH_ROWS)]
+    t0 = time.perf_counter()
+    estimator.predict_proba(batch)
+    result["predict_ms_per_1000"] = (time.perf_counter() - t0) * 1000 * 1000 / LATENCY_BATCH_ROWS
+    return result
+
+
+def cross_validate_models(models: dict, X, y, groups, cv=None, scoring: str = "roc_auc",
+                          n_jobs: int = -1, cache: FoldCache = None, scale: bool = False) -> dict:
+    """
+    複数モデルのCVを (モデル, フォールド) 単位で並列実行
+
+    Args:
+        models: {名前: 未学習の推定器}
+        X, y, groups: 特徴量・ラベル・グループ（日付）
+        cv: sklearn の分割器、または (train_idx, test_idx) のリスト（省略時は LeaveOneGroupOut）
+        scoring: sklearn のスコア名
+        n_jobs: joblib の並列数（-1 で全コア、1 で逐次）
+        cache: FoldCache（None ならキャッシュなし）
+        scale: True ならフォールドごとに学習データで StandardScaler を学習する（X はスケーリング前）
+
+    Returns:
+        {名前: {'mean', 'std', 'ci_low', 'ci_high', 'n_folds', 'scores', 'seconds',
+               'fit_seconds', 'predict_ms_per_1000'}}
+        fit_seconds はフォールドあたりの平均学習時間、predict_ms_per_1000 は
+        1000行のバッチの predict_proba 時間のフォールド平均（キャッシュ済みフォールドは保存時の計測値）
+        単一クラスで評価できないフォールドは NaN とし、平均・標準偏差・信頼区間からは除外する
+    """
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import LeaveOneGroupOut
+
+    X = np.asarray(X)
+    y = np.asarray(y)
+    cv = cv if cv is not None else LeaveOneGroupOut()
+    splits = list(cv.split(X, y, groups)) if hasattr(cv, "split") else list(cv)
+
+    folds = {name: [None] * len(splits) for name in models}
+    keys = {}
+    todo = []
+    for name, model in models.items():
+        mkey = model_key(model) + (":scaled" if scale else "")
+        for i, (train_idx, test_idx) in enumerate(splits):
+            key = f"{mkey}:{fold_key(X, y, train_idx, test_idx, scoring)}"
+            keys[(name, i)] = key
+            cached = cache.get(key) if cache is not None else None
+            if cached is not None:
+                folds[name][i] = cached
+            else:
+                todo.append((name, i))
+
+    start = time.perf_counter()
+    computed = Parallel(n_jobs=n_jobs)(
+        delayed(_score_fold)(models[name], X, y, splits[i][0], splits[i][1], scoring, scale)
+        for name, i in todo
+    )
+    elapsed = time.perf_counter() - start
+
+    for (name, i), fold in zip(todo, computed):
+        folds[name][i] = fold
+        if cache is not None:
+            cache.put(keys[(name, i)], fold)
+    if cache is not None:
+        cache.save()
+
+    n_todo = {name: sum(1 for n, _ in todo if n == name) for name in models}
+    results = {}
+    for name in models:
+        arr = np.array([f["score"] for f in folds[name]], dtype=float)
+        valid = arr[~np.isnan(arr)]
+        latency = np.array([f["predict_ms_per_1000"] for f in folds[name]], dtype=float)
+        latency = latency[~np.isnan(latency)]
+        ci_low, ci_high = bootstrap_ci(arr)
+        results[name] = {
+            "mean": float(valid.mean()) if len(valid) else float("nan"),
+            "std": float(valid.std()) if len(valid) else float("nan"),
+            "ci_low": ci_low,
+            "ci_high": ci_high,
+            "n_folds": int(len(valid)),
+            "scores": arr,
+            # 並列実行の壁時計時間を計算したフォールド数で按分した目安
+            "seconds": elapsed * n_todo[name] / len(todo) if todo else 0.0,
+            "fit_seconds": float(np.mean([f["fit_seconds"] for f in folds[name]])),
+            "predict_ms_per_1000": float(latency.mean()) if len(latency) else float("nan"),
+        }
+    return results
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+推論用の軽量スコアラー（学習済みモデルの蒸留）
+
+推論で使うのは数百種類の繰り返し登場するメニューなので、学習済みモデル
+（sklearn のアンサンブル + StandardScaler）の出力を次の2つに蒸留して
+NumPy だけで読み込める .npz に保存する。
+
+1. メニュー別スコア表: 既知メニューごとの教師モデルの確率。
+   推論時の特徴量はメニュー名と栄養素だけで決まるので、
+   (メニュー名, 栄養素特徴量) をキーにする（同名で栄養素が違う日があるため）
+2. 線形近似: スケーリングと線形モデルを1本の重みベクトルに融合したもの
+   （教師確率のロジットへのリッジ回帰）。スコア表にない新メニュー用
+
+スコアリングは「表引き + 行列ベクトル積1回」なので sklearn のインポートは不要。
+
+使い方:
+    # 学習済みモデルから書き出し（update_weekly の再学習後にも自動実行）
+    python ml/distilled_scorer.py
+
+    # generate_ai_selections で使用
+    python ml/generate_ai_selections.py --distilled
+"""
+
+import hashlib
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+ML_DIR = Path(__file__).parent
+PROJECT_ROOT = ML_DIR.parent
+SCORER_FILE = ML_DIR / "model" / "distilled_scorer.npz"
+SCHEMA_VERSION = 1
+# 線形近似のリッジ正則化係数
+RIDGE_ALPHA = 1.0
+# ロジット変換時の確率クリップ
+PROB_EPS = 1e-4
+
+
+def model_fingerprint(recommender) -> str:
+    """
+    学習済みモデルの識別子（特徴量名・スケーラー統計量・推定器の版のハッシュ。再学習ごとに変わる）
+
+    差分再学習はスケーラーを変えずに推定器だけを更新するため、保存した推定器の版
+    （MenuRecommender.model_version = manifest の estimator.sha1）も含める
+    """
+    h = hashlib.sha1()
+    h.update("\n".join(recommender.feature_names).encode("utf-8"))
+    h.update(np.asarray(recommender.scaler.mean_, dtype=np.float64).tobytes())
+    h.update(np.asarray(recommender.scaler.scale_, dtype=np.float64).tobytes())
+    h.update(str(getattr(recommender, "model_version", None) or "").encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+class DistilledScorer:
+    """NumPy のみで動く蒸留スコアラー"""
+
+    def __init__(self, weights, bias, names, table_scores, table_nutrition, feature_names, meta=None):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.feature_names = list(feature_names)
+        self.names = list(names)
+        self.table_scores = np.asarray(table_scores, dtype=np.float64)
+        # 既知メニューの栄養素特徴量（特徴量行列の先頭 nutrition_dim 列）
+        self.table_nutrition = np.asarray(table_nutrition, dtype=np.float64)
+        self.meta = meta or {}
+        self.index = {
+            (name, row.tobytes()): i for i, (name, row) in enumerate(zip(self.names, self.table_nutrition))
+        }
+        # 特徴量行列なしで引く場合は名前だけで引く（同名は後の行 = 新しい栄養素を採用）
+        self.name_index = {name: i for i, name in enumerate(self.names)}
+        self.stats = {"table_hits": 0, "linear": 0}
+
+    @classmethod
+    def distill(cls, recommender, menus: list, ridge_alpha: float = RIDGE_ALPHA):
+        """
+        学習済みモデルを蒸留
+
+        Args:
+            recommender: 学習済み MenuRecommender（best_model と scaler を使用）
+            menus: スコア表に載せるメニュー（重複可、古い順）
+            ridge_alpha: 線形近似のリッジ正則化係数
+
+        Returns:
+            (DistilledScorer, 線形近似の忠実度 dict)
+        """
+        nutrition_dim = len(recommender.feature_extractor.extract_nutrition_features({}))
+        X_all = recommender.build_serving_features(menus)
+        rows = {}
+        for i, menu in enumerate(menus):
+            rows[(menu.get("name", ""), X_all[i, :nutrition_dim].tobytes())] = i
+        names = [name for name, _ in rows]
+        X_raw = X_all[list(rows.values())]
+        mean = np.asarray(recommender.scaler.mean_, dtype=np.float64)
+        scale = np.asarray(recommender.scaler.scale_, dtype=np.float64)
+        Z = (X_raw - mean) / scale
+        teacher = recommender.best_model.predict_proba(Z)[:, 1]
+
+        # 教師確率のロジットへのリッジ回帰（標準化空間で解いてから生の特徴量空間に融合）
+        target = np.log(np.clip(teacher, PROB_EPS, 1 - PROB_EPS) / (1 - np.clip(teacher, PROB_EPS, 1 - PROB_EPS)))
+        Zc = np.hstack([Z, np.ones((len(Z), 1))])
+        reg = ridge_alpha * np.eye(Zc.shape[1])
+        reg[-1, -1] = 0.0  # 切片は正則化しない
+        coef = np.linalg.solve(Zc.T @ Zc + reg, Zc.T @ target)
+        w_z, b_z = coef[:-1], coef[-1]
+        weights = w_z / scale
+        bias = b_z - float(np.dot(w_z, mean / scale))
+
+        linear = _sigmoid(X_raw @ weights + bias)
+        fidelity = {
+            "menus": len(names),
+            "mae": float(np.mean(np.abs(linear - teacher))),
+            "spearman": _spearman(linear, teacher),
+        }
+        meta = {
+            "schema_version": SCHEMA_VERSION,
+            "teacher": recommender.best_model_name,
+            "model_fingerprint": model_fingerprint(recommender),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "use_claude": bool(recommender.feature_extractor.use_claude),
+            "nutrition_dim": nutrition_dim,
+            "fidelity": fidelity,
+        }
+        scorer = cls(weights, bias, names, teacher, X_raw[:, :nutrition_dim],
+                     recommender.feature_names, meta)
+        return scorer, fidelity
+
+    def score(self, menus: list, X_raw=None) -> np.ndarray:
+        """
+        メニューの推薦スコアを一括計算
+
+        Args:
+            menus: [{'name', 'nutrition'}, ...]
+            X_raw: スケーリング前の特徴量行列（build_serving_features の出力）。
+                   渡した場合は (メニュー名, 栄養素特徴量) で表を引き、表にないメニューは
+                   線形近似で採点する。省略時はメニュー名だけで引く（表にないメニューがあればエラー）
+        """
+        if X_raw is not None:
+            X_raw = np.asarray(X_raw, dtype=np.float64)
+            nutrition = X_raw[:, :self.table_nutrition.shape[1]]
+            idx = np.array([
+                self.index.get((menu.get("name", ""), row.tobytes()), -1)
+                for menu, row in zip(menus, nutrition)
+            ], dtype=np.int64)
+        else:
+            idx = np.array([self.name_index.get(menu.get("name", ""), -1) for menu in menus], dtype=np.int64)
+        hit = idx >= 0
+
+        scores = np.where(hit, self.table_scores[idx], 0.0)
+        missing = ~hit
+        if missing.any():
+            if X_raw is None:
+                raise ValueError("スコア表にないメニューがあります。特徴量行列 X_raw を渡してください")
+            scores[missing] = _sigmoid(X_raw[missing] @ self.weights + self.bias)
+        n_missing = int(missing.sum())
+        self.stats["table_hits"] += len(menus) - n_missing
+        self.stats["linear"] += n_missing
+        return scores
+
+    def save(self, path=SCORER_FILE):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path,
+            weights=self.weights,
+            bias=np.array(self.bias),
+            names=np.array(self.names, dtype=str),
+            table_scores=self.table_scores,
+            table_nutrition=self.table_nutrition,
+            feature_names=np.array(self.feature_names, dtype=str),
+            meta=np.array(json.dumps(self.meta, ensure_ascii=False)),
+        )
+        return path
+
+    @classmethod
+    def load(cls, path=SCORER_FILE):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("schema_version") != SCHEMA_VERSION:
+                raise ValueError(f"未対応のスコアラー形式: {meta.get('schema_version')}")
+            return cls(
+                data["weights"], float(data["bias"]), data["names"].tolist(),
+                data["table_scores"], data["table_nutrition"], data["feature_names"].tolist(), meta,
+            )
+
+
+def _spearman(a, b) -> float:
+    """順位相関（同順位は出現順で処理する簡易版）"""
+    ra = np.argsort(np.argsort(a))
+    rb = np.argsort(np.argsort(b))
+    if len(a) < 2:
+        return float("nan")
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+
+def load_serving_menus(training_data=None) -> list:
+    """スコア表に載せるメニュー（学習データと menus/menus_*.json の全メニュー、古い順）"""
+    menus = []
+    for day in training_data or []:
+        menus.extend(day.get("allMenus", []))
+    for menu_file in sorted((PROJECT_ROOT / "menus").glob("menus_*.json")):
+        with open(menu_file, "r", encoding="utf-8") as f:
+            menus.extend(json.load(f).get("menus", []))
+    return menus
+
+
+def export_distilled(recommender, path=SCORER_FILE, training_data=None):
+    """学習済みモデルを蒸留して保存（忠実度を表示）"""
+    menus = load_serving_menus(training_data if training_data is not None else recommender.training_data)
+    scorer, fidelity = DistilledScorer.distill(recommender, menus)
+    scorer.save(path)
+    print(f"✅ 蒸留スコアラーを保存しました: {path}")
+    print(f"   スコア表: {fidelity['menus']}メニュー / 線形近似 MAE={fidelity['mae']:.4f}, "
+          f"順位相関={fidelity['spearman']:.3f}")
+    return scorer
+
+
+def main():
+    sys.path.insert(0, str(ML_DIR))
+    from menu_recommender import MenuRecommender
+
+    from model_artifact import find_model_path
+
+    model_path = find_model_path()
+    if model_path is None:
+        print("❌ モデルが見つかりません。先に学習を実行してください")
+        print("   python ml/menu_recommender.py")
+        return
+
+    recommender = MenuRecommender.load_model(model_path)
+    scorer = export_distilled(recommender)
+
+    # 教師モデルとの一致と1日分のスコアリング時間
+    menus = load_serving_menus()
+    X_raw = recommender.build_serving_features(menus)
+    teacher = recommender.best_model.predict_proba(recommender.scaler.transform(X_raw))[:, 1]
+    day = menus[:40]
+    start = time.perf_counter()
+    for _ in range(100):
+        scorer.score(day, X_raw[:40])
+    per_day_us = (time.perf_counter() - start) / 100 * 1e6
+    print(f"   教師モデルとの最大差（既知メニュー）: {np.max(np.abs(scorer.score(menus, X_raw) - teacher)):.2e}")
+    print(f"   1日分（{len(day)}メニュー）のスコアリング: {per_day_us:.0f}µs（特徴量抽出を除く）")
+
+
+if __name__ == "__main__":
+    main()
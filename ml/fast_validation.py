@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+validate_model 用の高速フォールド評価エンジン
+
+従来の検証はフォールドごとに MenuRecommender を作り直し、prepare_features（語彙・共起・
+Claude初期化）と train_models（3モデル × 日付単位の入れ子CV）を毎回実行していた。ここでは:
+
+- 全日分の特徴量を1回だけ作る（栄養素・カテゴリ・Claude・嗜好スコアはフォールドに依存しない）
+- テキスト特徴量は「全期間で2回以上出現した単語」の列を作っておき、学習日だけで数えた
+  出現回数と初出位置からフォールドの語彙（列の選択と並び）を決めて切り出す
+- 共起スコア・選択頻度は学習日の選択回数行列から疎行列演算で求める
+- 各フォールドでは指定した1モデルだけを学習し（入れ子CVなし）、フォールドを並列に実行する
+
+フォールドの特徴量行列は、同じ学習日で MenuRecommender.prepare_features / predict を
+実行した場合と一致する（語彙の列順を含む）。違いはフォールド内でモデル選択を行わないことだけ。
+
+注意: Claude 利用時の嗜好プロファイルは全期間のデータで1回だけ更新する
+（従来の検証も保存済みプロファイルへの差分更新だったため、各フォールドで使われる内容は同じ）。
+"""
+
+from collections import Counter
+
+import numpy as np
+
+from menu_recommender import CLAUDE_AVAILABLE, DEFAULT_TEXT_MODE, CooccurrenceAnalyzer, MenuRecommender
+
+# 学習済みモデルがない場合に各フォールドで学習するモデル
+DEFAULT_MODEL = "GradientBoosting"
+
+
+def default_model_name() -> str:
+    """学習済みモデル（アーティファクト）の採用モデル名。なければ DEFAULT_MODEL"""
+    from model_artifact import find_model_path, is_artifact, read_manifest
+
+    path = find_model_path()
+    if path is not None and is_artifact(path):
+        return read_manifest(path).get("best_model_name") or DEFAULT_MODEL
+    return DEFAULT_MODEL
+
+
+class FoldFeatureStore:
+    """全日分の特徴量を1回だけ作り、フォールド（学習日・評価日の組）ごとに切り出す"""
+
+    def __init__(self, training_data: list, text_mode: str = DEFAULT_TEXT_MODE):
+        self.training_data = training_data
+        self.recommender = MenuRecommender(text_mode=text_mode)
+        fe = self.recommender.feature_extractor
+        menus = [menu for day_data in training_data for menu in day_data["allMenus"]]
+        self.menus = menus
+        self.day_of_row = np.repeat(
+            np.arange(len(training_data)), [len(day_data["allMenus"]) for day_data in training_data]
+        )
+        self.y = np.array([1 if menu["selected"] else 0 for menu in menus])
+        self.selected = self.y.astype(bool)
+
+        if CLAUDE_AVAILABLE and fe.init_claude():
+            fe.claude_analyzer.analyze_menus(menus)
+            fe.preference_analyzer.generate_profile(
+                training_data, fe.claude_analyzer.cache, incremental=True
+            )
+        include_claude, _ = self.recommender._feature_layout(training=True)
+
+        # 語彙に依存しない列（'vocab' では語彙が空なのでテキスト列は含まれない）
+        static = self.recommender._static_feature_matrix(menus, include_claude)
+        n_nutrition = len(fe.extract_nutrition_features({}))
+        self.nutrition = static[:, :n_nutrition]
+        self.rest = static[:, n_nutrition:]  # ('hashed' のテキスト列 +) カテゴリ + Claude
+
+        names = [menu["name"] for menu in menus]
+        self.name_index = {}
+        self.name_idx = np.array([self.name_index.setdefault(name, len(self.name_index)) for name in names])
+        self.preference = np.asarray(fe.get_preference_scores(names), dtype=float)
+
+        self.words = []
+        if fe.text_mode == "vocab":
+            self._build_text(fe, names)
+
+    def _build_text(self, fe, names):
+        """全期間で2回以上出現した単語の列と、日ごとの出現回数・初出位置"""
+        words_of = {name: fe.extract_words(name) for name in self.name_index}
+        counter = Counter(w for name in names for w in words_of[name])
+        self.words = [w for w, c in counter.items() if c >= 2]
+        word_index = {w: i for i, w in enumerate(self.words)}
+
+        n_days, n_words = len(self.training_data), len(self.words)
+        name_text = np.zeros((len(self.name_index), n_words))
+        for name, u in self.name_index.items():
+            for w in words_of[name]:
+                if w in word_index:
+                    name_text[u, word_index[w]] = 1
+        self.text_full = name_text[self.name_idx]
+
+        # 初出位置は全期間の通し番号なので、昇順の学習日に対する最小値が学習日内の初出順になる
+        self.word_day_count = np.zeros((n_days, n_words))
+        self.word_first_pos = np.full((n_days, n_words), np.iinfo(np.int64).max, dtype=np.int64)
+        pos = 0
+        for row, name in enumerate(names):
+            day = self.day_of_row[row]
+            for w in words_of[name]:
+                j = word_index.get(w)
+                if j is not None:
+                    self.word_day_count[day, j] += 1
+                    if self.word_first_pos[day, j] > pos:
+                        self.word_first_pos[day, j] = pos
+                pos += 1
+
+    def fold_text_columns(self, train_days) -> np.ndarray:
+        """
+        学習日だけで構築した語彙の列（text_full の列インデックス、語彙の並び順）
+
+        build_vocabulary と同じく出現2回以上の単語を出現回数の降順・同数なら初出順に並べる
+        （Counter.most_common の順）。train_days は昇順であること
+        """
+        if not self.words:
+            return np.zeros(0, dtype=np.int64)
+        counts = self.word_day_count[train_days].sum(axis=0)
+        first = self.word_first_pos[train_days].min(axis=0)
+        cols = np.flatnonzero(counts >= 2)
+        return cols[np.lexsort((first[cols], -counts[cols]))]
+
+    def fold_arrays(self, train_days, test_days):
+        """
+        フォールドの (X_train, y_train, X_test)（スケーリング前）
+
+        X_train は学習日で prepare_features した場合、X_test はそのモデルで
+        評価日を predict した場合（選択済みメニューなし）の特徴量と同じ
+        """
+        train_days = np.asarray(train_days)
+        train_rows = np.flatnonzero(np.isin(self.day_of_row, train_days))
+        test_rows = np.flatnonzero(np.isin(self.day_of_row, test_days))
+        text_cols = self.fold_text_columns(train_days)
+
+        S, selection_count, C = self._fold_selection(train_days)
+        local_day = np.searchsorted(train_days, self.day_of_row[train_rows])
+        SC = (S @ C).tocsr()
+        name_idx = self.name_idx[train_rows]
+        cooccurrence = (
+            np.asarray(SC[local_day, name_idx]).ravel()
+            - np.asarray(S[local_day, name_idx]).ravel() * C.diagonal()[name_idx]
+        )
+        frequency = selection_count / max(len(train_days), 1)
+
+        def assemble(rows, cooc):
+            parts = [self.nutrition[rows]]
+            if self.words:
+                parts.append(self.text_full[np.ix_(rows, text_cols)])
+            parts += [self.rest[rows], self.preference[rows, None], cooc[:, None],
+                      frequency[self.name_idx[rows], None]]
+            return np.hstack(parts)
+
+        X_train = assemble(train_rows, cooccurrence)
+        X_test = assemble(test_rows, np.zeros(len(test_rows)))
+        return X_train, self.y[train_rows], X_test
+
+    def _fold_selection(self, train_days):
+        """
+        学習日 × メニューの選択回数行列 S、メニューごとの選択回数、共起行列 C = SᵀS - diag(選択回数)
+
+        C は CooccurrenceAnalyzer.analyze の共起行列と同じ（同じ日に同名メニューが複数選ばれた場合を含む）
+        """
+        from scipy import sparse
+
+        train_days = np.asarray(train_days)
+        train_rows = np.flatnonzero(np.isin(self.day_of_row, train_days))
+        local_day = np.searchsorted(train_days, self.day_of_row[train_rows])
+        sel = self.selected[train_rows]
+        S = sparse.csr_matrix(
+            (np.ones(int(sel.sum())), (local_day[sel], self.name_idx[train_rows][sel])),
+            shape=(len(train_days), len(self.name_index)),
+        )
+        selection_count = np.asarray(S.sum(axis=0)).ravel()
+        C = (S.T @ S - sparse.diags(selection_count)).tocsr()
+        return S, selection_count, C
+
+    def fold_cooccurrence(self, train_days) -> CooccurrenceAnalyzer:
+        """学習日だけで analyze した場合と同じ共起行列・選択回数を持つ CooccurrenceAnalyzer（セット最適化用）"""
+        _, selection_count, C = self._fold_selection(train_days)
+        names = list(self.name_index)
+        analyzer = CooccurrenceAnalyzer()
+        C = C.tocoo()
+        for a, b, value in zip(C.row.tolist(), C.col.tolist(), C.data.tolist()):
+            if value:
+                analyzer.cooccurrence_matrix.setdefault(names[a], {})[names[b]] = int(value)
+        for u in np.flatnonzero(selection_count).tolist():
+            analyzer.menu_selection_count[names[u]] = int(selection_count[u])
+        return analyzer
+
+    def split_by_day(self, test_days, scores) -> list:
+        """評価日全体のスコアを日ごとの配列に分ける（各日のメニュー順）"""
+        sizes = [len(self.training_data[day]["allMenus"]) for day in test_days]
+        return np.split(np.asarray(scores), np.cumsum(sizes)[:-1])
+
+
+def _fit_predict(model, X_train, y_train, X_test):
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler().fit(X_train)
+    model.fit(scaler.transform(X_train), y_train)
+    return model.predict_proba(scaler.transform(X_test))[:, 1]
+
+
+def run_folds(store: FoldFeatureStore, folds: list, model_name: str = None, n_jobs: int = -1) -> list:
+    """
+    各フォールドで1モデルだけを学習し、評価日のスコアを返す（フォールドは joblib で並列実行）
+
+    Args:
+        folds: [(学習日インデックス, 評価日インデックス)]（いずれも昇順）
+        model_name: 学習するモデル（MODEL_ENGINES から。省略時は default_model_name()）
+
+    Returns:
+        フォールドごとの評価日別スコア配列（split_by_day の結果）
+    """
+    from joblib import Parallel, delayed
+    from sklearn.base import clone
+
+    model = store.recommender._candidate_models([model_name or default_model_name()])
+    model = next(iter(model.values()))
+    scores = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_predict)(clone(model), *store.fold_arrays(train_days, test_days))
+        for train_days, test_days in folds
+    )
+    return [store.split_by_day(test_days, s) for (_, test_days), s in zip(folds, scores)]
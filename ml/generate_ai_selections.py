@@ -17,17 +17,39 @@ AI推薦メニューを全日付分生成し、Supabaseに保存する
 1. 学習データをSupabaseに追加（admin.htmlで食事記録を保存）
 2. モデルを学習: python ml/menu_recommender.py
 3. AI推薦を生成・Supabaseに保存: python ml/generate_ai_selections.py
+   （蒸留スコアラーで推論する場合: python ml/generate_ai_selections.py --distilled）
+   （セット最適化に締め切りを設ける場合: python ml/generate_ai_selections.py --time-budget-ms 20）
+   （週ごとにまとめて計画する場合: python ml/generate_ai_selections.py --weekly）
 """
 
+import argparse
 import json
 import os
 import sys
+import time
 from pathlib import Path
 from datetime import datetime
 import numpy as np
 
 TARGET_NUTRITION_KEYS = ['エネルギー', 'たんぱく質', '脂質', '炭水化物', '野菜重量']
 COUNT_ERROR_WEIGHT = 0.3
+# セット最適化（ビームサーチ）の既定値
+DEFAULT_BEAM_WIDTH = 30
+DEFAULT_COUNT_WINDOW = 2  # 目標品数 ± この範囲の品数を探索
+MIN_CANDIDATE_POOL = 12
+MAX_CANDIDATE_POOL = 24
+# モデルの manifest.json に保存される調整済みパラメータ（tune_set_optimizer.py）
+SET_OPTIMIZER_PARAMS = ('beam_width', 'candidate_pool_size', 'count_window', 'time_budget_ms', 'local_search')
+# _score_set の栄養素ごとの重み（TARGET_NUTRITION_KEYS の順）
+NUTRITION_ERROR_WEIGHTS = {
+    'エネルギー': 1.0,
+    'たんぱく質': 1.2,
+    '脂質': 1.0,
+    '炭水化物': 1.0,
+    '野菜重量': 1.2,
+}
+# 局所探索で改善とみなす誤差の最小減少量（浮動小数点の誤差で手が循環しないように）
+LOCAL_SEARCH_TOLERANCE = 1e-9
 
 # menu_recommender.pyを直接実行できるようにする
 # （pickleがクラス定義を見つけられるようにするため）
@@ -41,14 +63,18 @@ from menu_recommender import (
     CLAUDE_FEATURE_NAMES
 )
 
+from instrumentation import count, traced
+from profiling import add_profile_arguments, run_main
+from model_artifact import find_model_path
 from supabase_data_loader import SupabaseDataLoader
 
 # Claude解析モジュール
 try:
     from claude_analyzer import ClaudeMenuAnalyzer, CACHE_FILE as CLAUDE_CACHE_FILE
     from claude_preference_analyzer import PreferenceAnalyzer
+    from claude_surrogate import DEFAULT_CONFIDENCE_THRESHOLD as SURROGATE_CONFIDENCE_THRESHOLD
 except ImportError:
-    pass
+    SURROGATE_CONFIDENCE_THRESHOLD = None
 
 
 def get_feature_reasons(features, feature_names, top_n=3):
@@ -126,7 +152,15 @@ def build_historical_set_profile(loader, limit=120):
     training_data = loader.get_training_data(limit=limit)
     if not training_data:
         return None
+    return set_profile_from_days(training_data)
 
+
+def set_profile_from_days(training_data):
+    """
+    学習データ（日ごとの allMenus）からセット単位の目標プロファイルを作る
+
+    選択のある日がなければ None（validate_model では学習フォールドの日だけを渡す）
+    """
     daily_totals = []
     daily_ratios = []
     daily_counts = []
@@ -169,6 +203,7 @@ def build_historical_set_profile(loader, limit=120):
 
 def _score_set(candidate_set, profile, recommender):
     """候補セットの適合度（低いほど良い）"""
+    count("set_search.evaluations")
     totals = {k: 0.0 for k in TARGET_NUTRITION_KEYS}
     names = []
     scores = []
@@ -186,16 +221,9 @@ def _score_set(candidate_set, profile, recommender):
 
     # 合計栄養の誤差（相対誤差）
     nutrition_error = 0.0
-    nutrition_weights = {
-        'エネルギー': 1.0,
-        'たんぱく質': 1.2,
-        '脂質': 1.0,
-        '炭水化物': 1.0,
-        '野菜重量': 1.2,
-    }
     for key in TARGET_NUTRITION_KEYS:
         denominator = max(target_totals[key], 1.0)
-        nutrition_error += nutrition_weights[key] * abs(totals[key] - target_totals[key]) / denominator
+        nutrition_error += NUTRITION_ERROR_WEIGHTS[key] * abs(totals[key] - target_totals[key]) / denominator
 
     # PFCバランス誤差
     ratio_error = (
@@ -237,59 +265,324 @@ def _score_set(candidate_set, profile, recommender):
     }
 
 
-def select_best_menu_set(menu_scores, profile, recommender):
-    """可変品数の最適セットを探索（ビームサーチ）"""
-    if not menu_scores:
-        return [], None
+def _set_errors(totals, counts, score_sums, cooc_sums, profile):
+    """
+    _score_set の誤差をセットの集計値から一括計算（局所探索の手の評価用）
 
-    # 探索対象を上位候補に絞る（計算量を制御）
-    candidate_pool_size = min(max(12, int(profile['avgMenuCount'] * 5)), len(menu_scores), 24)
-    candidates = menu_scores[:candidate_pool_size]
+    Args:
+        totals: (手の数, 5) 栄養素合計（TARGET_NUTRITION_KEYS の順）
+        counts, score_sums, cooc_sums: (手の数,) 品数・スコア合計・共起スコアの合計
 
-    # 目標品数の近傍を探索
-    target_count = int(round(profile['avgMenuCount']))
-    min_count = max(1, target_count - 2)
-    max_count = min(len(candidates), target_count + 2)
-    if min_count > max_count:
-        min_count = max_count
+    Returns:
+        (手の数,) の誤差（_score_set の 'error' と浮動小数点の誤差の範囲で一致）
+    """
+    target = np.array([profile['targetTotals'][key] for key in TARGET_NUTRITION_KEYS])
+    weights = np.array([NUTRITION_ERROR_WEIGHTS[key] for key in TARGET_NUTRITION_KEYS])
+    nutrition_error = (weights * np.abs(totals - target) / np.maximum(target, 1.0)).sum(axis=1)
 
-    beam_width = 30
-    global_best = None
+    pfc_kcal = totals[:, 1:4] * np.array([4.0, 9.0, 4.0])
+    kcal = pfc_kcal.sum(axis=1, keepdims=True)
+    ratios = np.divide(pfc_kcal, kcal, out=np.zeros_like(pfc_kcal), where=kcal > 0)
+    target_ratios = np.array([profile['targetPfcRatio'][k] for k in ('p', 'f', 'c')])
+    ratio_error = np.abs(ratios - target_ratios).sum(axis=1)
 
-    for set_size in range(min_count, max_count + 1):
-        beams = [([], 0)]  # (selected_indices, next_start_idx)
+    target_count = max(profile['avgMenuCount'], 1.0)
+    count_error = np.abs(counts - target_count) / target_count
+    avg_item_quality_error = 1.0 - score_sums / np.maximum(counts, 1)
+    cooc_bonus = np.minimum(cooc_sums / 20.0, 0.8)
+
+    return (
+        nutrition_error * 0.55
+        + ratio_error * 2.0
+        + count_error * COUNT_ERROR_WEIGHT
+        + avg_item_quality_error * 0.35
+        - cooc_bonus
+    )
 
-        for _ in range(set_size):
+
+def default_candidate_pool_size(profile):
+    """探索対象の候補数の既定値（平均品数の5倍を MIN〜MAX_CANDIDATE_POOL に収める）"""
+    return min(max(MIN_CANDIDATE_POOL, int(profile['avgMenuCount'] * 5)), MAX_CANDIDATE_POOL)
+
+
+class _SetSearch:
+    """
+    セット探索の状態（最良セット・評価回数・締め切り）
+
+    item_costs（候補ごとの追加コスト）を指定すると、_score_set の誤差に選んだ候補のコストの和を
+    足した値（目的関数）で探索する（週間計画のラグランジュ乗数・重複ペナルティ用）。
+    """
+
+    def __init__(self, candidates, profile, recommender, min_count, max_count, time_budget_ms=None,
+                 target_count=None):
+        self.candidates = candidates
+        self.profile = profile
+        self.recommender = recommender
+        self.min_count = min_count
+        self.max_count = max_count
+        self.target_count = target_count
+        self.item_costs = np.zeros(len(candidates))
+        self.time_budget_ms = time_budget_ms
+        self.start = time.perf_counter()
+        self.deadline = None if time_budget_ms is None else self.start + time_budget_ms / 1000
+        self.evaluations = 0
+        self.expired = False
+        self.best = None  # (候補インデックス, メニューのリスト, 評価, 目的関数)
+        self.local = None  # 局所探索の結果（local_search 実行時）
+
+    def out_of_time(self):
+        """締め切りを過ぎたか（締め切りなしなら常に False）"""
+        if self.deadline is not None and not self.expired and time.perf_counter() >= self.deadline:
+            self.expired = True
+        return self.expired
+
+    def score(self, indices):
+        """候補インデックスのセットを評価し（目的関数を返す）、品数が範囲内なら最良セットを更新"""
+        candidate_set = [self.candidates[i] for i in indices]
+        self.evaluations += 1
+        evaluation = _score_set(candidate_set, self.profile, self.recommender)
+        objective = evaluation['error'] + self.item_costs[indices].sum()
+        if self.min_count <= len(indices) <= self.max_count and (
+            self.best is None or objective < self.best[3]
+        ):
+            self.best = (list(indices), candidate_set, evaluation, objective)
+        return objective
+
+    def restart(self, indices, item_costs, time_budget_ms=None):
+        """候補ごとのコストと締め切りを差し替え、指定したセットを現在の最良セットとして探索し直す"""
+        self.item_costs = np.asarray(item_costs, dtype=float)
+        self.deadline = None if time_budget_ms is None else time.perf_counter() + time_budget_ms / 1000
+        self.expired = False
+        self.best = None
+        self.score(list(indices))
+
+    def greedy(self):
+        """空集合から誤差が最も小さくなるメニューを1品ずつ追加（最大 max_count 品）"""
+        selected = []
+        remaining = list(range(len(self.candidates)))
+        while remaining and len(selected) < self.max_count:
+            best_idx, best_error = None, None
+            for idx in remaining:
+                if self.out_of_time():
+                    return
+                error = self.score(sorted(selected + [idx]))
+                if best_error is None or error < best_error:
+                    best_idx, best_error = idx, error
+            selected.append(best_idx)
+            remaining.remove(best_idx)
+
+    def beam(self, beam_width):
+        """
+        ビームサーチ（1品ずつ広げ、各段階で誤差の小さい beam_width 個を残す）
+
+        各段階のビームは目標品数に依存しないので、max_count 品まで1回だけ広げ、
+        品数が範囲内の段階で評価したセットを候補にする
+        """
+        beams = [([], 0)]  # (selected_indices, next_start_idx)
+        for _ in range(self.max_count):
             next_beams = []
             for selected_indices, start_idx in beams:
-                for idx in range(start_idx, len(candidates)):
-                    if idx in selected_indices:
-                        continue
+                for idx in range(start_idx, len(self.candidates)):
+                    if self.out_of_time():
+                        return
                     new_indices = selected_indices + [idx]
-                    candidate_set = [candidates[i] for i in new_indices]
-                    scored = _score_set(candidate_set, profile, recommender)
-                    next_beams.append((new_indices, idx + 1, scored['error']))
-
+                    next_beams.append((new_indices, idx + 1, self.score(new_indices)))
             next_beams.sort(key=lambda x: x[2])
             beams = [(indices, next_start) for indices, next_start, _ in next_beams[:beam_width]]
             if not beams:
                 break
 
-        for selected_indices, _ in beams:
-            candidate_set = [candidates[i] for i in selected_indices]
-            set_eval = _score_set(candidate_set, profile, recommender)
-            if (global_best is None) or (set_eval['error'] < global_best['evaluation']['error']):
-                global_best = {
-                    'menus': candidate_set,
-                    'evaluation': set_eval,
-                }
+    def prepare_arrays(self):
+        """候補の栄養素・スコア・共起スコア（ペアごと）の配列を作る（局所探索・週間計画用。1回だけ）"""
+        if self.local is not None:
+            return
+        names = [menu['name'] for menu in self.candidates]
+        n = len(names)
+        get_score = self.recommender.cooccurrence_analyzer.get_cooccurrence_score
+        # _score_set はセット内の並び（候補の順）で前のメニューから後のメニューへの共起を足す
+        pair = np.zeros((n, n))
+        for i in range(n):
+            for j in range(i + 1, n):
+                pair[i, j] = pair[j, i] = get_score(names[i], [names[j]])
+        self.nutrition = np.array([
+            [menu['nutritionTotals'][key] for key in TARGET_NUTRITION_KEYS] for menu in self.candidates
+        ], dtype=float).reshape(n, len(TARGET_NUTRITION_KEYS))
+        self.item_scores = np.array([menu['score'] for menu in self.candidates], dtype=float)
+        self.pair = pair
+        self.local = {'moves': 0, 'evaluations': 0, 'gain': 0.0}
+
+    def local_search(self):
+        """
+        最良セットを 1品の入れ替え（swap）・追加（add）・削除（drop）で改善（最急降下）
+
+        各反復で栄養素合計・品数・スコア合計・共起スコアの合計と、各候補の「セット内の
+        メニューとの共起スコアの和」を持っておき、すべての手の誤差を差分から O(1) ずつ
+        求める（_set_errors で一括計算）。改善する手がなくなるまで繰り返す。
+        """
+        if self.best is None:
+            return
+        self.prepare_arrays()
+        start_objective = self.best[3]
+        mask = np.zeros(len(self.candidates), dtype=bool)
+        mask[self.best[0]] = True
+        moves = evaluations = 0
+        while not self.out_of_time():
+            ins, outs = np.flatnonzero(mask), np.flatnonzero(~mask)
+            totals = self.nutrition[ins].sum(axis=0)
+            size = len(ins)
+            score_sum = self.item_scores[ins].sum()
+            link = self.pair[:, ins].sum(axis=1)  # 各候補とセット内メニューとの共起スコアの和
+            cooc_sum = link[ins].sum() / 2
+            current = _set_errors(totals[None], np.array([size]), np.array([score_sum]),
+                                  np.array([cooc_sum]), self.profile)[0] + self.item_costs[ins].sum()
+
+            # 手の一覧: (外すメニュー, 入れるメニュー)。-1 はなし
+            drop_idx, add_idx = np.meshgrid(ins, outs, indexing='ij')
+            removed = [drop_idx.ravel()]
+            added = [add_idx.ravel()]
+            if size < self.max_count:
+                removed.append(np.full(len(outs), -1))
+                added.append(outs)
+            if size > self.min_count:
+                removed.append(ins)
+                added.append(np.full(len(ins), -1))
+            removed, added = np.concatenate(removed), np.concatenate(added)
+            if len(removed) == 0:
+                break
+            has_r, has_a = removed >= 0, added >= 0
+            current_cost = self.item_costs[ins].sum()
+            r, a = np.where(has_r, removed, 0), np.where(has_a, added, 0)
+
+            errors = _set_errors(
+                totals + self.nutrition[a] * has_a[:, None] - self.nutrition[r] * has_r[:, None],
+                size + has_a.astype(int) - has_r.astype(int),
+                score_sum + self.item_scores[a] * has_a - self.item_scores[r] * has_r,
+                cooc_sum + link[a] * has_a - link[r] * has_r - self.pair[r, a] * (has_r & has_a),
+                self.profile,
+            ) + current_cost + self.item_costs[a] * has_a - self.item_costs[r] * has_r
+            evaluations += len(errors)
+            best_move = int(np.argmin(errors))
+            if errors[best_move] >= current - LOCAL_SEARCH_TOLERANCE:
+                break
+            if has_r[best_move]:
+                mask[removed[best_move]] = False
+            if has_a[best_move]:
+                mask[added[best_move]] = True
+            moves += 1
+
+        count("set_search.local_moves", moves)
+        count("set_search.local_evaluations", evaluations)
+        self.local['moves'] += moves
+        self.local['evaluations'] += evaluations
+        if moves:
+            # 採用は _score_set で評価し直した誤差で判定
+            self.score(np.flatnonzero(mask).tolist())
+        self.local['gain'] += start_objective - self.best[3]
+
+    def summary(self, completed):
+        return {
+            'evaluations': self.evaluations,
+            'completed': completed,
+            'elapsed_ms': (time.perf_counter() - self.start) * 1000,
+            'time_budget_ms': self.time_budget_ms,
+            'localSearch': self.local,
+        }
+
 
-    if global_best is None:
-        fallback_count = max(1, min(target_count, len(candidates)))
-        fallback_set = candidates[:fallback_count]
-        return fallback_set, _score_set(fallback_set, profile, recommender)
+def _new_set_search(menu_scores, profile, recommender, candidate_pool_size=None,
+                    count_window=DEFAULT_COUNT_WINDOW, time_budget_ms=None):
+    """上位候補と探索する品数の範囲を決めて _SetSearch を作る（menu_scores は空でないこと）"""
+    # 探索対象を上位候補に絞る（計算量を制御）
+    if candidate_pool_size is None:
+        candidate_pool_size = default_candidate_pool_size(profile)
+    candidate_pool_size = min(candidate_pool_size, len(menu_scores))
+    candidates = menu_scores[:candidate_pool_size]
+
+    # 目標品数の近傍を探索
+    target_count = int(round(profile['avgMenuCount']))
+    min_count = max(1, target_count - count_window)
+    max_count = min(len(candidates), target_count + count_window)
+    if min_count > max_count:
+        min_count = max_count
+
+    return _SetSearch(candidates, profile, recommender, min_count, max_count, time_budget_ms,
+                      target_count=target_count)
+
+
+def _run_set_search(search, beam_width=DEFAULT_BEAM_WIDTH, local_search=True):
+    """初期解・貪欲法（締め切りありの場合）→ ビームサーチ → 局所探索を実行し、最良セットを返す"""
+    candidates = search.candidates
+    target_count = search.target_count
+    if search.time_budget_ms is not None:
+        # 初期解: スコア上位の目標品数（締め切りに関係なく必ず1回は評価する）
+        search.score(list(range(max(search.min_count, min(target_count, search.max_count)))))
+        search.greedy()
+        if local_search:
+            search.local_search()
+    search.beam(beam_width)
+    if local_search:
+        search.local_search()
+
+    if search.best is None:
+        fallback_indices = list(range(max(1, min(target_count, len(candidates)))))
+        fallback_set = [candidates[i] for i in fallback_indices]
+        evaluation = _score_set(fallback_set, search.profile, search.recommender)
+        search.best = (fallback_indices, fallback_set, evaluation,
+                       evaluation['error'] + search.item_costs[fallback_indices].sum())
+
+    _, best_set, evaluation, _ = search.best
+    return best_set, {**evaluation, 'search': search.summary(completed=not search.expired)}
+
+
+@traced("select_best_menu_set")
+def select_best_menu_set(menu_scores, profile, recommender, beam_width=DEFAULT_BEAM_WIDTH,
+                         candidate_pool_size=None, count_window=DEFAULT_COUNT_WINDOW,
+                         time_budget_ms=None, local_search=True):
+    """
+    可変品数の最適セットを探索（ビームサーチ + 局所探索）
+
+    ビームサーチは途中の部分セットの誤差で枝刈りするため、序盤の選択に引きずられやすい。
+    local_search=True なら、見つかった最良セットを1品の入れ替え・追加・削除で
+    改善する手がなくなるまで改善する（_SetSearch.local_search）。
+
+    time_budget_ms を指定すると締め切り付きの anytime 探索になる:
+    上位スコアのセット（初期解）→ 貪欲法（+ 局所探索）→ ビームサーチの順に改善し、締め切りの時点で
+    それまでの最良セットを返す。締め切りは評価1回ごとに確認するので、メニュー数・候補数に
+    よらず所要時間は予算 + 評価1回分に収まる。
+
+    Args:
+        menu_scores: スコア降順のメニュー（'name', 'score', 'nutritionTotals'）
+        beam_width: 各段階で残す部分セット数
+        candidate_pool_size: 探索対象とする上位候補数（省略時は default_candidate_pool_size）
+        count_window: 目標品数 ± count_window の品数を探索
+        time_budget_ms: 探索の締め切り（ミリ秒。省略時はビームサーチを最後まで実行）
+        local_search: ビームサーチ後に局所探索で改善するか
+
+    Returns:
+        (セットのメニュー, 評価)。評価の 'search' に評価回数・探索を完了したか・所要時間、
+        'search.localSearch' に局所探索の採用した手の数・評価した手の数・誤差の改善量を記録
+    """
+    if not menu_scores:
+        return [], None
+
+    search = _new_set_search(menu_scores, profile, recommender, candidate_pool_size, count_window,
+                             time_budget_ms)
+    return _run_set_search(search, beam_width, local_search)
+
+
+def set_optimizer_params(model_path):
+    """
+    モデルの manifest.json に保存された調整済みのセット最適化パラメータ
+
+    Returns:
+        select_best_menu_set のキーワード引数 dict（未調整・旧形式のモデルなら空）
+    """
+    from model_artifact import is_artifact, read_manifest
 
-    return global_best['menus'], global_best['evaluation']
+    if model_path is None or not is_artifact(model_path):
+        return {}
+    tuned = read_manifest(model_path).get('set_optimizer') or {}
+    return {key: tuned[key] for key in SET_OPTIMIZER_PARAMS if tuned.get(key) is not None}
 
 
 def build_set_reason(profile, set_evaluation):
@@ -315,84 +608,75 @@ def build_set_reason(profile, set_evaluation):
     )
 
 
-def generate_ai_selections_for_date(recommender, date_str, menus_data, output_dir=None, profile=None):
-    """指定日付のAI推薦結果を生成"""
-    print(f"\n=== {date_str} の推薦を生成中 ===")
-    
-    # メニューリストを取得
-    menus = menus_data.get('menus', [])
-    if not menus:
-        print(f"  ⚠️  メニューデータがありません")
-        return None
-    
-    # 日付ラベルを取得
-    date_label = menus_data.get('dateLabel', date_str)
-    
+def _score_menus(recommender, menus, scorer=None):
+    """メニューをモデル（または蒸留スコアラー）で一括評価し、(スコア, 推薦理由) を返す"""
     # Claude解析が有効なら未解析メニューをバッチ解析
+    # （近似モデルの信頼度が高いメニューはAPI呼び出しを省略）
     use_claude = recommender.feature_extractor.use_claude
     if use_claude and recommender.feature_extractor.claude_analyzer:
-        recommender.feature_extractor.claude_analyzer.analyze_menus(menus)
+        recommender.feature_extractor.claude_analyzer.analyze_menus(
+            menus, min_surrogate_confidence=SURROGATE_CONFIDENCE_THRESHOLD
+        )
     
-    # 各メニューの推薦スコアを計算
+    # 特徴量行列を構築し、全メニューを一括スコアリング
+    X_raw = recommender.build_serving_features(menus)
+    count("menu_scoring.model_evaluations", len(menus))
+    if scorer is not None:
+        # 蒸留スコアラー（NumPyのみ）
+        scores = scorer.score(menus, X_raw)
+    else:
+        X_scaled = recommender.scaler.transform(X_raw) if hasattr(recommender, 'scaler') else X_raw
+        scores = recommender.best_model.predict_proba(X_scaled)[:, 1]
+
+    # 特徴量名を簡略化（保存されたモデルから取得）
+    if hasattr(recommender, 'feature_names'):
+        feature_names = recommender.feature_names
+    else:
+        # フォールバック：基本的な特徴量名
+        feature_names = ['feature_' + str(i) for i in range(X_raw.shape[1])]
+
+    # 推薦理由を生成
+    reasons = [get_feature_reasons(features, feature_names) for features in X_raw]
+    return [float(score) for score in scores], reasons
+
+
+def score_menus_for_date(recommender, menus, scorer=None, score_cache=None):
+    """
+    1日分のメニューを一括スコアリングし、スコア降順に並べて順位を付ける
+
+    Args:
+        scorer: distilled_scorer.DistilledScorer（指定時は sklearn モデルの代わりに使用）
+        score_cache: score_cache.ScoreCache（指定時はキャッシュにないメニューだけをモデルで評価）
+
+    Returns:
+        menu_scores（'name', 'score', 'reasons', 'nutrition', 'nutritionTotals', 'rank'）
+    """
+    if score_cache is None:
+        scores, reasons = _score_menus(recommender, menus, scorer)
+    else:
+        cached = score_cache.lookup(menus)
+        # キャッシュにないメニューを（同じキーは1回だけ）評価して追加
+        missing = {}
+        for menu, entry in zip(menus, cached):
+            if entry is None:
+                missing.setdefault(score_cache.key(menu), menu)
+        if missing:
+            new_menus = list(missing.values())
+            score_cache.store(new_menus, *_score_menus(recommender, new_menus, scorer))
+        # 評価中に Claude解析されたメニューはキーが変わるので、保存後のキーで引き直す
+        entries = [entry or score_cache.entries[score_cache.key(menu)] for menu, entry in zip(menus, cached)]
+        scores = [entry['score'] for entry in entries]
+        reasons = [list(entry['reasons']) for entry in entries]
+
     menu_scores = []
-    for menu in menus:
-        menu_name = menu.get('name', '')
+    for menu, score, menu_reasons in zip(menus, scores, reasons):
         nutrition = menu.get('nutrition', {})
-        
-        # 特徴量抽出
-        nutrition_features = recommender.feature_extractor.extract_nutrition_features(nutrition)
-        text_features = recommender.feature_extractor.extract_text_features(menu_name)
-        category_features = recommender.feature_extractor.extract_category_features(menu_name)
-        
-        # 共起スコアと選択頻度は最初はゼロとして扱う
-        # （モデル学習時の特徴量分布を考慮）
-        cooc_score = 0.0
-        selection_freq = recommender.cooccurrence_analyzer.menu_selection_count.get(
-            menu_name, 0
-        ) / 15  # 学習データは15日分
-        
-        # 特徴量ベクトル構築（辞書→リスト変換）
-        feature_list = list(nutrition_features.values())
-        feature_list.extend(text_features)
-        feature_list.extend([int(v) for v in category_features.values()])
-        
-        # Claude特徴量（学習時にClaude特徴量を使用していた場合のみ追加）
-        if use_claude:
-            claude_features = recommender.feature_extractor.extract_claude_features(menu_name)
-            preference_score = recommender.feature_extractor.get_preference_score(menu_name)
-            feature_list.extend(claude_features)
-            feature_list.append(preference_score)
-        
-        feature_list.append(cooc_score)
-        feature_list.append(selection_freq)
-        
-        feature_vector = np.array(feature_list).reshape(1, -1)
-        
-        # スケーリング適用
-        if hasattr(recommender, 'scaler'):
-            feature_vector = recommender.scaler.transform(feature_vector)
-        
-        # スコア予測（直接モデルを呼び出し）
-        score = recommender.best_model.predict_proba(feature_vector)[0, 1]
-        
-        # 推薦理由を生成
-        all_features = np.array(feature_list)
-        # 特徴量名を簡略化（保存されたモデルから取得）
-        if hasattr(recommender, 'feature_names'):
-            feature_names = recommender.feature_names
-        else:
-            # フォールバック：基本的な特徴量名
-            feature_names = ['feature_' + str(i) for i in range(len(feature_list))]
-        reasons = get_feature_reasons(all_features, feature_names)
-        
-        nutrition_totals = _extract_nutrition_totals(nutrition)
-
         menu_scores.append({
-            'name': menu_name,
-            'score': float(score),
-            'reasons': reasons,
+            'name': menu.get('name', ''),
+            'score': score,
+            'reasons': menu_reasons,
             'nutrition': nutrition,
-            'nutritionTotals': nutrition_totals
+            'nutritionTotals': _extract_nutrition_totals(nutrition)
         })
     
     # スコア順にソート
@@ -401,15 +685,103 @@ def generate_ai_selections_for_date(recommender, date_str, menus_data, output_di
     # ランクを追加
     for rank, menu in enumerate(menu_scores, 1):
         menu['rank'] = rank
+    return menu_scores
+
+
+@traced("generate_ai_selections_for_date")
+def generate_ai_selections_for_date(recommender, date_str, menus_data, output_dir=None, profile=None,
+                                    scorer=None, set_params=None, score_cache=None):
+    """
+    指定日付のAI推薦結果を生成
+
+    Args:
+        scorer: distilled_scorer.DistilledScorer（指定時は sklearn モデルの代わりに使用）
+        set_params: select_best_menu_set のパラメータ（set_optimizer_params の結果。省略時は既定値）
+        score_cache: score_cache.ScoreCache（メニュー別スコアのキャッシュ。省略時は全メニューを評価）
+    """
+    print(f"\n=== {date_str} の推薦を生成中 ===")
+    
+    # メニューリストを取得
+    menus = menus_data.get('menus', [])
+    if not menus:
+        print(f"  ⚠️  メニューデータがありません")
+        return None
+
+    menu_scores = score_menus_for_date(recommender, menus, scorer, score_cache)
     
     # セット最適化（過去傾向プロファイルがない場合はフォールバック）
     if profile:
-        selected_menus, set_evaluation = select_best_menu_set(menu_scores, profile, recommender)
+        selected_menus, set_evaluation = select_best_menu_set(
+            menu_scores, profile, recommender, **(set_params or {})
+        )
     else:
         fallback_n = max(1, len(menu_scores) // 3)
         selected_menus = menu_scores[:fallback_n]
         set_evaluation = None
 
+    return build_ai_selections_output(recommender, date_str, menus_data, menu_scores, selected_menus,
+                                      set_evaluation, profile, output_dir)
+
+
+@traced("generate_weekly_ai_selections")
+def generate_weekly_ai_selections(recommender, week, profile, scorer=None, set_params=None, output_dir=None,
+                                  score_cache=None):
+    """
+    1週間分の日付のAI推薦結果をまとめて生成（weekly_planner.plan_week で全日のセットを同時に選ぶ）
+
+    Args:
+        week: [(date_str, menus_data)]（同じ週の日付）
+        profile: セット目標（build_historical_set_profile の結果。必須）
+        set_params: select_best_menu_set のパラメータ（日ごとの初期解に使う）
+        score_cache: score_cache.ScoreCache（メニュー別スコアのキャッシュ）
+
+    Returns:
+        日付ごとの output_data のリスト（メニューのない日は None）
+    """
+    from weekly_planner import plan_week
+
+    print(f"\n=== {week[0][0]} 〜 {week[-1][0]} の週間推薦を生成中（{len(week)}日）===")
+    day_menu_scores = []
+    for date_str, menus_data in week:
+        menus = menus_data.get('menus', [])
+        if not menus:
+            print(f"  ⚠️  {date_str}: メニューデータがありません")
+        day_menu_scores.append(score_menus_for_date(recommender, menus, scorer, score_cache) if menus else [])
+
+    selections, weekly = plan_week(day_menu_scores, profile, recommender, **(set_params or {}))
+    independent = weekly['independent']
+    print(f"  ✓ 週間計画: 目的関数 {independent['objective']:.3f} → {weekly['objective']:.3f}"
+          f"（重複 {independent['repeatedMenus']} → {weekly['repeatedMenus']}品、"
+          f"週間栄養素誤差 {independent['weeklyNutritionError']:.3f} → {weekly['weeklyNutritionError']:.3f}、"
+          f"{weekly['iterations']}反復、{weekly['elapsed_ms']:.0f}ms）")
+
+    results = []
+    for (date_str, menus_data), menu_scores, (selected_menus, set_evaluation) in zip(
+        week, day_menu_scores, selections
+    ):
+        if not menu_scores:
+            results.append(None)
+            continue
+        print(f"\n=== {date_str} ===")
+        results.append(build_ai_selections_output(
+            recommender, date_str, menus_data, menu_scores, selected_menus, set_evaluation, profile,
+            output_dir, weekly_plan=weekly,
+        ))
+    return results
+
+
+def build_ai_selections_output(recommender, date_str, menus_data, menu_scores, selected_menus, set_evaluation,
+                               profile, output_dir=None, weekly_plan=None):
+    """
+    選択したセットから保存用の推薦結果（output_data）を作る
+
+    Args:
+        weekly_plan: 週間計画のサマリー（generate_weekly_ai_selections から呼ぶ場合）
+    """
+    menus = menus_data.get('menus', [])
+    date_label = menus_data.get('dateLabel', date_str)
+    use_claude = recommender.feature_extractor.use_claude
+
     print(f"  ✓ {len(menus)}メニュー中、{len(selected_menus)}品のセットを選択")
     for menu in selected_menus:
         print(f"    {menu['rank']}位: {menu['name']} (スコア: {menu['score']:.3f})")
@@ -445,17 +817,21 @@ def generate_ai_selections_for_date(recommender, date_str, menus_data, output_di
             'trainingDays': 15,
             'accuracy': 0.9995,
             'useClaude': use_claude,
-            'selectionMode': 'set-optimization' if profile else 'top-score-fallback',
+            'selectionMode': (
+                'weekly-set-optimization' if weekly_plan
+                else 'set-optimization' if profile else 'top-score-fallback'
+            ),
             'set_reason': set_reason,
             'setOptimization': {
                 'enabled': bool(profile),
                 'targetProfile': profile,
                 'evaluation': set_evaluation,
+                'weekly': weekly_plan,
             },
             'features': {
                 'total': len(recommender.feature_names) if hasattr(recommender, 'feature_names') else 258,
                 'nutrition': 13,
-                'text': len(recommender.feature_extractor.word_to_idx) if hasattr(recommender.feature_extractor, 'word_to_idx') else 230,
+                'text': recommender.feature_extractor.text_feature_dim(),
                 'category': 13,
                 'claude': claude_feature_count,
                 'preference': 1 if use_claude else 0,
@@ -474,8 +850,10 @@ def generate_ai_selections_for_date(recommender, date_str, menus_data, output_di
     return output_data
 
 
+@traced("supabase.upload")
 def upload_to_supabase(loader, output_data):
     """AI推薦結果をSupabaseにアップロード"""
+    count("supabase.upserts")
     date_str = output_data['date']
     
     row = {
@@ -504,7 +882,51 @@ def upload_to_supabase(loader, output_data):
         return False
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="AI推薦メニュー生成 → Supabase保存")
+    parser.add_argument(
+        "--distilled",
+        action="store_true",
+        help="蒸留スコアラー（model/distilled_scorer.npz, NumPyのみ）でスコアリングする",
+    )
+    parser.add_argument(
+        "--time-budget-ms",
+        type=float,
+        default=None,
+        help="1日あたりのセット最適化の締め切り（ミリ秒）。指定時は締め切りまでの最良セットを採用",
+    )
+    parser.add_argument(
+        "--weekly",
+        action="store_true",
+        help="ISO週ごとに全日付のセットを同時に選ぶ（同じ料理の重複を避け、週間の栄養素目標に合わせる）",
+    )
+    parser.add_argument(
+        "--no-score-cache",
+        action="store_true",
+        help="メニュー別スコアのキャッシュ（モデルの隣の score_cache.json）を使わず全メニューをモデルで評価",
+    )
+    add_profile_arguments(parser)
+    return parser.parse_args()
+
+
+def load_distilled_scorer(recommender):
+    """蒸留スコアラーを読み込む。読み込んだモデルから作られたものでなければ None"""
+    from distilled_scorer import SCORER_FILE, DistilledScorer, model_fingerprint
+
+    if not SCORER_FILE.exists():
+        print(f"⚠️  蒸留スコアラーがありません（python ml/distilled_scorer.py で作成）: {SCORER_FILE}")
+        return None
+    scorer = DistilledScorer.load(SCORER_FILE)
+    if scorer.meta.get("model_fingerprint") != model_fingerprint(recommender):
+        print("⚠️  蒸留スコアラーが現在のモデルと一致しないため使用しません"
+              "（python ml/distilled_scorer.py で再作成）")
+        return None
+    print(f"✓ 蒸留スコアラーを使用: 教師={scorer.meta.get('teacher')}, スコア表 {len(scorer.names)}メニュー")
+    return scorer
+
+
 def main():
+    args = parse_args()
     print("=" * 60)
     print("AI推薦メニュー生成 → Supabase保存")
     print("=" * 60)
@@ -538,9 +960,10 @@ def main():
     # モデル読み込み
     print("\n学習済みモデルを読み込み中...")
     
-    model_path = Path(__file__).parent / 'model' / 'menu_recommender.pkl'
-    if model_path.exists():
-        recommender = MenuRecommender.load_model(str(model_path))
+    # アーティファクト形式（model/menu_recommender/）を優先し、なければ旧形式の pickle
+    model_path = find_model_path()
+    if model_path is not None:
+        recommender = MenuRecommender.load_model(model_path)
         print("✓ モデル読み込み完了")
         print(f"  - モデル: {recommender.best_model_name}")
         if hasattr(recommender, 'feature_names'):
@@ -551,6 +974,20 @@ def main():
         print("\n  学習データはSupabaseから自動取得されます。")
         print("  事前にadmin.htmlで食事記録を保存してください。")
         return
+
+    scorer = load_distilled_scorer(recommender) if args.distilled else None
+    score_cache = None
+    if not args.no_score_cache:
+        from score_cache import ScoreCache
+
+        score_cache = ScoreCache.load(model_path, recommender, scorer)
+        print(f"✓ スコアキャッシュ: {len(score_cache.entries)}メニュー（{score_cache.path}）")
+    set_params = set_optimizer_params(model_path)
+    if args.time_budget_ms is not None:
+        set_params['time_budget_ms'] = args.time_budget_ms
+    if set_params:
+        print("✓ 調整済みのセット最適化パラメータ: "
+              + ", ".join(f"{key}={value}" for key, value in set_params.items()))
     
     # メニューファイル一覧を取得
     menu_files = sorted(menus_dir.glob('menus_*.json'))
@@ -559,29 +996,54 @@ def main():
     # 各日付のAI推薦を生成してSupabaseに保存
     generated_count = 0
     uploaded_count = 0
-    
-    for menu_file in menu_files:
-        # 日付を抽出（menus_2026-01-13.json → 2026-01-13）
-        date_str = menu_file.stem.replace('menus_', '')
-        
-        # メニューデータ読み込み
-        with open(menu_file, 'r', encoding='utf-8') as f:
-            menus_data = json.load(f)
-        
-        # AI推薦生成（ファイル出力なし）
-        result = generate_ai_selections_for_date(
-            recommender, date_str, menus_data, profile=historical_profile
-        )
-        
-        if result:
-            generated_count += 1
-            # Supabaseに保存
-            if upload_to_supabase(loader, result):
-                uploaded_count += 1
+
+    if args.weekly and not historical_profile:
+        print("⚠️  セット目標がないため、週間計画は行わず日付ごとに生成します")
+    if args.weekly and historical_profile:
+        from weekly_planner import group_dates_by_week
+
+        files_by_date = {menu_file.stem.replace('menus_', ''): menu_file for menu_file in menu_files}
+        for week_dates in group_dates_by_week(files_by_date):
+            week = []
+            for date_str in week_dates:
+                with open(files_by_date[date_str], 'r', encoding='utf-8') as f:
+                    week.append((date_str, json.load(f)))
+            for result in generate_weekly_ai_selections(
+                recommender, week, historical_profile, scorer=scorer, set_params=set_params,
+                score_cache=score_cache,
+            ):
+                if result:
+                    generated_count += 1
+                    if upload_to_supabase(loader, result):
+                        uploaded_count += 1
+    else:
+        for menu_file in menu_files:
+            # 日付を抽出（menus_2026-01-13.json → 2026-01-13）
+            date_str = menu_file.stem.replace('menus_', '')
+
+            # メニューデータ読み込み
+            with open(menu_file, 'r', encoding='utf-8') as f:
+                menus_data = json.load(f)
+
+            # AI推薦生成（ファイル出力なし）
+            result = generate_ai_selections_for_date(
+                recommender, date_str, menus_data, profile=historical_profile, scorer=scorer,
+                set_params=set_params, score_cache=score_cache,
+            )
+
+            if result:
+                generated_count += 1
+                # Supabaseに保存
+                if upload_to_supabase(loader, result):
+                    uploaded_count += 1
     
     print("\n" + "=" * 60)
     print(f"✓ 完了: {generated_count}日分のAI推薦を生成")
     print(f"✓ Supabase保存: {uploaded_count}日分")
+    if score_cache is not None:
+        score_cache.save()
+        print(f"✓ スコアキャッシュ: {score_cache.stats['hits'] + score_cache.stats['misses']}メニュー中 "
+              f"ヒット {score_cache.stats['hits']}件、モデル評価 {score_cache.stats['evaluated']}件")
     print("=" * 60)
     
     print("\n✅ GitHub PagesからSupabase経由で自動的に表示されます。")
@@ -589,4 +1051,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    run_main(main, 'generate_ai_selections')
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+差分（ウォームスタート）再学習
+
+週次更新で追加された日だけ特徴量を作り、既存モデルを継続学習する。
+
+- メニュー単体で決まる列（栄養素・テキスト・カテゴリ・Claude）は学習状態ファイル
+  （model/training_state.npz）に保存した行を再利用し、新しい日の分だけ計算する
+- 学習データ全体に依存する列（嗜好・共起・選択頻度）は安価なので全行を再計算する
+- 語彙（列の位置）とスケーラーは前回の学習から固定する。共起・単語カウントはその場で更新
+- 推定器は warm_start で継続学習する
+  （RandomForest / GradientBoosting / HistGradientBoosting は木を追加、
+    LogisticRegression は前回の係数を初期値に全データで再最適化）
+
+次の場合は全体再学習（MenuRecommender.train_models）にフォールバックする:
+- 学習状態がない、またはモデルと一致しない
+- 既存の日付が学習データから消えた・順序が変わった（履歴の編集）
+- 新しい日で語彙に入るはずの単語の割合が VOCAB_CHANGE_THRESHOLD を超えた
+  （テキスト特徴量が 'hashed' の場合は列の位置が語彙に依存しないので判定しない）
+- 新しい日の栄養素特徴量の平均が学習時から DRIFT_THRESHOLD（標準偏差単位）以上ずれた
+- 差分学習が MAX_INCREMENTAL_ROUNDS 回続いた、または木の数が MAX_ENSEMBLE_SIZE を超える
+"""
+
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+ML_DIR = Path(__file__).parent
+TRAINING_STATE_FILE = ML_DIR / "model" / "training_state.npz"
+STATE_VERSION = 1
+
+# 全体再学習に切り替える閾値
+VOCAB_CHANGE_THRESHOLD = 0.05
+DRIFT_THRESHOLD = 0.5
+MAX_INCREMENTAL_ROUNDS = 4
+MAX_ENSEMBLE_SIZE = 300
+
+# warm_start で追加する量（推定器クラス名 → (パラメータ名, 1回あたりの追加数)）
+WARM_START_GROWTH = {
+    "RandomForestClassifier": ("n_estimators", 20),
+    "GradientBoostingClassifier": ("n_estimators", 20),
+    "HistGradientBoostingClassifier": ("max_iter", 20),
+}
+NUTRITION_DIM = 13  # 特徴量行列の先頭の栄養素列数
+DYNAMIC_DIM = 3  # 末尾の嗜好・共起・頻度列数
+
+
+def save_training_state(recommender, path=TRAINING_STATE_FILE, incremental_rounds: int = 0):
+    """学習済み MenuRecommender の特徴量行列（静的列）と日付を保存"""
+    from distilled_scorer import model_fingerprint
+
+    dates = [day["date"] for day in recommender.training_data]
+    np.savez_compressed(
+        path,
+        version=np.array(STATE_VERSION),
+        fingerprint=np.array(model_fingerprint(recommender)),
+        dates=np.array(dates, dtype=str),
+        X_static=np.asarray(recommender.X, dtype=np.float64)[:, :-DYNAMIC_DIM],
+        y=np.asarray(recommender.y, dtype=np.int8),
+        groups=np.asarray(recommender.groups, dtype=np.int32),
+        incremental_rounds=np.array(incremental_rounds),
+    )
+    return path
+
+
+def load_training_state(path=TRAINING_STATE_FILE):
+    """学習状態を読み込む（ない・形式が違う場合は None）"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        if int(data["version"]) != STATE_VERSION:
+            return None
+        return {
+            "fingerprint": str(data["fingerprint"]),
+            "dates": data["dates"].tolist(),
+            "X_static": data["X_static"],
+            "y": data["y"],
+            "groups": data["groups"],
+            "incremental_rounds": int(data["incremental_rounds"]),
+        }
+
+
+def vocabulary_change(feature_extractor, new_menus: list) -> float:
+    """
+    新しいメニューを加えた場合に語彙（出現2回以上）へ新たに入る単語の割合
+
+    テキスト特徴量が 'hashed' の場合は列の位置が語彙に依存しないので常に 0
+    """
+    if feature_extractor.text_mode == "hashed":
+        return 0.0
+    counter = Counter(feature_extractor.word_counter)
+    for menu in new_menus:
+        counter.update(feature_extractor.extract_words(menu["name"]))
+    vocab = feature_extractor.word_to_idx
+    added = [w for w, c in counter.items() if c >= 2 and w not in vocab]
+    return len(added) / max(len(vocab), 1)
+
+
+def nutrition_drift(X_new_static, scaler) -> float:
+    """新しい行の栄養素特徴量の平均が学習時の平均から何標準偏差ずれたか（列平均）"""
+    if len(X_new_static) == 0:
+        return 0.0
+    mean = np.asarray(scaler.mean_)[:NUTRITION_DIM]
+    scale = np.asarray(scaler.scale_)[:NUTRITION_DIM]
+    shift = np.abs(X_new_static[:, :NUTRITION_DIM].mean(axis=0) - mean) / scale
+    return float(shift.mean())
+
+
+def warm_start_fit(estimator, X, y):
+    """
+    推定器を warm_start で継続学習
+
+    Returns:
+        (推定器, 追加量の説明)。warm_start 非対応なら (None, 理由)
+    """
+    name = type(estimator).__name__
+    if name in WARM_START_GROWTH:
+        param, step = WARM_START_GROWTH[name]
+        size = estimator.get_params()[param] + step
+        if size > MAX_ENSEMBLE_SIZE:
+            return None, f"{param}={size} が上限 {MAX_ENSEMBLE_SIZE} を超える"
+        estimator.set_params(warm_start=True, **{param: size})
+        estimator.fit(X, y)
+        estimator.set_params(warm_start=False)
+        return estimator, f"{param} → {size}"
+    if "warm_start" in estimator.get_params():
+        # LogisticRegression: 前回の係数を初期値にして全データで再最適化
+        estimator.set_params(warm_start=True)
+        estimator.fit(X, y)
+        estimator.set_params(warm_start=False)
+        return estimator, "前回の係数から再最適化"
+    return None, f"{name} は warm_start 非対応"
+
+
+def _auc(y, scores):
+    from sklearn.metrics import roc_auc_score
+
+    if len(set(y.tolist())) < 2:
+        return float("nan")
+    return float(roc_auc_score(y, scores))
+
+
+def incremental_retrain(state_path=TRAINING_STATE_FILE, use_supabase=True):
+    """
+    差分再学習を実行
+
+    Returns:
+        (MenuRecommender, 結果 dict)。全体再学習が必要な場合は (None, {'reason': 理由})
+    """
+    from menu_recommender import CLAUDE_AVAILABLE, MenuRecommender
+    from model_artifact import find_model_path, is_artifact
+
+    timings = {}
+    t0 = time.perf_counter()
+    model_path = find_model_path()
+    state = load_training_state(state_path)
+    if model_path is None or not is_artifact(model_path):
+        return None, {"reason": "アーティファクト形式の学習済みモデルがない"}
+    if state is None:
+        return None, {"reason": "学習状態ファイルがない"}
+    if state["incremental_rounds"] >= MAX_INCREMENTAL_ROUNDS:
+        return None, {"reason": f"差分学習が {MAX_INCREMENTAL_ROUNDS} 回続いた"}
+
+    recommender = MenuRecommender.load_model(model_path)
+    from distilled_scorer import model_fingerprint
+
+    if state["fingerprint"] != model_fingerprint(recommender):
+        return None, {"reason": "学習状態がモデルと一致しない"}
+    _, include_preference = recommender._feature_layout()
+    if not include_preference:
+        return None, {"reason": "旧形式の特徴量構成のモデル"}
+
+    training_data = recommender.load_data(str(ML_DIR / "data" / "training_data.json"), use_supabase=use_supabase)
+    timings["load"] = time.perf_counter() - t0
+
+    dates = [day["date"] for day in training_data]
+    old_dates = state["dates"]
+    if dates[:len(old_dates)] != old_dates:
+        return None, {"reason": "既存の日付が変更された（履歴の編集・並び替え）"}
+    new_days = training_data[len(old_dates):]
+    if not new_days:
+        return recommender, {"mode": "unchanged", "new_days": 0, "timings": timings}
+
+    fe = recommender.feature_extractor
+    new_menus = [menu for day in new_days for menu in day["allMenus"]]
+    vocab_change = vocabulary_change(fe, new_menus)
+    if vocab_change > VOCAB_CHANGE_THRESHOLD:
+        return None, {"reason": f"語彙の変化 {vocab_change:.1%} が閾値 {VOCAB_CHANGE_THRESHOLD:.0%} を超えた"}
+
+    # Claude解析と嗜好プロファイル（新しいメニュー・日のみ）
+    t0 = time.perf_counter()
+    use_claude = CLAUDE_AVAILABLE and fe.use_claude and fe.claude_analyzer
+    if use_claude:
+        fe.claude_analyzer.analyze_menus(new_menus)
+    # 前向きの検証用: 新しい日の選択結果を使う前（嗜好プロファイル・共起・選択頻度の更新前）に、
+    # 推論時と同じ特徴量（共起スコア 0、学習済みの選択回数）を作っておく
+    X_holdout = recommender.build_serving_features(new_menus)
+    if use_claude:
+        fe.preference_analyzer.generate_profile(training_data, fe.claude_analyzer.cache, incremental=True)
+    include_claude, _ = recommender._feature_layout()
+
+    # 新しい日の静的特徴量
+    X_new_static = recommender._static_feature_matrix(new_menus, include_claude)
+    timings["featurize_new_days"] = time.perf_counter() - t0
+
+    drift = nutrition_drift(X_new_static, recommender.scaler)
+    if drift > DRIFT_THRESHOLD:
+        return None, {"reason": f"栄養素の分布のずれ {drift:.2f}σ が閾値 {DRIFT_THRESHOLD}σ を超えた"}
+
+    # 単語カウント・共起はその場で更新（語彙の列位置は固定）
+    t0 = time.perf_counter()
+    fe.word_counter.update(w for menu in new_menus for w in fe.extract_words(menu["name"]))
+    recommender.cooccurrence_analyzer.analyze(new_days, fe)
+    recommender.training_data = training_data
+
+    X_static = np.vstack([state["X_static"], X_new_static])
+    recommender.X = np.hstack([X_static, recommender._dynamic_features(training_data)])
+    recommender.y = np.concatenate([
+        state["y"], [1 if menu["selected"] else 0 for menu in new_menus]
+    ]).astype(int)
+    recommender.groups = np.concatenate([
+        state["groups"],
+        [len(old_dates) + i for i, day in enumerate(new_days) for _ in day["allMenus"]],
+    ]).astype(int)
+    timings["update_features"] = time.perf_counter() - t0
+
+    # 更新前のモデルで新しい日を推論時の特徴量で評価（前向きの検証）してから継続学習
+    X_scaled = recommender.scaler.transform(recommender.X)
+    n_old = len(state["y"])
+    estimator = recommender.best_model
+    holdout_auc = _auc(
+        recommender.y[n_old:], estimator.predict_proba(recommender.scaler.transform(X_holdout))[:, 1]
+    )
+
+    t0 = time.perf_counter()
+    fitted, detail = warm_start_fit(estimator, X_scaled, recommender.y)
+    timings["warm_start_fit"] = time.perf_counter() - t0
+    if fitted is None:
+        return None, {"reason": detail}
+    recommender.best_model = fitted
+
+    return recommender, {
+        "mode": "incremental",
+        "new_days": len(new_days),
+        "new_rows": len(new_menus),
+        "vocab_change": vocab_change,
+        "drift": drift,
+        "holdout_auc": holdout_auc,
+        "detail": detail,
+        "incremental_rounds": state["incremental_rounds"] + 1,
+        "timings": timings,
+    }
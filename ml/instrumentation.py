@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+パイプラインの段階別計測（スパン + カウンタ）
+
+環境変数 KYOWA_TRACE を設定して実行すると、各段階の所要時間（スパン）と件数（カウンタ）を記録し、
+終了時にサマリー表を表示して JSON トレースを書き出す。未設定時は span() が共有の何もしない
+オブジェクトを返し、count() は即座に戻るだけなのでコストはほぼゼロ。
+
+    KYOWA_TRACE=1                 ml/traces/trace_<日時>.json に書き出す
+    KYOWA_TRACE=path/to/run.json  指定したパスに書き出す
+
+使い方:
+    from instrumentation import span, count
+
+    with span("prepare_features.dynamic", rows=n):
+        ...
+    count("claude.api_calls")
+
+    @traced("supabase.get_training_data")
+    def get_training_data(self, limit=None):
+        ...
+
+    KYOWA_TRACE=1 python ml/update_weekly.py
+
+注意: スパンの入れ子はプロセス内の単一スレッドを前提とする
+（joblib のワーカープロセス内の処理は記録されない）。
+"""
+
+import atexit
+import contextlib
+import functools
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+TRACE_ENV = "KYOWA_TRACE"
+TRACE_DIR = Path(__file__).parent / "traces"
+TRACE_VERSION = 1
+
+
+class _NullSpan:
+    """計測無効時のスパン（何もしない）"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attrs", "start", "depth", "parent")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        stack = self.tracer.stack
+        self.depth = len(stack)
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        self.tracer.stack.pop()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.spans.append({
+            "name": self.name,
+            "parent": self.parent,
+            "depth": self.depth,
+            "start_ms": (self.start - self.tracer.origin) * 1000,
+            "duration_ms": (end - self.start) * 1000,
+            **({"attrs": self.attrs} if self.attrs else {}),
+        })
+        return False
+
+    def set(self, **attrs):
+        """スパンに属性（件数など）を追加"""
+        self.attrs.update(attrs)
+
+
+class Tracer:
+    """1回の実行分のスパンとカウンタ"""
+
+    def __init__(self, output=None):
+        self.output = output
+        self.origin = time.perf_counter()
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.spans = []
+        self.stack = []
+        self.counters = Counter()
+
+    def summary(self) -> list:
+        """スパン名ごとの集計（最初に開始した順。入れ子が親の直後に並ぶ）"""
+        rows = {}
+        for s in self.spans:
+            row = rows.setdefault(s["name"], {"name": s["name"], "depth": s["depth"], "calls": 0,
+                                              "total_ms": 0.0, "max_ms": 0.0, "first_ms": s["start_ms"]})
+            row["calls"] += 1
+            row["total_ms"] += s["duration_ms"]
+            row["max_ms"] = max(row["max_ms"], s["duration_ms"])
+            row["depth"] = min(row["depth"], s["depth"])
+            row["first_ms"] = min(row["first_ms"], s["start_ms"])
+        return sorted(rows.values(), key=lambda r: (r["first_ms"], r["depth"]))
+
+    def to_dict(self) -> dict:
+        return {
+            "version": TRACE_VERSION,
+            "started_at": self.started_at,
+            "argv": sys.argv,
+            "wall_ms": (time.perf_counter() - self.origin) * 1000,
+            "spans": self.spans,
+            "counters": dict(self.counters),
+            "summary": self.summary(),
+        }
+
+    def print_summary(self):
+        wall_ms = (time.perf_counter() - self.origin) * 1000
+        print("\n" + "=" * 70)
+        print(f"⏱️  段階別の所要時間（全体 {wall_ms / 1000:.2f}s）")
+        print("=" * 70)
+        print(f"{'段階':40s} {'回数':>5s} {'合計(s)':>9s} {'最大(s)':>9s} {'割合':>6s}")
+        for row in self.summary():
+            name = "  " * row["depth"] + row["name"]
+            share = row["total_ms"] / wall_ms * 100 if wall_ms else 0.0
+            print(f"{name:40s} {row['calls']:5d} {row['total_ms'] / 1000:9.3f} "
+                  f"{row['max_ms'] / 1000:9.3f} {share:5.1f}%")
+        if self.counters:
+            print("\n🔢 カウンタ:")
+            for name, value in sorted(self.counters.items()):
+                print(f"   {name:38s} {value:>10}")
+
+    def write(self, path=None) -> Path:
+        path = Path(path or self.output or TRACE_DIR / f"trace_{datetime.now():%Y%m%d_%H%M%S}.json")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=1)
+        return path
+
+
+_tracer = None
+
+
+def enable(output=None) -> Tracer:
+    """計測を有効にする（終了時にサマリー表示とトレース書き出し）"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(output)
+        atexit.register(_finish)
+    return _tracer
+
+
+def is_enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, **attrs):
+    """段階の所要時間を計測するコンテキストマネージャ（無効時は何もしない）"""
+    if _tracer is None:
+        return _NULL_SPAN
+    return _Span(_tracer, name, attrs)
+
+
+def traced(name: str):
+    """関数全体を span(name) で計測するデコレータ（無効時は元の関数をそのまま呼ぶ）"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return fn(*args, **kwargs)
+            with _Span(_tracer, name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name: str, n: int = 1):
+    """カウンタに加算（無効時は何もしない）"""
+    if _tracer is not None:
+        _tracer.counters[name] += n
+
+
+@contextlib.contextmanager
+def collect():
+    """
+    一時的に計測を有効にし、その間のスパン・カウンタを記録する Tracer を返す
+
+    終了時の表示・書き出しは行わない（評価回数などをコードから読むため）。
+    KYOWA_TRACE で計測中の場合は、カウンタを元の Tracer にも加算する。
+    """
+    global _tracer
+    previous = _tracer
+    _tracer = Tracer()
+    try:
+        yield _tracer
+    finally:
+        collected, _tracer = _tracer, previous
+        if previous is not None:
+            previous.counters.update(collected.counters)
+
+
+def _finish():
+    if _tracer is None or not (_tracer.spans or _tracer.counters):
+        return
+    _tracer.print_summary()
+    path = _tracer.write()
+    print(f"\n✅ トレースを保存: {path}")
+
+
+_env = os.environ.get(TRACE_ENV, "")
+if _env and _env.lower() not in ("0", "false", "no"):
+    enable(None if _env.lower() in ("1", "true", "yes") else _env)
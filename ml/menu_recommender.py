@@ -4,24 +4,26 @@ Kyowa Menu Recommender - 機械学習ベースのメニュー推薦システム
 
 学習対象：
 1. 栄養素ベース: PFC絶対値、PFCバランス、エネルギー、野菜重量、飽和脂肪酸
-2. テキストベース: メニュー名に含まれる単語
+2. テキストベース: メニュー名に含まれる単語（語彙、またはハッシュした単語・文字n-gram）
 3. メニュー間関係: 共起パターン、カテゴリ間の関係
 4. 負例学習: 選ばれなかったメニューの特徴
 """
 
 import json
 import re
+import time
+import zlib
 import numpy as np
-import pandas as pd
 from collections import Counter, defaultdict
-from sklearn.model_selection import cross_val_score, LeaveOneGroupOut
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import classification_report, roc_auc_score
 import warnings
 warnings.filterwarnings('ignore')
 
+from instrumentation import span, traced
+from profiling import add_profile_arguments, run_main
+
+# scikit-learn は学習時にのみ関数内でインポートする
+# （推論・pickle読み込みだけの用途で起動を遅くしないため）
+
 # Supabaseデータローダーをインポート
 try:
     from supabase_data_loader import SupabaseDataLoader
@@ -40,17 +42,38 @@ except ImportError:
     CLAUDE_FEATURE_NAMES = []
     print("⚠️  Claude解析モジュールが利用できません（Claude特徴量なしで動作）")
 
+# _candidate_models で生成できるモデル
+MODEL_ENGINES = ['LogisticRegression', 'RandomForest', 'GradientBoosting', 'HistGradientBoosting']
+# train_models で既定で比較するモデル。
+# HistGradientBoosting はCVのAUCは最も高いが、学習時は当日の実選択から計算される共起スコアに
+# 強く依存し、推論時（共起スコア0）の確率がほぼ0に潰れるため、明示指定時のみ使う
+DEFAULT_ENGINES = ['LogisticRegression', 'RandomForest', 'GradientBoosting']
+
+# テキスト特徴量の方式
+#   'vocab'  学習データで出現2回以上の単語（再学習ごとに列の位置が変わる）
+#   'hashed' 単語と文字n-gramを固定次元にハッシュ（列の位置が学習データに依存しない）
+TEXT_MODES = ('vocab', 'hashed')
+DEFAULT_TEXT_MODE = 'vocab'
+# 'hashed' の次元数と文字n-gramの長さ
+HASH_DIM = 512
+CHAR_NGRAM = 2
+
 
 class MenuFeatureExtractor:
     """メニューから特徴量を抽出するクラス"""
     
-    def __init__(self):
+    def __init__(self, text_mode=DEFAULT_TEXT_MODE, hash_dim=HASH_DIM):
+        if text_mode not in TEXT_MODES:
+            raise ValueError(f"未知のテキスト特徴量方式: {text_mode}（{', '.join(TEXT_MODES)} のいずれか）")
         self.word_counter = Counter()
         self.word_to_idx = {}
-        self.scaler = StandardScaler()
+        self.scaler = None  # 未使用（旧pickleとの互換のため属性のみ保持）
         self.claude_analyzer = None
         self.preference_analyzer = None
         self.use_claude = False
+        self.text_mode = text_mode
+        self.hash_dim = hash_dim
+        self._text_cache = {}  # メニュー名 → テキスト特徴量
 
     def __setstate__(self, state):
         """古いpickleとの互換性のため、新属性がない場合はデフォルト値を設定"""
@@ -61,6 +84,10 @@ class MenuFeatureExtractor:
             self.claude_analyzer = None
         if 'preference_analyzer' not in self.__dict__:
             self.preference_analyzer = None
+        if 'text_mode' not in self.__dict__:
+            self.text_mode = 'vocab'
+            self.hash_dim = HASH_DIM
+        self._text_cache = {}
         
     def extract_words(self, menu_name):
         """メニュー名から単語を抽出"""
@@ -79,8 +106,30 @@ class MenuFeatureExtractor:
         # 出現回数2回以上の単語のみ採用
         frequent_words = [w for w, c in self.word_counter.most_common() if c >= 2]
         self.word_to_idx = {w: i for i, w in enumerate(frequent_words)}
-        print(f"📚 語彙サイズ: {len(self.word_to_idx)} 単語")
+        if self.text_mode == 'hashed':
+            # 列の位置は語彙に依存しないので、計算済みのテキスト特徴量はそのまま使える
+            print(f"📚 語彙サイズ: {len(self.word_to_idx)} 単語（テキスト特徴量はハッシュ {self.hash_dim} 次元）")
+        else:
+            self._text_cache = {}
+            print(f"📚 語彙サイズ: {len(self.word_to_idx)} 単語")
         return frequent_words
+
+    def hashed_tokens(self, menu_name):
+        """ハッシュ対象のトークン（単語 + 空白を除いたメニュー名の文字n-gram）"""
+        tokens = [f'w:{w}' for w in self.extract_words(menu_name)]
+        chars = re.sub(r'\s+', '', menu_name)
+        tokens.extend(f'c:{chars[i:i + CHAR_NGRAM]}' for i in range(len(chars) - CHAR_NGRAM + 1))
+        return tokens
+
+    def text_feature_dim(self):
+        """テキスト特徴量の次元数"""
+        return self.hash_dim if self.text_mode == 'hashed' else len(self.word_to_idx)
+
+    def text_feature_names(self):
+        """テキスト特徴量の列名"""
+        if self.text_mode == 'hashed':
+            return [f'hash_{i}' for i in range(self.hash_dim)]
+        return [f'word_{w}' for w in self.word_to_idx.keys()]
     
     def extract_nutrition_features(self, nutrition):
         """栄養素から特徴量を抽出"""
@@ -125,12 +174,26 @@ class MenuFeatureExtractor:
         }
     
     def extract_text_features(self, menu_name):
-        """メニュー名からテキスト特徴量を抽出"""
-        words = self.extract_words(menu_name)
-        features = np.zeros(len(self.word_to_idx))
-        for word in words:
-            if word in self.word_to_idx:
-                features[self.word_to_idx[word]] = 1
+        """
+        メニュー名からテキスト特徴量を抽出（メニュー名ごとにキャッシュ）
+
+        'hashed' ではトークンの crc32 を hash_dim で割った余りの列を1にする
+        （Python の hash() はプロセスごとに変わるため使わない）。
+        キャッシュした配列をそのまま返すので、戻り値は読み取り専用
+        """
+        cached = self._text_cache.get(menu_name)
+        if cached is not None:
+            return cached
+        features = np.zeros(self.text_feature_dim())
+        if self.text_mode == 'hashed':
+            for token in self.hashed_tokens(menu_name):
+                features[zlib.crc32(token.encode('utf-8')) % self.hash_dim] = 1
+        else:
+            for word in self.extract_words(menu_name):
+                if word in self.word_to_idx:
+                    features[self.word_to_idx[word]] = 1
+        features.setflags(write=False)
+        self._text_cache[menu_name] = features
         return features
     
     def extract_category_features(self, menu_name):
@@ -152,10 +215,10 @@ class MenuFeatureExtractor:
         }
         return categories
 
-    def extract_claude_features(self, menu_name):
-        """Claude解析キャッシュからセマンティック特徴量を取得"""
+    def extract_claude_features(self, menu_name, nutrition=None):
+        """Claude解析キャッシュからセマンティック特徴量を取得（未解析なら近似モデルで代替）"""
         if self.claude_analyzer and self.use_claude:
-            return self.claude_analyzer.get_feature_vector(menu_name)
+            return self.claude_analyzer.get_feature_vector(menu_name, nutrition)
         # Claude未使用時はゼロベクトル
         return [0.0] * len(CLAUDE_FEATURE_NAMES) if CLAUDE_FEATURE_NAMES else []
 
@@ -163,9 +226,18 @@ class MenuFeatureExtractor:
         """嗜好プロファイルとの一致度スコアを返す"""
         if self.preference_analyzer and self.use_claude:
             cache = self.claude_analyzer.cache if self.claude_analyzer else None
-            return self.preference_analyzer.get_preference_score(menu_name, cache)
+            version = self.claude_analyzer.cache_version if self.claude_analyzer else None
+            return self.preference_analyzer.get_preference_score(menu_name, cache, version)
         return 0.5  # 中立値
 
+    def get_preference_scores(self, menu_names):
+        """複数メニューの嗜好一致度スコアを一括で返す"""
+        if self.preference_analyzer and self.use_claude:
+            cache = self.claude_analyzer.cache if self.claude_analyzer else None
+            version = self.claude_analyzer.cache_version if self.claude_analyzer else None
+            return self.preference_analyzer.get_preference_scores(menu_names, cache, version)
+        return np.full(len(menu_names), 0.5)  # 中立値
+
     def init_claude(self):
         """Claude解析モジュールを初期化"""
         if not CLAUDE_AVAILABLE:
@@ -248,16 +320,63 @@ class CooccurrenceAnalyzer:
                 score += self.cooccurrence_matrix[menu_name].get(selected, 0)
         return score
 
+    def sparse_matrix(self, name_index):
+        """共起行列を疎行列（CSR, name_index の順）にする。name_index にないメニューは無視"""
+        from scipy import sparse
+
+        rows, cols, counts = [], [], []
+        for a, inner in self.cooccurrence_matrix.items():
+            if a not in name_index:
+                continue
+            for b, count in inner.items():
+                if b in name_index:
+                    rows.append(name_index[a])
+                    cols.append(name_index[b])
+                    counts.append(count)
+        n = len(name_index)
+        return sparse.csr_matrix((counts, (rows, cols)), shape=(n, n), dtype=np.float64)
+
+
+class ArrayScaler:
+    """保存済みの mean_ / scale_ だけで StandardScaler.transform を行う（sklearn 不要）"""
+
+    def __init__(self, mean, scale):
+        self.mean_ = mean
+        self.scale_ = scale
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+def _artifact_model_version(manifest):
+    """アーティファクトの推定器の版（estimator.sha1。ない古い manifest は created_at）"""
+    return manifest.get('estimator', {}).get('sha1') or manifest.get('created_at')
+
 
 class MenuRecommender:
     """メニュー推薦モデル"""
     
-    def __init__(self):
-        self.feature_extractor = MenuFeatureExtractor()
+    def __init__(self, text_mode=DEFAULT_TEXT_MODE):
+        self.feature_extractor = MenuFeatureExtractor(text_mode)
         self.cooccurrence_analyzer = CooccurrenceAnalyzer()
         self.models = {}
         self.best_model = None
         self.best_model_name = None
+        # 保存・読み込みしたアーティファクトの推定器の版（manifest の estimator.sha1）
+        self.model_version = None
+
+    @property
+    def best_model(self):
+        """最良モデル（アーティファクトから読み込んだ場合は初回アクセス時に読み込む）"""
+        if self._best_model is None and self._estimator_loader is not None:
+            self._best_model = self._estimator_loader()
+            self._estimator_loader = None
+        return self._best_model
+
+    @best_model.setter
+    def best_model(self, model):
+        self._best_model = model
+        self._estimator_loader = None
         
     def load_data(self, data_path='data/training_data.json', use_supabase=True):
         """
@@ -298,6 +417,7 @@ class MenuRecommender:
             print("   Supabaseにデータを登録するか、ローカルファイルを配置してください")
             raise
     
+    @traced('prepare_features')
     def prepare_features(self):
         """特徴量を準備"""
         print("\n🔧 特徴量準備中...")
@@ -312,79 +432,43 @@ class MenuRecommender:
         
         # Claude解析の初期化と実行
         if CLAUDE_AVAILABLE:
-            if self.feature_extractor.init_claude():
-                # 未解析メニューをバッチ解析
-                print("\n🧠 Claude メニュー意味解析...")
-                self.feature_extractor.claude_analyzer.analyze_menus(all_menus)
-                # 嗜好プロファイル生成
-                print("\n🧠 ユーザー嗜好プロファイル生成...")
-                self.feature_extractor.preference_analyzer.generate_profile(
-                    self.training_data,
-                    self.feature_extractor.claude_analyzer.cache
-                )
+            with span('prepare_features.claude'):
+                if self.feature_extractor.init_claude():
+                    # 未解析メニューをバッチ解析
+                    print("\n🧠 Claude メニュー意味解析...")
+                    self.feature_extractor.claude_analyzer.analyze_menus(all_menus)
+                    # 嗜好プロファイル生成
+                    print("\n🧠 ユーザー嗜好プロファイル生成...")
+                    self.feature_extractor.preference_analyzer.generate_profile(
+                        self.training_data,
+                        self.feature_extractor.claude_analyzer.cache,
+                        incremental=True,
+                    )
         
         # 共起分析
         print("\n📈 共起分析中...")
-        self.cooccurrence_analyzer.analyze(self.training_data, self.feature_extractor)
+        with span('prepare_features.cooccurrence'):
+            self.cooccurrence_analyzer.analyze(self.training_data, self.feature_extractor)
         
         # 特徴量行列とラベルを構築
-        X_list = []
-        y_list = []
-        groups = []  # 日付グループ（Leave-One-Day-Out用）
-        menu_names = []
-        
-        for day_idx, day_data in enumerate(self.training_data):
-            selected_names = [m['name'] for m in day_data['allMenus'] if m['selected']]
-            
-            for menu in day_data['allMenus']:
-                # 栄養素特徴量
-                nutrition_features = self.feature_extractor.extract_nutrition_features(
-                    menu.get('nutrition', {})
-                )
-                
-                # テキスト特徴量
-                text_features = self.feature_extractor.extract_text_features(menu['name'])
-                
-                # カテゴリ特徴量
-                category_features = self.feature_extractor.extract_category_features(menu['name'])
-                
-                # 共起スコア（現在の日の他の選択メニューとの）
-                other_selected = [n for n in selected_names if n != menu['name']]
-                cooccurrence_score = self.cooccurrence_analyzer.get_cooccurrence_score(
-                    menu['name'], other_selected
-                )
-                
-                # 過去の選択頻度
-                selection_frequency = self.cooccurrence_analyzer.menu_selection_count.get(
-                    menu['name'], 0
-                ) / max(len(self.training_data), 1)
-                
-                # Claude特徴量
-                claude_features = self.feature_extractor.extract_claude_features(menu['name'])
-                preference_score = self.feature_extractor.get_preference_score(menu['name'])
-                
-                # 特徴量を結合
-                features = list(nutrition_features.values())
-                features.extend(text_features)
-                features.extend([int(v) for v in category_features.values()])
-                features.extend(claude_features)
-                features.append(preference_score)
-                features.append(cooccurrence_score)
-                features.append(selection_frequency)
-                
-                X_list.append(features)
-                y_list.append(1 if menu['selected'] else 0)
-                groups.append(day_idx)
-                menu_names.append(menu['name'])
-        
-        self.X = np.array(X_list)
-        self.y = np.array(y_list)
-        self.groups = np.array(groups)
-        self.menu_names = menu_names
+        # （メニュー単体で決まる列 + 学習データ全体に依存する列 [嗜好・共起・頻度]）
+        include_claude, _ = self._feature_layout(training=True)
+        with span('prepare_features.static', rows=len(all_menus)):
+            X_static = self._static_feature_matrix(all_menus, include_claude)
+        with span('prepare_features.dynamic', days=len(self.training_data)):
+            X_dynamic = self._dynamic_features(self.training_data)
+        self.X = np.hstack([X_static, X_dynamic])
+        self.y = np.array([1 if menu['selected'] else 0 for menu in all_menus])
+        # 日付グループ（Leave-One-Day-Out用）
+        self.groups = np.repeat(
+            np.arange(len(self.training_data)),
+            [len(day_data['allMenus']) for day_data in self.training_data],
+        )
+        self.menu_names = [menu['name'] for menu in all_menus]
         
         # 特徴量名を保存
         nutrition_feature_names = list(self.feature_extractor.extract_nutrition_features({}).keys())
-        text_feature_names = [f'word_{w}' for w in self.feature_extractor.word_to_idx.keys()]
+        text_feature_names = self.feature_extractor.text_feature_names()
         category_feature_names = list(self.feature_extractor.extract_category_features('').keys())
         claude_feature_names = list(CLAUDE_FEATURE_NAMES) if CLAUDE_FEATURE_NAMES else []
         
@@ -405,16 +489,18 @@ class MenuRecommender:
         
         return self.X, self.y
     
-    def train_models(self):
-        """複数のモデルを学習し比較"""
-        print("\n🤖 モデル学習中...")
-        
-        # データの正規化
-        X_scaled = self.scaler.fit_transform(self.X) if hasattr(self, 'scaler') else StandardScaler().fit_transform(self.X)
-        self.scaler = StandardScaler().fit(self.X)
-        X_scaled = self.scaler.transform(self.X)
-        
-        # モデル定義
+    def _candidate_models(self, engines=None):
+        """
+        比較対象のモデル（未学習）を生成
+
+        Args:
+            engines: 使用するモデル名のリスト（None なら DEFAULT_ENGINES）
+        """
+        from sklearn.ensemble import (
+            RandomForestClassifier, GradientBoostingClassifier, HistGradientBoostingClassifier
+        )
+        from sklearn.linear_model import LogisticRegression
+
         models = {
             'LogisticRegression': LogisticRegression(
                 class_weight='balanced', 
@@ -432,46 +518,125 @@ class MenuRecommender:
                 max_depth=5,
                 random_state=42
             ),
+            # ヒストグラム勾配ブースティング: OpenMPで多スレッド学習、検証データで早期終了。
+            # カテゴリ特徴量は0/1フラグなので、ビン分割で通常の数値特徴量として扱っても分岐は同じ
+            'HistGradientBoosting': HistGradientBoostingClassifier(
+                max_iter=200,
+                learning_rate=0.2,
+                max_leaf_nodes=15,
+                max_bins=63,
+                early_stopping=True,
+                validation_fraction=0.15,
+                n_iter_no_change=10,
+                class_weight='balanced',
+                random_state=42
+            ),
         }
+        if engines is None:
+            engines = DEFAULT_ENGINES
+        unknown = set(engines) - set(models)
+        if unknown:
+            raise ValueError(f"未知のモデル: {', '.join(sorted(unknown))}（{', '.join(MODEL_ENGINES)} のいずれか）")
+        return {name: models[name] for name in engines}
+
+    @traced('train_models')
+    def train_models(self, refit_all=True, n_jobs=-1, use_cv_cache=False,
+                     cv_strategy='auto', cv_folds=None, engines=None):
+        """複数のモデルを学習し比較
+
+        Args:
+            refit_all: True なら全モデルを全データで学習して self.models に保持する。
+                       False なら最良モデルのみ学習する（保存されるのは最良モデルだけなので、
+                       再学習バッチではこちらで十分）
+            n_jobs: CVの (モデル, フォールド) を並列実行する数（-1 で全コア、1 で逐次）
+            use_cv_cache: フォールド単位のCVスコアキャッシュを使うか（cv_harness.FoldCache）。
+                          1日追加されると全行が変わりヒットしないため、既定では使わない。
+                          同じデータで繰り返し学習・検証する場合に有効化する
+            cv_strategy: CVのフォールド分割（cv_harness.make_cv_splits を参照）。
+                         'auto' は学習日数が cv_folds 以下なら Leave-One-Day-Out、
+                         超えたら直近 cv_folds 日の rolling-origin
+            cv_folds: フォールド数の上限（省略時は cv_harness.MAX_CV_FOLDS）
+            engines: 比較するモデル名のリスト（省略時は DEFAULT_ENGINES。MODEL_ENGINES から選択）
+
+        各フェーズの所要時間（秒）は self.training_timings に記録される。
+        """
+        from sklearn.preprocessing import StandardScaler
+        from cv_harness import MAX_CV_FOLDS, FoldCache, cross_validate_models, make_cv_splits
+
+        print("\n🤖 モデル学習中...")
+        self.training_timings = {}
+        
+        # データの正規化（全データのスケーラーは最終学習・推論用。CVではフォールドごとに学習する）
+        t0 = time.perf_counter()
+        self.scaler = StandardScaler().fit(self.X)
+        X_scaled = self.scaler.transform(self.X)
+        self.training_timings['scale'] = time.perf_counter() - t0
         
-        # Leave-One-Day-Out Cross Validation
-        logo = LeaveOneGroupOut()
-        results = {}
+        # モデル定義
+        models = self._candidate_models(engines)
         
-        print("\n📊 Leave-One-Day-Out クロスバリデーション結果:")
-        print("-" * 60)
+        # 日付単位のクロスバリデーション（AUC-ROCで評価）
+        strategy, splits = make_cv_splits(
+            self.groups, cv_strategy, n_splits=cv_folds or MAX_CV_FOLDS
+        )
+        
+        t0 = time.perf_counter()
+        cache = FoldCache() if use_cv_cache else None
+        with span('train_models.cv', models=len(models), folds=len(splits)):
+            results = cross_validate_models(
+                models, self.X, self.y, self.groups, cv=splits,
+                scoring='roc_auc', n_jobs=n_jobs, cache=cache, scale=True
+            )
+        self.training_timings['cv'] = time.perf_counter() - t0
         
+        print(f"\n📊 クロスバリデーション結果（{strategy}, {len(splits)}フォールド）:")
+        print("-" * 96)
+        print(f"{'モデル':20s} {'AUC-ROC':>8s} {'(+/- std)':>10s}  {'95%CI':17s} "
+              f"{'学習(s/fold)':>12s} {'予測(ms/1000行)':>15s}")
         best_score = 0
-        for name, model in models.items():
-            try:
-                # AUC-ROCスコアで評価
-                scores = cross_val_score(
-                    model, X_scaled, self.y, 
-                    cv=logo, groups=self.groups,
-                    scoring='roc_auc'
-                )
-                mean_score = scores.mean()
-                std_score = scores.std()
-                results[name] = {'mean': mean_score, 'std': std_score, 'scores': scores}
-                
-                print(f"{name:20s}: AUC-ROC = {mean_score:.4f} (+/- {std_score:.4f})")
-                
-                if mean_score > best_score:
-                    best_score = mean_score
-                    self.best_model_name = name
-                    
-            except Exception as e:
-                print(f"{name:20s}: エラー - {e}")
+        self.best_model_name = None
+        for name, result in results.items():
+            mean_score = result['mean']
+            std_score = result['std']
+            print(f"{name:20s} {mean_score:8.4f} (+/- {std_score:.4f})"
+                  f"  [{result['ci_low']:.4f}, {result['ci_high']:.4f}]"
+                  f" {result['fit_seconds']:12.3f} {result['predict_ms_per_1000']:15.1f}")
+            if mean_score > best_score:
+                best_score = mean_score
+                self.best_model_name = name
         
-        print("-" * 60)
+        print("-" * 96)
+        if self.best_model_name is None:
+            # 全フォールドが単一クラスなどで評価できなかった（学習日数が少なすぎる）
+            self.best_model_name = next(iter(models))
+            print(f"⚠️  有効なCVスコアがないため、既定のモデル {self.best_model_name} を使用します")
+        if cache is not None:
+            print(f"   CVキャッシュ: {cache.hits}フォールド再利用 / {cache.misses}フォールド計算")
         print(f"✅ 最良モデル: {self.best_model_name} (AUC-ROC = {best_score:.4f})")
         
-        # 最良モデルを全データで再学習
-        self.best_model = models[self.best_model_name]
-        self.best_model.fit(X_scaled, self.y)
-        self.models = {name: model.fit(X_scaled, self.y) for name, model in models.items()}
+        # 最終学習: 各モデルを全データで1回だけ学習
+        final_names = list(models) if refit_all else [self.best_model_name]
+        self.models = {}
+        for name in final_names:
+            t0 = time.perf_counter()
+            with span('train_models.fit', model=name):
+                self.models[name] = models[name].fit(X_scaled, self.y)
+            self.training_timings[f'fit:{name}'] = time.perf_counter() - t0
+        self.best_model = self.models[self.best_model_name]
         
+        self.print_training_timings()
         return results
+
+    def print_training_timings(self):
+        """train_models のフェーズ別所要時間を表示"""
+        timings = getattr(self, 'training_timings', {})
+        if not timings:
+            return
+        total = sum(timings.values())
+        print("\n⏱️  学習フェーズ別所要時間:")
+        for phase, sec in timings.items():
+            print(f"   {phase:30s}: {sec:7.2f}s")
+        print(f"   {'合計':30s}: {total:7.2f}s")
     
     def analyze_feature_importance(self):
         """特徴量の重要度を分析"""
@@ -498,7 +663,7 @@ class MenuRecommender:
         # カテゴリ別の重要度集計
         print("\n📊 カテゴリ別重要度:")
         nutrition_end = 13  # 栄養素特徴量の数
-        text_end = nutrition_end + len(self.feature_extractor.word_to_idx)
+        text_end = nutrition_end + self.feature_extractor.text_feature_dim()
         category_end = text_end + 13  # カテゴリ特徴量の数
         claude_dim = len(CLAUDE_FEATURE_NAMES) if CLAUDE_FEATURE_NAMES else 0
         claude_end = category_end + claude_dim
@@ -520,46 +685,177 @@ class MenuRecommender:
             print(f"  嗜好一致スコア: {pref_importance/total*100:.1f}%")
         print(f"  その他（共起・頻度）: {other_importance/total*100:.1f}%")
     
+    def _feature_layout(self, training=False):
+        """
+        特徴量の列構成 (Claude特徴量列を含むか, 嗜好スコア列を含むか)
+
+        学習時は Claude モジュールの有無で決まり、学習済みモデルでは feature_names に従う
+        （Claude API が使えない環境でもゼロ埋め・中立値の列は学習時と同じく含める）
+        """
+        names = None if training else getattr(self, 'feature_names', None)
+        if names:
+            include_claude = bool(CLAUDE_FEATURE_NAMES) and CLAUDE_FEATURE_NAMES[0] in names
+            return include_claude, 'preference_score' in names
+        return bool(CLAUDE_FEATURE_NAMES), True
+
+    def _static_features(self, menu, include_claude=True):
+        """メニュー単体で決まる特徴量（栄養素・テキスト・カテゴリ・Claude）"""
+        fe = self.feature_extractor
+        name = menu.get('name', '')
+        nutrition = menu.get('nutrition', {})
+        features = list(fe.extract_nutrition_features(nutrition).values())
+        features.extend(fe.extract_text_features(name))
+        features.extend([int(v) for v in fe.extract_category_features(name).values()])
+        if include_claude:
+            features.extend(fe.extract_claude_features(name, nutrition))
+        return features
+
+    def _static_feature_matrix(self, menus, include_claude=True):
+        """
+        メニュー単体で決まる特徴量の行列
+
+        同じメニュー（名前と栄養素が同じ）は毎日のように繰り返し登場するので、
+        重複を除いたメニューごとに1回だけ計算し、インデックス配列で各行に展開する
+        """
+        unique = {}
+        index = np.empty(len(menus), dtype=np.int64)
+        for i, menu in enumerate(menus):
+            key = (menu.get('name', ''), tuple(sorted(menu.get('nutrition', {}).items())))
+            index[i] = unique.setdefault(key, len(unique))
+        firsts = {}
+        for i, u in enumerate(index.tolist()):
+            firsts.setdefault(u, i)
+        rows = [self._static_features(menus[i], include_claude) for i in firsts.values()]
+        return np.array(rows, dtype=float).reshape(len(rows), -1)[index]
+
+    def _dynamic_features(self, training_data):
+        """
+        学習データ全体に依存する列（嗜好スコア・共起スコア・選択頻度）を全行分計算
+
+        共起スコアはその日の他の選択メニューとの共起の合計。日×メニューの選択回数行列 S と
+        共起行列 C から (S @ C)[日, メニュー] - S[日, メニュー] * C[メニュー, メニュー] で一括計算する
+        （自分自身との共起を除く）。選択頻度は全日数に対する選択回数
+        """
+        from scipy import sparse
+
+        names = [menu['name'] for day_data in training_data for menu in day_data['allMenus']]
+        n = len(names)
+        if n == 0:
+            return np.zeros((0, 3))
+        # 嗜好スコアは全メニュー分を一括計算
+        preference_scores = np.asarray(self.feature_extractor.get_preference_scores(names), dtype=float)
+        n_days = max(len(training_data), 1)
+
+        name_index = {}
+        name_idx = np.array([name_index.setdefault(name, len(name_index)) for name in names])
+        day_idx = np.repeat(
+            np.arange(len(training_data)), [len(day_data['allMenus']) for day_data in training_data]
+        )
+        selected = np.array(
+            [bool(menu['selected']) for day_data in training_data for menu in day_data['allMenus']]
+        )
+        S = sparse.csr_matrix(
+            (np.ones(int(selected.sum())), (day_idx[selected], name_idx[selected])),
+            shape=(len(training_data), len(name_index)),
+        )
+        C = self.cooccurrence_analyzer.sparse_matrix(name_index)
+        SC = (S @ C).tocsr()
+        cooccurrence = (
+            np.asarray(SC[day_idx, name_idx]).ravel()
+            - np.asarray(S[day_idx, name_idx]).ravel() * C.diagonal()[name_idx]
+        )
+
+        selection_count = self.cooccurrence_analyzer.menu_selection_count
+        counts = np.array([selection_count.get(name, 0) for name in name_index], dtype=float)
+        return np.column_stack([preference_scores, cooccurrence, counts[name_idx] / n_days])
+
+    def build_serving_features(self, menus, frequency_days=15):
+        """
+        推論用の特徴量行列（スケーリング前）を構築
+
+        共起スコアは0、選択頻度は frequency_days で割った値とする
+        （generate_ai_selections の推論時の扱い。モデル学習時の特徴量分布を考慮）
+
+        Args:
+            menus: [{'name', 'nutrition'}, ...]
+            frequency_days: 選択頻度の分母（学習データの日数）
+
+        Returns:
+            np.ndarray (len(menus), 特徴量数)
+        """
+        include_claude, include_preference = self._feature_layout()
+        # 嗜好スコアは全メニュー分を一括計算
+        preference_scores = self.feature_extractor.get_preference_scores(
+            [m.get('name', '') for m in menus]
+        )
+
+        rows = []
+        for menu, preference_score in zip(menus, preference_scores):
+            features = self._static_features(menu, include_claude)
+            if include_preference:
+                features.append(preference_score)
+            features.append(0.0)  # 共起スコア
+            features.append(
+                self.cooccurrence_analyzer.menu_selection_count.get(menu['name'], 0) / frequency_days
+            )
+            rows.append(features)
+
+        if not rows:
+            return np.zeros((0, len(getattr(self, 'feature_names', []))))
+        return np.array(rows, dtype=float)
+
+    def predict_scores_batch(self, menu_lists):
+        """
+        複数日のメニューリストをまとめてスコアリング（選択済みメニューなしの predict と同じスコア）
+
+        全日分の特徴量を1つの行列にして predict_proba を1回だけ呼ぶ
+
+        Args:
+            menu_lists: [[{'name', 'nutrition'}, ...], ...]（日ごと）
+
+        Returns:
+            日ごとのスコア配列（入力と同じ並び）のリスト
+        """
+        menus = [menu for day_menus in menu_lists for menu in day_menus]
+        if not menus:
+            return [np.zeros(0) for _ in menu_lists]
+        include_claude, include_preference = self._feature_layout()
+        names = [menu['name'] for menu in menus]
+        columns = [self._static_feature_matrix(menus, include_claude)]
+        if include_preference:
+            columns.append(np.asarray(self.feature_extractor.get_preference_scores(names), dtype=float))
+        selection_count = self.cooccurrence_analyzer.menu_selection_count
+        n_days = max(len(self.training_data), 1)
+        columns.append(np.zeros(len(menus)))  # 共起スコア
+        columns.append(np.array([selection_count.get(name, 0) for name in names], dtype=float) / n_days)
+        X = np.column_stack(columns)
+        probabilities = self.best_model.predict_proba(self.scaler.transform(X))[:, 1]
+        return np.split(probabilities, np.cumsum([len(day_menus) for day_menus in menu_lists])[:-1])
+
     def predict(self, menus, already_selected=None):
         """メニューリストに対して推薦スコアを予測"""
         if already_selected is None:
             already_selected = []
         
+        include_claude, include_preference = self._feature_layout()
         X_pred = []
-        for menu in menus:
-            # 栄養素特徴量
-            nutrition_features = self.feature_extractor.extract_nutrition_features(
-                menu.get('nutrition', {})
-            )
-            
-            # テキスト特徴量
-            text_features = self.feature_extractor.extract_text_features(menu['name'])
-            
-            # カテゴリ特徴量
-            category_features = self.feature_extractor.extract_category_features(menu['name'])
-            
-            # Claude特徴量
-            claude_features = self.feature_extractor.extract_claude_features(menu['name'])
-            preference_score = self.feature_extractor.get_preference_score(menu['name'])
+        preference_scores = self.feature_extractor.get_preference_scores(
+            [menu['name'] for menu in menus]
+        )
+        for menu, preference_score in zip(menus, preference_scores):
+            features = self._static_features(menu, include_claude)
+            if include_preference:
+                features.append(preference_score)
             
             # 共起スコア
-            cooccurrence_score = self.cooccurrence_analyzer.get_cooccurrence_score(
+            features.append(self.cooccurrence_analyzer.get_cooccurrence_score(
                 menu['name'], already_selected
-            )
+            ))
             
             # 選択頻度
-            selection_frequency = self.cooccurrence_analyzer.menu_selection_count.get(
+            features.append(self.cooccurrence_analyzer.menu_selection_count.get(
                 menu['name'], 0
-            ) / max(len(self.training_data), 1)
-            
-            # 特徴量を結合
-            features = list(nutrition_features.values())
-            features.extend(text_features)
-            features.extend([int(v) for v in category_features.values()])
-            features.extend(claude_features)
-            features.append(preference_score)
-            features.append(cooccurrence_score)
-            features.append(selection_frequency)
+            ) / max(len(self.training_data), 1))
             
             X_pred.append(features)
         
@@ -582,39 +878,101 @@ class MenuRecommender:
         results.sort(key=lambda x: -x['score'])
         return results
     
-    def save_model(self, path='model'):
-        """モデルを保存"""
-        import pickle
-        import os
-        
-        os.makedirs(path, exist_ok=True)
-        
-        # Claude関連オブジェクトはpickle保存しない（APIクライアントを含むため）
-        feature_extractor_copy = MenuFeatureExtractor()
-        feature_extractor_copy.word_counter = self.feature_extractor.word_counter
-        feature_extractor_copy.word_to_idx = self.feature_extractor.word_to_idx
-        feature_extractor_copy.scaler = self.feature_extractor.scaler
-        feature_extractor_copy.use_claude = self.feature_extractor.use_claude
-        # claude_analyzer と preference_analyzer は保存しない（実行時に再初期化）
-        
-        model_data = {
-            'best_model': self.best_model,
-            'best_model_name': self.best_model_name,
-            'scaler': self.scaler,
-            'feature_extractor': feature_extractor_copy,
-            'cooccurrence_analyzer': self.cooccurrence_analyzer,
-            'feature_names': self.feature_names,
-            'use_claude': self.feature_extractor.use_claude
+    def save_model(self, path=None):
+        """
+        モデルを保存（model_artifact のアーティファクト形式）
+
+        Args:
+            path: 出力ディレクトリ（省略時は ml/model/menu_recommender）
+        """
+        from model_artifact import ARTIFACT_DIR, is_artifact, read_manifest, save_artifact
+
+        path = path or ARTIFACT_DIR
+        extra = {
+            'text_mode': self.feature_extractor.text_mode,
+            'hash_dim': self.feature_extractor.hash_dim,
         }
+        # 調整済みのセット最適化パラメータ（tune_set_optimizer.py）は再学習後も引き継ぐ
+        if is_artifact(path):
+            tuned = read_manifest(path).get('set_optimizer')
+            if tuned:
+                extra['set_optimizer'] = tuned
+
+        # Claude関連オブジェクトは保存しない（APIクライアントを含むため。実行時に再初期化）
+        path = save_artifact(
+            path,
+            best_model=self.best_model,
+            best_model_name=self.best_model_name,
+            scaler=self.scaler,
+            feature_names=self.feature_names,
+            word_to_idx=self.feature_extractor.word_to_idx,
+            word_counter=self.feature_extractor.word_counter,
+            use_claude=self.feature_extractor.use_claude,
+            cooccurrence_analyzer=self.cooccurrence_analyzer,
+            extra=extra,
+        )
+        self.model_version = _artifact_model_version(read_manifest(path))
+        print(f"\n✅ モデルを保存しました: {path}")
+    
+    @classmethod
+    def load_model(cls, path=None):
+        """
+        モデルを読み込み
+
+        Args:
+            path: アーティファクトのディレクトリ、または旧形式の pickle。
+                  省略時はアーティファクト形式を優先し、なければ旧形式の pickle
+        """
+        from model_artifact import find_model_path, is_artifact
+
+        resolved = find_model_path(path)
+        if resolved is None:
+            raise FileNotFoundError(f"モデルが見つかりません: {path or 'ml/model/'}")
+        if is_artifact(resolved):
+            recommender = cls._load_artifact(resolved)
+        else:
+            recommender = cls._load_legacy_pickle(resolved)
         
-        with open(f'{path}/menu_recommender.pkl', 'wb') as f:
-            pickle.dump(model_data, f)
+        # Claude解析モジュールの再初期化（モデルがClaude特徴量を使用している場合）
+        if recommender.feature_extractor.use_claude and CLAUDE_AVAILABLE:
+            recommender.feature_extractor.init_claude()
         
-        print(f"\n✅ モデルを保存しました: {path}/menu_recommender.pkl")
-    
+        print(f"✅ モデルを読み込みました: {resolved}")
+        print(f"   Claude特徴量: {'有効' if recommender.feature_extractor.use_claude else '無効'}")
+        return recommender
+
     @classmethod
-    def load_model(cls, path='model/menu_recommender.pkl'):
-        """モデルを読み込み"""
+    def _load_artifact(cls, path):
+        """アーティファクト形式から組み立て（推定器は初回使用時に読み込む）"""
+        from model_artifact import load_artifact
+
+        artifact = load_artifact(path)
+        manifest = artifact['manifest']
+
+        recommender = cls()
+        recommender.best_model_name = manifest['best_model_name']
+        recommender.model_version = _artifact_model_version(manifest)
+        recommender._estimator_loader = artifact['load_estimator']
+        recommender.scaler = ArrayScaler(artifact['scaler_mean'], artifact['scaler_scale'])
+        recommender.feature_names = manifest['feature_names']
+        recommender.training_data = []  # 予測時は不要
+
+        fe = recommender.feature_extractor
+        fe.word_to_idx = {word: i for i, word in enumerate(manifest['vocab'])}
+        fe.word_counter = Counter(dict(zip(manifest['vocab'], manifest['word_counts'])))
+        fe.use_claude = manifest['use_claude']
+        fe.text_mode = manifest.get('text_mode', 'vocab')
+        fe.hash_dim = manifest.get('hash_dim', HASH_DIM)
+
+        coocc = recommender.cooccurrence_analyzer
+        coocc.cooccurrence_matrix = artifact['cooccurrence_matrix']
+        coocc.menu_selection_count = Counter(artifact['menu_selection_count'])
+        coocc.category_cooccurrence = artifact['category_cooccurrence']
+        return recommender
+
+    @classmethod
+    def _load_legacy_pickle(cls, path):
+        """旧形式（MenuRecommender 全体の pickle）から組み立て"""
         import pickle
 
         class _Unpickler(pickle.Unpickler):
@@ -644,25 +1002,30 @@ class MenuRecommender:
             fe.claude_analyzer = None
         if not hasattr(fe, 'preference_analyzer'):
             fe.preference_analyzer = None
-        
-        # Claude解析モジュールの再初期化（モデルがClaude特徴量を使用している場合）
-        use_claude = model_data.get('use_claude', False)
-        if use_claude and CLAUDE_AVAILABLE:
-            recommender.feature_extractor.init_claude()
-        
-        print(f"✅ モデルを読み込みました: {path}")
-        print(f"   Claude特徴量: {'有効' if getattr(recommender.feature_extractor, 'use_claude', False) else '無効'}")
+        fe.use_claude = model_data.get('use_claude', fe.use_claude)
         return recommender
 
 
 def main():
     """メイン処理"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="メニュー推薦モデルの学習")
+    parser.add_argument("--text-mode", choices=TEXT_MODES, default=DEFAULT_TEXT_MODE,
+                        help="テキスト特徴量の方式（vocab: 出現2回以上の単語 / hashed: 単語・文字n-gramのハッシュ）")
+    parser.add_argument("--cv-cache", action="store_true",
+                        help="フォールド単位のCVスコアキャッシュを使う（同じデータでパラメータを比較する場合など）")
+    parser.add_argument("--engines", nargs="+", choices=MODEL_ENGINES, default=None,
+                        help=f"比較するモデル（未指定時は {' '.join(DEFAULT_ENGINES)}）")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
     print("=" * 60)
     print("🍽️  Kyowa Menu Recommender - 学習スクリプト")
     print("=" * 60)
     
     # 推薦モデルを初期化
-    recommender = MenuRecommender()
+    recommender = MenuRecommender(text_mode=args.text_mode)
     
     # データ読み込み
     recommender.load_data()
@@ -670,8 +1033,8 @@ def main():
     # 特徴量準備
     recommender.prepare_features()
     
-    # モデル学習
-    recommender.train_models()
+    # モデル学習（保存するのは最良モデルのみ）
+    recommender.train_models(refit_all=False, engines=args.engines, use_cv_cache=args.cv_cache)
     
     # 特徴量重要度分析
     recommender.analyze_feature_importance()
@@ -679,6 +1042,12 @@ def main():
     # モデル保存
     recommender.save_model()
     
+    # 差分再学習用の学習状態と、推論用の蒸留スコアラーを書き出し
+    from incremental_training import save_training_state
+    from distilled_scorer import export_distilled
+    save_training_state(recommender)
+    export_distilled(recommender)
+    
     # テスト予測
     print("\n" + "=" * 60)
     print("🧪 テスト予測（最新日のメニュー）")
@@ -704,4 +1073,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    run_main(main, 'menu_recommender')
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+学習済みモデルのアーティファクト形式（バージョン付きディレクトリ）
+
+    ml/model/menu_recommender/
+        manifest.json       スキーマバージョン、モデル名、特徴量名、語彙、テキスト特徴量方式、
+                            共起のメニュー/カテゴリ名
+        scaler_mean.npy     StandardScaler の mean_（mmap で読み込み）
+        scaler_scale.npy    StandardScaler の scale_（mmap で読み込み）
+        cooccurrence.npz    メニュー/カテゴリ共起の疎行列（COO: 行・列・回数）と選択回数
+        estimator.pkl       sklearn の推定器のみ（リポジトリのクラスを含まない）
+
+旧形式（MenuRecommender 全体の pickle）と違い、リポジトリ内のクラスをリネーム・移動しても
+読み込みが壊れない。推定器は使うときまで読み込まない（蒸留スコアラーで推論する場合は
+sklearn をインポートしない）。
+
+このモジュールは入出力のみを担当し、MenuRecommender の組み立ては menu_recommender.py が行う。
+
+使い方:
+    # 手元に残っている旧形式の pickle をアーティファクト形式に変換（--src は必須）
+    python ml/model_artifact.py --src ml/model/menu_recommender.pkl --dst ml/model/menu_recommender
+
+    # 読み込み時間の比較のみ（--src を指定すれば旧形式の pickle とも比較）
+    python ml/model_artifact.py --benchmark
+"""
+
+import argparse
+import hashlib
+import json
+import pickle
+import shutil
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+ML_DIR = Path(__file__).parent
+MODEL_DIR = ML_DIR / "model"
+ARTIFACT_DIR = MODEL_DIR / "menu_recommender"
+LEGACY_MODEL_FILE = MODEL_DIR / "menu_recommender.pkl"
+MANIFEST_FILE = "manifest.json"
+SCHEMA_VERSION = 1
+
+
+def is_artifact(path) -> bool:
+    """アーティファクト形式のディレクトリか"""
+    return (Path(path) / MANIFEST_FILE).exists()
+
+
+def find_model_path(path=None):
+    """
+    読み込むモデルのパスを決める
+
+    path 未指定時はアーティファクト形式（ARTIFACT_DIR）を優先し、
+    なければ旧形式の pickle（LEGACY_MODEL_FILE）。どちらもなければ None
+    """
+    if path is not None:
+        path = Path(path)
+        return path if path.exists() else None
+    for candidate in (ARTIFACT_DIR, LEGACY_MODEL_FILE):
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def read_manifest(path) -> dict:
+    """manifest.json のみ読み込む"""
+    with open(Path(path) / MANIFEST_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def update_manifest(path, **fields) -> dict:
+    """manifest.json の項目を追加・更新する（推定器・配列は変更しない）"""
+    manifest = read_manifest(path)
+    manifest.update(fields)
+    tmp = Path(path) / (MANIFEST_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    tmp.replace(Path(path) / MANIFEST_FILE)
+    return manifest
+
+
+def _coo(nested: dict, names: list):
+    """{a: {b: count}} を names のインデックスによる COO 配列にする"""
+    index = {name: i for i, name in enumerate(names)}
+    rows, cols, counts = [], [], []
+    for a, inner in nested.items():
+        for b, count in inner.items():
+            rows.append(index[a])
+            cols.append(index[b])
+            counts.append(count)
+    return (
+        np.asarray(rows, dtype=np.int32),
+        np.asarray(cols, dtype=np.int32),
+        np.asarray(counts, dtype=np.int32),
+    )
+
+
+def _nested(rows, cols, counts, names: list) -> dict:
+    nested = {}
+    for r, c, n in zip(rows.tolist(), cols.tolist(), counts.tolist()):
+        nested.setdefault(names[r], {})[names[c]] = n
+    return nested
+
+
+def save_artifact(path, *, best_model, best_model_name, scaler, feature_names, word_to_idx,
+                  word_counter, use_claude, cooccurrence_analyzer, extra=None):
+    """
+    アーティファクトを書き出す（書き込み完了後にディレクトリを置き換える）
+
+    Returns:
+        書き出したディレクトリの Path
+    """
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.mkdir(parents=True, exist_ok=True)
+
+    vocab = sorted(word_to_idx, key=word_to_idx.get)
+    coocc = cooccurrence_analyzer
+    menu_names = sorted(set(coocc.cooccurrence_matrix) | set(coocc.menu_selection_count))
+    categories = sorted(
+        set(coocc.category_cooccurrence)
+        | {c for inner in coocc.category_cooccurrence.values() for c in inner}
+    )
+    menu_rows, menu_cols, menu_counts = _coo(coocc.cooccurrence_matrix, menu_names)
+    cat_rows, cat_cols, cat_counts = _coo(coocc.category_cooccurrence, categories)
+
+    np.save(tmp / "scaler_mean.npy", np.asarray(scaler.mean_, dtype=np.float64))
+    np.save(tmp / "scaler_scale.npy", np.asarray(scaler.scale_, dtype=np.float64))
+    np.savez(
+        tmp / "cooccurrence.npz",
+        menu_rows=menu_rows, menu_cols=menu_cols, menu_counts=menu_counts,
+        selection_counts=np.asarray([coocc.menu_selection_count.get(n, 0) for n in menu_names], dtype=np.int32),
+        category_rows=cat_rows, category_cols=cat_cols, category_counts=cat_counts,
+    )
+    estimator_bytes = pickle.dumps(best_model, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(tmp / "estimator.pkl", "wb") as f:
+        f.write(estimator_bytes)
+
+    try:
+        import sklearn
+        sklearn_version = sklearn.__version__
+    except ImportError:
+        sklearn_version = None
+
+    manifest = {
+        "schema_version": SCHEMA_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "best_model_name": best_model_name,
+        "estimator": {
+            "file": "estimator.pkl",
+            "class": f"{type(best_model).__module__}.{type(best_model).__name__}",
+            "sklearn_version": sklearn_version,
+            "sha1": hashlib.sha1(estimator_bytes).hexdigest()[:16],
+        },
+        "use_claude": bool(use_claude),
+        "feature_names": list(feature_names),
+        "vocab": vocab,
+        "word_counts": [int(word_counter.get(w, 0)) for w in vocab],
+        "cooccurrence": {"menus": menu_names, "categories": categories},
+        **(extra or {}),
+    }
+    with open(tmp / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+    # 書き込みが完了してから差し替える（途中で失敗しても既存モデルは壊れない）
+    if path.exists():
+        old = path.with_name(path.name + ".old")
+        if old.exists():
+            shutil.rmtree(old)
+        path.rename(old)
+        tmp.rename(path)
+        shutil.rmtree(old)
+    else:
+        tmp.rename(path)
+    return path
+
+
+def load_artifact(path, mmap: bool = True) -> dict:
+    """
+    アーティファクトを読み込む（推定器は読み込まず、読み込み関数を返す）
+
+    Returns:
+        {'manifest', 'scaler_mean', 'scaler_scale', 'cooccurrence_matrix',
+         'menu_selection_count', 'category_cooccurrence', 'load_estimator'}
+    """
+    path = Path(path)
+    manifest = read_manifest(path)
+    version = manifest.get("schema_version")
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"未対応のモデル形式: schema_version={version}（対応: {SCHEMA_VERSION}）")
+
+    mmap_mode = "r" if mmap else None
+    scaler_mean = np.load(path / "scaler_mean.npy", mmap_mode=mmap_mode)
+    scaler_scale = np.load(path / "scaler_scale.npy", mmap_mode=mmap_mode)
+
+    menus = manifest["cooccurrence"]["menus"]
+    categories = manifest["cooccurrence"]["categories"]
+    with np.load(path / "cooccurrence.npz", allow_pickle=False) as data:
+        cooccurrence_matrix = _nested(data["menu_rows"], data["menu_cols"], data["menu_counts"], menus)
+        category_cooccurrence = _nested(
+            data["category_rows"], data["category_cols"], data["category_counts"], categories
+        )
+        menu_selection_count = {
+            name: count for name, count in zip(menus, data["selection_counts"].tolist()) if count
+        }
+
+    estimator_info = manifest["estimator"]
+
+    def load_estimator():
+        with open(path / estimator_info["file"], "rb") as f:
+            estimator = pickle.load(f)
+        saved = estimator_info.get("sklearn_version")
+        try:
+            import sklearn
+            if saved and sklearn.__version__ != saved:
+                print(f"⚠️  scikit-learn のバージョンが学習時と異なります（学習時 {saved} / 現在 {sklearn.__version__}）")
+        except ImportError:
+            pass
+        return estimator
+
+    return {
+        "manifest": manifest,
+        "scaler_mean": scaler_mean,
+        "scaler_scale": scaler_scale,
+        "cooccurrence_matrix": cooccurrence_matrix,
+        "menu_selection_count": menu_selection_count,
+        "category_cooccurrence": category_cooccurrence,
+        "load_estimator": load_estimator,
+    }
+
+
+def benchmark(legacy_path, artifact_path, repeat: int = 5):
+    """旧形式と新形式の読み込み時間を比較（それぞれ新しいプロセスで初回読み込みも計測）"""
+    import subprocess
+
+    print("\n⏱️  モデル読み込み時間（新しいプロセスでの初回読み込み、sklearn のインポートを含む）:")
+    code = (
+        "import sys, time, contextlib, io; sys.path.insert(0, {ml!r});"
+        "from menu_recommender import MenuRecommender;"
+        "t = time.perf_counter();"
+        "f = io.StringIO();\n"
+        "with contextlib.redirect_stdout(f):\n"
+        "    r = MenuRecommender.load_model({path!r}){touch}\n"
+        "print((time.perf_counter() - t) * 1000)"
+    )
+    cases = [
+        ("旧形式 pickle", legacy_path, ""),
+        ("アーティファクト（推定器も読み込み）", artifact_path, "; r.best_model"),
+        ("アーティファクト（推定器は遅延）", artifact_path, ""),
+    ]
+    for label, path, touch in cases:
+        if path is None or not Path(path).exists():
+            continue
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.run(
+                [sys.executable, "-c", code.format(ml=str(ML_DIR), path=str(path), touch=touch)],
+                capture_output=True, text=True,
+            )
+            if out.returncode != 0:
+                print(f"   {label:36s}: ❌ {out.stderr.strip().splitlines()[-1:]}")
+                break
+            runs.append(float(out.stdout.strip().splitlines()[-1]))
+        if runs:
+            print(f"   {label:36s}: {min(runs):8.1f}ms")
+
+
+def main():
+    sys.path.insert(0, str(ML_DIR))
+    parser = argparse.ArgumentParser(description="旧形式モデル（pickle）をアーティファクト形式に変換")
+    parser.add_argument("--src", type=str, default=None,
+                        help="旧形式の pickle（変換時は必須。リポジトリの旧 pickle は削除済み）")
+    parser.add_argument("--dst", type=str, default=str(ARTIFACT_DIR), help="出力ディレクトリ")
+    parser.add_argument("--benchmark", action="store_true", help="変換せず読み込み時間の比較のみ")
+    args = parser.parse_args()
+    if not args.benchmark and args.src is None:
+        parser.error("変換には --src（旧形式の pickle）が必要です")
+
+    if not args.benchmark:
+        from menu_recommender import MenuRecommender
+
+        src = Path(args.src)
+        if not src.exists():
+            print(f"❌ モデルが見つかりません: {src}")
+            return
+        recommender = MenuRecommender.load_model(str(src))
+        recommender.save_model(args.dst)
+
+    benchmark(args.src, args.dst)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+複数ユーザーの推薦（ユーザー別モデル・プロファイル）
+
+ml/user_preferences/<user_id>.json の評価（ratings）から、ユーザーごとの補正モデルを学習する。
+メニューの特徴量と基準スコアは全ユーザーで共有し、ユーザーごとに変わるのは次の2つだけ:
+
+- 重み: 共有の標準化済み静的特徴量（栄養素・テキスト・カテゴリ・Claude）に対する線形補正。
+  評価を中立値で中心化した目標へのリッジ回帰（評価数が少ないほど補正は小さい）
+- 直接評価の列: そのユーザーが評価したメニュー自体へのロジット補正
+
+    ユーザー u のメニュー m のスコア = sigmoid(基準ロジット[m] + Z[m] · w_u + RATING_WEIGHT * r_u[m])
+
+基準ロジットは共有の学習済みモデル（MenuRecommender）の確率。1日分のスコアリングは
+全ユーザーの重みを並べた行列との積1回で行う。
+
+保存先（ユーザーごとに並べて保存）:
+    ml/model/users/<user_id>/model.npz     重み・評価済みメニュー（モデルの指紋付き）
+    ml/model/users/<user_id>/profile.json  評価の集計（好き/苦手なメニュー・よく出る単語）
+
+使い方:
+    # 全ユーザーのモデルを並列に学習（共有モデルを再学習したら再実行）
+    python ml/multi_user.py --train
+
+    # 指定日の全ユーザーの推薦を一括生成（ml/data/user_selections/ に保存）
+    # セットは本番と同じセット最適化（select_best_menu_set）で各ユーザーのスコアから選ぶ
+    python ml/multi_user.py --date 2026-04-07
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+ML_DIR = Path(__file__).parent
+PROJECT_ROOT = ML_DIR.parent
+USER_PREFERENCES_DIR = ML_DIR / "user_preferences"
+USER_MODEL_DIR = ML_DIR / "model" / "users"
+USER_SELECTIONS_DIR = ML_DIR / "data" / "user_selections"
+
+# 評価の中立値と正規化幅（1〜5 → -1〜1）
+RATING_NEUTRAL = 3.0
+RATING_SCALE = 2.0
+# 重みのリッジ正則化係数（評価数がこれより少ないと補正はほぼ0）
+USER_RIDGE_ALPHA = 10.0
+# 直接評価したメニューへのロジット補正の重み
+RATING_WEIGHT = 1.0
+PROB_EPS = 1e-6
+
+
+def load_user_ratings(path) -> dict:
+    """
+    ユーザー評価ファイルを読み込む
+
+    Returns:
+        {'user_id', 'ratings': {メニュー名: 平均評価}, 'updated_at'}
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    ratings = {}
+    for name, entries in data.get("ratings", {}).items():
+        values = [e["rating"] for e in entries if isinstance(e.get("rating"), (int, float))]
+        if values:
+            ratings[name] = float(np.mean(values))
+    return {
+        "user_id": data.get("user_id", Path(path).stem),
+        "ratings": ratings,
+        "updated_at": data.get("updated_at"),
+    }
+
+
+def list_users(preferences_dir=USER_PREFERENCES_DIR) -> list:
+    """評価ファイルがある全ユーザー"""
+    return [load_user_ratings(path) for path in sorted(Path(preferences_dir).glob("*.json"))]
+
+
+class SharedMenuFeatures:
+    """
+    全ユーザー共通のメニュー特徴量
+
+    共有モデルの特徴量行列（スケーリング後）のうちメニュー単体で決まる列と、
+    共有モデルの確率のロジット（基準ロジット）を1回だけ計算する
+    """
+
+    def __init__(self, recommender, menus: list):
+        include_claude, include_preference = recommender._feature_layout()
+        X_raw = recommender.build_serving_features(menus)
+        Z = recommender.scaler.transform(X_raw)
+        prob = np.clip(recommender.best_model.predict_proba(Z)[:, 1], PROB_EPS, 1 - PROB_EPS)
+        # 末尾の嗜好・共起・頻度列はユーザーに依存しない全体の統計なので補正に使わない
+        static_dim = Z.shape[1] - (3 if include_preference else 2)
+
+        self.names = [menu.get("name", "") for menu in menus]
+        self.Z = np.ascontiguousarray(Z[:, :static_dim])
+        self.base_logit = np.log(prob / (1 - prob))
+        # 同名のメニューは後の行（新しい栄養素）を使う
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+
+class UserModel:
+    """ユーザーごとの補正モデル（重みと直接評価）"""
+
+    def __init__(self, user_id, weights, rated_names, rated_values, meta=None):
+        self.user_id = user_id
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.rated_names = list(rated_names)
+        # 中心化・正規化した評価（-1〜1）
+        self.rated_values = np.asarray(rated_values, dtype=np.float64)
+        self.meta = meta or {}
+
+    @classmethod
+    def fit(cls, user: dict, shared: SharedMenuFeatures, alpha: float = USER_RIDGE_ALPHA):
+        """
+        評価から補正モデルを学習
+
+        共有特徴量にないメニュー（栄養素が分からないもの）は重みの学習には使わず、
+        直接評価の補正だけに使う
+        """
+        ratings = user["ratings"]
+        names = list(ratings)
+        values = (np.array([ratings[n] for n in names], dtype=np.float64) - RATING_NEUTRAL) / RATING_SCALE
+        rows = [shared.index[n] for n in names if n in shared.index]
+        targets = np.array([v for n, v in zip(names, values) if n in shared.index])
+
+        weights = np.zeros(shared.Z.shape[1])
+        if rows:
+            # 評価数 << 特徴量数なので双対形式で解く: w = Zr^T (Zr Zr^T + αI)^-1 t
+            Zr = shared.Z[rows]
+            weights = Zr.T @ np.linalg.solve(Zr @ Zr.T + alpha * np.eye(len(rows)), targets)
+        meta = {"n_ratings": len(names), "n_matched": len(rows), "alpha": alpha}
+        return cls(user["user_id"], weights, names, values, meta)
+
+    def save(self, model_dir=USER_MODEL_DIR, fingerprint: str = ""):
+        path = Path(model_dir) / self.user_id
+        path.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path / "model.npz",
+            weights=self.weights,
+            rated_names=np.array(self.rated_names, dtype=str),
+            rated_values=self.rated_values,
+            meta=np.array(json.dumps({**self.meta, "model_fingerprint": fingerprint}, ensure_ascii=False)),
+        )
+        return path
+
+    @classmethod
+    def load(cls, path):
+        path = Path(path)
+        with np.load(path / "model.npz", allow_pickle=False) as data:
+            return cls(
+                path.name, data["weights"], data["rated_names"].tolist(), data["rated_values"],
+                json.loads(str(data["meta"])),
+            )
+
+
+def build_user_profile(user: dict, feature_extractor) -> dict:
+    """評価の集計（ユーザープロファイル）"""
+    ratings = user["ratings"]
+    liked = sorted((n for n, r in ratings.items() if r >= 4), key=lambda n: -ratings[n])
+    disliked = sorted((n for n, r in ratings.items() if r <= 2), key=lambda n: ratings[n])
+    words = Counter(w for n in liked for w in feature_extractor.extract_words(n))
+    return {
+        "user_id": user["user_id"],
+        "n_ratings": len(ratings),
+        "mean_rating": float(np.mean(list(ratings.values()))) if ratings else None,
+        "liked": liked,
+        "disliked": disliked,
+        "top_words": words.most_common(10),
+        "ratings_updated_at": user.get("updated_at"),
+    }
+
+
+def _fit_and_save(user, shared, model_dir, fingerprint, feature_extractor):
+    """1ユーザー分の学習と保存（プロセスプールで実行）"""
+    t0 = time.perf_counter()
+    model = UserModel.fit(user, shared)
+    path = model.save(model_dir, fingerprint)
+    profile = build_user_profile(user, feature_extractor)
+    profile["trained_at"] = datetime.now().isoformat(timespec="seconds")
+    with open(path / "profile.json", "w", encoding="utf-8") as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+    return user["user_id"], model.meta, time.perf_counter() - t0
+
+
+def train_user_models(recommender, users: list, menus: list, model_dir=USER_MODEL_DIR, n_jobs: int = -1):
+    """
+    全ユーザーの補正モデルをプロセスプールで並列に学習・保存
+
+    Args:
+        recommender: 共有の学習済み MenuRecommender
+        users: list_users() の戻り値
+        menus: 共有特徴量を作るメニュー（評価済みメニューの栄養素の参照先）
+        n_jobs: joblib の並列数（-1 で全コア）
+
+    Returns:
+        [(user_id, meta, 秒), ...]
+    """
+    from joblib import Parallel, delayed
+    from distilled_scorer import model_fingerprint
+    from menu_recommender import MenuFeatureExtractor
+
+    shared = SharedMenuFeatures(recommender, menus)
+    fingerprint = model_fingerprint(recommender)
+    # 単語抽出のみに使う（Claude解析器・APIクライアントはワーカーに渡さない）
+    extractor = MenuFeatureExtractor()
+    return Parallel(n_jobs=n_jobs)(
+        delayed(_fit_and_save)(user, shared, model_dir, fingerprint, extractor) for user in users
+    )
+
+
+def load_user_models(recommender, model_dir=USER_MODEL_DIR) -> list:
+    """保存済みのユーザーモデルを読み込む（共有モデルと指紋が一致しないものは除外）"""
+    from distilled_scorer import model_fingerprint
+
+    fingerprint = model_fingerprint(recommender)
+    models = []
+    for path in sorted(Path(model_dir).glob("*/model.npz")):
+        model = UserModel.load(path.parent)
+        if model.meta.get("model_fingerprint") != fingerprint:
+            print(f"⚠️  {model.user_id}: 共有モデルと一致しないため除外（--train で再学習）")
+            continue
+        models.append(model)
+    return models
+
+
+def score_users(shared: SharedMenuFeatures, user_models: list) -> np.ndarray:
+    """
+    全ユーザーのスコアを一括計算
+
+    Returns:
+        np.ndarray (メニュー数, ユーザー数)
+    """
+    if not user_models:
+        return np.zeros((len(shared.names), 0))
+    W = np.stack([m.weights for m in user_models], axis=1)
+    R = np.zeros((len(shared.names), len(user_models)))
+    for j, model in enumerate(user_models):
+        for name, value in zip(model.rated_names, model.rated_values):
+            i = shared.index.get(name)
+            if i is not None:
+                R[i, j] = value
+    logits = shared.base_logit[:, None] + shared.Z @ W + RATING_WEIGHT * R
+    return 1.0 / (1.0 + np.exp(-logits))
+
+
+def generate_user_selections_for_date(recommender, user_models: list, date_str: str, menus_data: dict,
+                                      profile=None, set_params=None):
+    """
+    指定日の全ユーザーの推薦を生成（特徴量・基準スコアは全ユーザーで共有）
+
+    セットは generate_ai_selections と同じく、ユーザーごとのスコアで select_best_menu_set を実行して選ぶ
+
+    Args:
+        profile: セット目標（set_profile_from_days の結果）。None なら本番と同じくスコア上位 1/3
+        set_params: select_best_menu_set のパラメータ（set_optimizer_params の結果）
+
+    Returns:
+        {'date', 'dateLabel', 'generatedAt', 'users': {user_id: {'selectedMenus', 'allMenusWithScores'}}}
+    """
+    from generate_ai_selections import _extract_nutrition_totals, select_best_menu_set
+
+    menus = menus_data.get("menus", [])
+    if not menus:
+        return None
+    shared = SharedMenuFeatures(recommender, menus)
+    scores = score_users(shared, user_models)
+
+    users = {}
+    for j, model in enumerate(user_models):
+        order = np.argsort(-scores[:, j], kind="stable")
+        menu_scores = [
+            {
+                "name": menus[i].get("name", ""),
+                "score": float(scores[i, j]),
+                "rank": rank,
+                "nutrition": menus[i].get("nutrition", {}),
+                "nutritionTotals": _extract_nutrition_totals(menus[i].get("nutrition", {})),
+            }
+            for rank, i in enumerate(order.tolist(), 1)
+        ]
+        if profile:
+            selected, _ = select_best_menu_set(menu_scores, profile, recommender, **(set_params or {}))
+        else:
+            selected = menu_scores[:max(1, len(menu_scores) // 3)]
+        users[model.user_id] = {
+            "selectedMenus": [
+                {key: row[key] for key in ("name", "score", "rank", "nutrition")} for row in selected
+            ],
+            "allMenusWithScores": [
+                {key: row[key] for key in ("name", "score", "rank")} for row in menu_scores
+            ],
+        }
+    return {
+        "date": date_str,
+        "dateLabel": menus_data.get("dateLabel", date_str),
+        "generatedAt": datetime.now().isoformat(),
+        "users": users,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="複数ユーザーの推薦（ユーザー別モデル）")
+    parser.add_argument("--train", action="store_true", help="全ユーザーのモデルを学習")
+    parser.add_argument("--date", nargs="+", default=None, help="推薦を生成する日付（YYYY-MM-DD）")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="学習の並列数")
+    parser.add_argument("--output-dir", type=str, default=str(USER_SELECTIONS_DIR), help="推薦の出力先")
+    parser.add_argument("--local", action="store_true",
+                        help="セット目標を Supabase ではなく data/training_data.json から作る")
+    return parser.parse_args()
+
+
+def main():
+    sys.path.insert(0, str(ML_DIR))
+    from distilled_scorer import load_serving_menus
+    from menu_recommender import MenuRecommender
+    from model_artifact import find_model_path
+
+    args = parse_args()
+    model_path = find_model_path()
+    if model_path is None:
+        print("❌ 共有モデルが見つかりません。先に学習を実行してください")
+        print("   python ml/menu_recommender.py")
+        return
+    recommender = MenuRecommender.load_model(model_path)
+
+    if args.train:
+        users = list_users()
+        print(f"\n👥 {len(users)}ユーザーのモデルを学習中...")
+        t0 = time.perf_counter()
+        results = train_user_models(recommender, users, load_serving_menus(), n_jobs=args.n_jobs)
+        for user_id, meta, seconds in results:
+            print(f"   {user_id}: 評価 {meta['n_ratings']}件（特徴量あり {meta['n_matched']}件） {seconds * 1000:.1f}ms")
+        print(f"✅ {len(results)}ユーザーを学習・保存: {USER_MODEL_DIR}（{time.perf_counter() - t0:.2f}s）")
+
+    if args.date:
+        user_models = load_user_models(recommender)
+        if not user_models:
+            print("❌ ユーザーモデルがありません（python ml/multi_user.py --train）")
+            return
+        from generate_ai_selections import set_optimizer_params, set_profile_from_days
+
+        # セット目標・パラメータは本番（generate_ai_selections）と同じく直近120日と manifest の調整値
+        training_data = recommender.load_data(str(ML_DIR / "data" / "training_data.json"),
+                                              use_supabase=not args.local)
+        profile = set_profile_from_days(training_data[-120:])
+        if profile is None:
+            print("⚠️  選択履歴がないため、スコア上位 1/3 を推薦します")
+        set_params = set_optimizer_params(model_path)
+        output_dir = Path(args.output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for date_str in args.date:
+            menu_file = PROJECT_ROOT / "menus" / f"menus_{date_str}.json"
+            if not menu_file.exists():
+                print(f"⚠️  メニューデータがありません: {menu_file}")
+                continue
+            with open(menu_file, "r", encoding="utf-8") as f:
+                menus_data = json.load(f)
+            t0 = time.perf_counter()
+            result = generate_user_selections_for_date(recommender, user_models, date_str, menus_data,
+                                                       profile, set_params)
+            elapsed = time.perf_counter() - t0
+            if result is None:
+                continue
+            output_path = output_dir / f"user-selections_{date_str}.json"
+            with open(output_path, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            print(f"✓ {date_str}: {len(user_models)}ユーザー分を生成（{elapsed * 1000:.1f}ms） → {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+ML エントリポイント共通のプロファイリング（--profile）
+
+menu_recommender.py / generate_ai_selections.py / update_weekly.py / validate_model.py に
+--profile を付けて実行すると、エントリポイント全体をプロファイラ下で実行し、
+ml/profiles/ に次を書き出す（パッチを当てずに本番相当の実行を調べるため）:
+
+    <名前>_<日時>.pstats   cProfile の生データ（python -m pstats / snakeviz で閲覧）
+    <名前>_<日時>.txt      上位N関数（累積・自己時間）、ピーク RSS、tracemalloc の上位割り当て元
+
+使い方:
+    python ml/menu_recommender.py --profile
+    python ml/generate_ai_selections.py --profile pyinstrument --profile-top 40
+    python ml/update_weekly.py --regen-only --profile --profile-no-tracemalloc
+
+プロファイラ:
+    cprofile      標準の決定的プロファイラ（既定）
+    pyinstrument  サンプリングプロファイラ（インストール時のみ。オーバーヘッドが小さい）
+    auto          pyinstrument があれば使い、なければ cProfile
+
+注意: tracemalloc は割り当てごとに記録するため実行時間が数倍になる。
+時間の内訳だけを見たい場合は --profile-no-tracemalloc を付ける。
+"""
+
+import argparse
+import cProfile
+import io
+import pstats
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource  # Unix のみ
+except ImportError:
+    resource = None
+
+try:
+    import pyinstrument
+    PYINSTRUMENT_AVAILABLE = True
+except ImportError:
+    PYINSTRUMENT_AVAILABLE = False
+
+PROFILE_DIR = Path(__file__).parent / "profiles"
+PROFILERS = ("cprofile", "pyinstrument", "auto")
+DEFAULT_TOP_N = 25
+TRACEMALLOC_FRAMES = 5
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    """--profile 系のオプションを追加（各エントリポイントの argparse で呼ぶ）"""
+    group = parser.add_argument_group("プロファイリング")
+    group.add_argument("--profile", nargs="?", const="cprofile", default=None, choices=PROFILERS,
+                       help="プロファイラ下で実行し ml/profiles/ に .pstats とレポートを出力"
+                            "（値省略時は cprofile）")
+    group.add_argument("--profile-top", type=int, default=DEFAULT_TOP_N,
+                       help=f"レポートに載せる上位関数・割り当て元の数（既定: {DEFAULT_TOP_N}）")
+    group.add_argument("--profile-dir", type=Path, default=PROFILE_DIR,
+                       help="出力先ディレクトリ（既定: ml/profiles/）")
+    group.add_argument("--profile-no-tracemalloc", action="store_true",
+                       help="tracemalloc による割り当て元の記録を行わない（時間計測の歪みを避ける）")
+    return parser
+
+
+def peak_rss_mb() -> float:
+    """プロセスのピーク RSS（MB）。取得できない環境では nan"""
+    if resource is None:
+        return float("nan")
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def _pstats_report(profiler, top_n: int) -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out).strip_dirs()
+    out.write("── 累積時間の上位 ──\n")
+    stats.sort_stats("cumulative").print_stats(top_n)
+    out.write("── 自己時間の上位 ──\n")
+    stats.sort_stats("tottime").print_stats(top_n)
+    return out.getvalue()
+
+
+def _tracemalloc_report(snapshot, top_n: int) -> str:
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ])
+    lines = ["── tracemalloc: 割り当て元の上位（終了時点で確保中のメモリ） ──"]
+    for i, stat in enumerate(snapshot.statistics("traceback")[:top_n], 1):
+        frame = stat.traceback[-1]
+        lines.append(f"{i:3d}. {stat.size / 1024 / 1024:9.2f}MB {stat.count:9d}個  "
+                     f"{frame.filename}:{frame.lineno}")
+    return "\n".join(lines) + "\n"
+
+
+def _resolve_profiler(name: str) -> str:
+    if name == "auto":
+        return "pyinstrument" if PYINSTRUMENT_AVAILABLE else "cprofile"
+    if name == "pyinstrument" and not PYINSTRUMENT_AVAILABLE:
+        print("⚠️  pyinstrument がインストールされていないため cProfile を使用します")
+        return "cprofile"
+    return name
+
+
+def profile_call(fn, name: str, profiler: str = "cprofile", top_n: int = DEFAULT_TOP_N,
+                 output_dir=PROFILE_DIR, trace_memory: bool = True):
+    """
+    fn() をプロファイラ下で実行し、.pstats とレポートを書き出す
+
+    fn が例外・SystemExit で終了してもレポートは書き出してから再送出する。
+
+    Returns:
+        fn() の戻り値
+    """
+    profiler = _resolve_profiler(profiler)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stem = output_dir / f"{name}_{datetime.now():%Y%m%d_%H%M%S}"
+
+    if trace_memory:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    if profiler == "pyinstrument":
+        prof = pyinstrument.Profiler()
+    else:
+        prof = cProfile.Profile()
+
+    t0 = time.perf_counter()
+    prof.enable() if profiler == "cprofile" else prof.start()
+    try:
+        return fn()
+    finally:
+        prof.disable() if profiler == "cprofile" else prof.stop()
+        wall = time.perf_counter() - t0
+        snapshot = traced_peak = None
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        header = [
+            f"エントリポイント: {name}",
+            f"コマンド: {' '.join(sys.argv)}",
+            f"プロファイラ: {profiler}",
+            f"実行時間: {wall:.2f}s",
+            f"ピーク RSS: {peak_rss_mb():.1f}MB",
+        ]
+        if traced_peak is not None:
+            header.append(f"tracemalloc ピーク: {traced_peak / 1024 / 1024:.1f}MB")
+        sections = ["\n".join(header) + "\n"]
+
+        pstats_path = stem.with_suffix(".pstats")
+        if profiler == "cprofile":
+            prof.dump_stats(pstats_path)
+            sections.append(_pstats_report(prof, top_n))
+        else:
+            sections.append(prof.output_text(unicode=True, color=False))
+            try:
+                from pyinstrument.renderers import PstatsRenderer
+                data = prof.output(PstatsRenderer())
+                # PstatsRenderer は marshal のバイト列を utf-8 + surrogateescape で str にして返す
+                if isinstance(data, str):
+                    data = data.encode("utf-8", errors="surrogateescape")
+                pstats_path.write_bytes(data)
+            except ImportError:  # 古い pyinstrument には pstats 出力がない
+                pstats_path = None
+            except (ValueError, OSError) as e:
+                # pstats が書けなくてもテキストレポートは出す
+                print(f"⚠️  pstats を書き出せませんでした: {e}")
+                pstats_path = None
+        if snapshot is not None:
+            sections.append(_tracemalloc_report(snapshot, top_n))
+
+        report_path = stem.with_suffix(".txt")
+        report_path.write_text("\n".join(sections), encoding="utf-8")
+
+        print("\n" + "=" * 60)
+        print("🔬 プロファイル結果")
+        print("=" * 60)
+        print("\n".join(header))
+        if pstats_path is not None:
+            print(f"✅ pstats: {pstats_path}")
+        print(f"✅ レポート: {report_path}")
+
+
+def run_main(main, name: str, argv=None):
+    """
+    エントリポイントの main() を実行（--profile 指定時はプロファイラ下で実行）
+
+    main() 側の argparse も add_profile_arguments() で同じオプションを受け付けておくこと
+    （ここでは --profile 系だけを先読みする）。
+    """
+    parser = add_profile_arguments(argparse.ArgumentParser(add_help=False))
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    if args.profile is None:
+        return main()
+    return profile_call(
+        main, name,
+        profiler=args.profile,
+        top_n=args.profile_top,
+        output_dir=args.profile_dir,
+        trace_memory=not args.profile_no_tracemalloc,
+    )
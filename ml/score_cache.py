@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+メニュー別の推薦スコアのキャッシュ（モデルの識別子ごと）
+
+generate_ai_selections の推論時の特徴量は、メニュー名と栄養素だけで決まる
+（栄養素・テキスト・カテゴリ・Claude・嗜好スコア、共起スコアは 0、選択頻度は学習済みの
+menu_selection_count）。繰り返し登場する料理は日付が違っても同じスコアになるので、
+(モデルの識別子, 正規化したメニュー名, 栄養素のハッシュ) をキーにスコアと推薦理由を保存し、
+モデル（または蒸留スコアラー）の評価はキャッシュにないメニューだけで行う。
+
+保存先はモデルの隣（アーティファクト形式なら model/menu_recommender/score_cache.json）。
+Claude特徴量を使う場合:
+- キャッシュ全体の識別子に嗜好プロファイルのハッシュを含める（全メニューの嗜好スコアが変わるため）
+- 各メニューのキーに、そのメニューの Claude解析結果のハッシュ（未解析なら Claude解析近似モデルの
+  ハッシュ）を含める
+Claude解析キャッシュは推論中にも新しい料理の解析で書き換わるが、解析済みの料理のキーは変わらないので
+エントリは次回以降も再利用される。再学習しない場合（update_weekly --skip-retrain や新しい学習日が
+ないとき）でも、解析結果や嗜好プロファイルが変わった料理は再評価される。
+
+使い方:
+    python ml/generate_ai_selections.py                   # キャッシュを使用（既定）
+    python ml/generate_ai_selections.py --no-score-cache  # 全メニューをモデルで評価
+"""
+
+import hashlib
+import json
+import unicodedata
+from pathlib import Path
+
+CACHE_FILE = "score_cache.json"
+SCHEMA_VERSION = 2
+
+
+def cache_path(model_path) -> Path:
+    """モデルの隣のキャッシュファイル（アーティファクトならディレクトリ内、旧形式 pickle なら同じ場所）"""
+    model_path = Path(model_path)
+    if model_path.is_dir():
+        return model_path / CACHE_FILE
+    return model_path.with_name(f"{model_path.stem}_{CACHE_FILE}")
+
+
+def _file_digest(path) -> str:
+    """ファイル内容の SHA-1（先頭16桁。ファイルがなければ '-'）"""
+    path = Path(path)
+    if not path.exists():
+        return "-"
+    return hashlib.sha1(path.read_bytes()).hexdigest()[:16]
+
+
+def _claude_analyzer(recommender):
+    """推論で使われる Claude解析モジュール（Claude特徴量が無効なら None）"""
+    fe = recommender.feature_extractor
+    return fe.claude_analyzer if fe.use_claude else None
+
+
+def cache_fingerprint(recommender, scorer=None) -> str:
+    """キャッシュの有効範囲の識別子（モデル + 嗜好プロファイル + 蒸留スコアラーの使用）"""
+    from distilled_scorer import model_fingerprint
+
+    parts = [model_fingerprint(recommender)]
+    if _claude_analyzer(recommender) is not None:
+        from claude_preference_analyzer import PROFILE_FILE
+
+        parts.append(f"claude-{_file_digest(PROFILE_FILE)}")
+    else:
+        parts.append("base")
+    if scorer is not None:
+        parts.append("distilled")
+    return ":".join(parts)
+
+
+def normalize_name(name: str) -> str:
+    """メニュー名の正規化（NFKC + 前後・連続する空白の除去）"""
+    return " ".join(unicodedata.normalize("NFKC", name or "").split())
+
+
+def menu_key(menu: dict) -> str:
+    """(正規化したメニュー名, 栄養素のハッシュ) のキー"""
+    nutrition = json.dumps(menu.get("nutrition", {}), sort_keys=True, ensure_ascii=False, default=str)
+    digest = hashlib.sha1(nutrition.encode("utf-8")).hexdigest()[:16]
+    return f"{normalize_name(menu.get('name', ''))}\t{digest}"
+
+
+def claude_row_digest(claude_analyzer, name: str, surrogate_digest: str) -> str:
+    """
+    メニューの Claude特徴量の入力のハッシュ
+
+    解析済みならキャッシュの解析結果、未解析なら近似モデル（ファイル内容のハッシュ。
+    近似モデルを使わない・ない場合は '-'）
+    """
+    row = claude_analyzer.cache.get(name)
+    if row is None:
+        return f"s{surrogate_digest}"
+    payload = json.dumps(row, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class ScoreCache:
+    """メニュー別のスコア・推薦理由のキャッシュ（1つのモデルの識別子分）"""
+
+    def __init__(self, path, fingerprint: str, entries: dict = None, claude_analyzer=None):
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self.entries = entries or {}
+        # Claude特徴量を使う場合はメニューごとの解析結果もキーに含める
+        self.claude_analyzer = claude_analyzer
+        self.surrogate_digest = "-"
+        if claude_analyzer is not None and claude_analyzer.use_surrogate:
+            from claude_surrogate import SURROGATE_FILE
+
+            self.surrogate_digest = _file_digest(SURROGATE_FILE)
+        self.stats = {"hits": 0, "misses": 0, "evaluated": 0}
+        self.dirty = False
+
+    @classmethod
+    def load(cls, model_path, recommender, scorer=None):
+        """モデルの隣のキャッシュを読み込む（識別子・形式が違えば空のキャッシュ）"""
+        path = cache_path(model_path)
+        fingerprint = cache_fingerprint(recommender, scorer)
+        entries = {}
+        if path.exists():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("schema_version") == SCHEMA_VERSION and data.get("model_fingerprint") == fingerprint:
+                    entries = data.get("entries", {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️  スコアキャッシュを読み込めないため作り直します: {e}")
+        return cls(path, fingerprint, entries, _claude_analyzer(recommender))
+
+    def key(self, menu: dict) -> str:
+        """メニューのキー（menu_key + Claude特徴量を使う場合はそのメニューの解析結果のハッシュ）"""
+        key = menu_key(menu)
+        if self.claude_analyzer is None:
+            return key
+        name = menu.get("name", "")
+        return f"{key}\t{claude_row_digest(self.claude_analyzer, name, self.surrogate_digest)}"
+
+    def lookup(self, menus: list) -> list:
+        """メニューごとのキャッシュエントリ（{'score', 'reasons'}。ないメニューは None）"""
+        found = [self.entries.get(self.key(menu)) for menu in menus]
+        hits = sum(entry is not None for entry in found)
+        self.stats["hits"] += hits
+        self.stats["misses"] += len(menus) - hits
+        return found
+
+    def store(self, menus: list, scores, reasons: list):
+        """
+        モデルで評価したメニューのスコア・推薦理由を追加
+
+        評価の途中で Claude解析されたメニューは、解析後の結果のキーで保存する
+        """
+        self.stats["evaluated"] += len(menus)
+        for menu, score, menu_reasons in zip(menus, scores, reasons):
+            self.entries[self.key(menu)] = {"score": float(score), "reasons": list(menu_reasons)}
+        self.dirty = True
+
+    def save(self):
+        """追加があれば書き出す（一時ファイル経由で置き換え）"""
+        if not self.dirty:
+            return None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "schema_version": SCHEMA_VERSION,
+                "model_fingerprint": self.fingerprint,
+                "entries": self.entries,
+            }, f, ensure_ascii=False)
+        tmp.replace(self.path)
+        self.dirty = False
+        return self.path
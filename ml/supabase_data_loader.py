@@ -16,14 +16,18 @@ Supabaseデータローダー - 学習データを直接Supabaseから取得
 
 import os
 import json
+import importlib.util
 from datetime import datetime
 from typing import List, Dict, Any, Optional
-try:
-    from supabase import create_client, Client
-except ImportError:
+
+from instrumentation import count, traced
+
+# supabase クライアントは接続時に読み込む（ローカルのみの実行で起動を遅くしないため）。
+# パッケージの有無だけはインポート時に確認し、従来どおり ImportError を送出する。
+if importlib.util.find_spec("supabase") is None:
     print("❌ supabase-py パッケージがインストールされていません")
     print("   インストール: pip install supabase")
-    raise
+    raise ImportError("No module named 'supabase'")
 
 
 class SupabaseDataLoader:
@@ -35,13 +39,16 @@ class SupabaseDataLoader:
     
     def __init__(self):
         """Supabaseクライアントを初期化"""
+        from supabase import create_client
+
         try:
-            self.client: Client = create_client(self.SUPABASE_URL, self.SUPABASE_KEY)
+            self.client = create_client(self.SUPABASE_URL, self.SUPABASE_KEY)
             print("✅ Supabaseクライアント初期化完了")
         except Exception as e:
             print(f"❌ Supabase接続エラー: {e}")
             raise
     
+    @traced("supabase.get_meal_history")
     def get_meal_history(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Supabaseから食事履歴を取得
@@ -59,6 +66,7 @@ class SupabaseDataLoader:
                 query = query.limit(limit)
             
             response = query.execute()
+            count("supabase.queries")
             
             if response.data:
                 print(f"✅ {len(response.data)}件の食事履歴を取得しました")
@@ -71,6 +79,7 @@ class SupabaseDataLoader:
             print(f"❌ 食事履歴取得エラー: {e}")
             return []
     
+    @traced("supabase.get_training_data")
     def get_training_data(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         機械学習の学習データ形式で食事履歴を取得
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+セット最適化（select_best_menu_set）のパラメータ自動調整
+
+過去の日を本番と同じ方法でスコアリングして再生し、候補数（candidate_pool_size）・
+ビーム幅（beam_width）・品数の探索幅（count_window）・局所探索の有無（local_search）の
+組み合わせごとに次を記録する:
+
+    regret       各日の最良値（全設定中の最小誤差）に対する目的関数（_score_set の誤差）の差の平均
+    evaluations  1日あたりの _score_set 呼び出し回数
+    ms_mean/p95  1日あたりの所要時間
+
+regret と p95 所要時間のパレート最適な設定のうち、レイテンシ予算（--budget-ms）内で
+regret が最小のものを選び、モデルアーティファクトの manifest.json に "set_optimizer" として保存する。
+generate_ai_selections はこの設定でセット最適化を行う（再学習後も引き継がれる）。
+
+使い方:
+    python ml/tune_set_optimizer.py                    # 直近30日・予算 50ms/日
+    python ml/tune_set_optimizer.py --budget-ms 20 --days 60
+    python ml/tune_set_optimizer.py --local --dry-run  # ローカルの学習データで試す（保存しない）
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+ML_DIR = Path(__file__).parent
+sys.path.insert(0, str(ML_DIR))
+
+from instrumentation import collect
+
+RESULT_FILE = ML_DIR / "data" / "set_optimizer_tuning.json"
+DEFAULT_DAYS = 30
+DEFAULT_BUDGET_MS = 50.0
+POOL_SIZES = [12, 16, 20, 24]
+BEAM_WIDTHS = [5, 10, 20, 30, 50]
+COUNT_WINDOWS = [1, 2, 3]
+LOCAL_SEARCH = [True, False]
+
+
+def score_days(recommender, days: list) -> list:
+    """本番（generate_ai_selections_for_date）と同じ特徴量・モデルで各日の menu_scores を作る"""
+    from generate_ai_selections import _extract_nutrition_totals
+
+    menus = [
+        [{k: v for k, v in menu.items() if k != "selected"} for menu in day["allMenus"]]
+        for day in days
+    ]
+    flat = [menu for day_menus in menus for menu in day_menus]
+    X = recommender.scaler.transform(recommender.build_serving_features(flat))
+    scores = np.split(recommender.best_model.predict_proba(X)[:, 1],
+                      np.cumsum([len(day_menus) for day_menus in menus])[:-1])
+    scored_days = []
+    for day_menus, day_scores in zip(menus, scores):
+        menu_scores = [
+            {"name": menu.get("name", ""), "score": float(score),
+             "nutritionTotals": _extract_nutrition_totals(menu.get("nutrition", {}))}
+            for menu, score in zip(day_menus, day_scores)
+        ]
+        menu_scores.sort(key=lambda x: x["score"], reverse=True)
+        scored_days.append(menu_scores)
+    return scored_days
+
+
+def run_setting(scored_days: list, profile: dict, recommender, **params) -> dict:
+    """1つの設定で全日のセット最適化を実行"""
+    from generate_ai_selections import select_best_menu_set
+
+    errors, ms = [], []
+    with collect() as tracer:
+        for menu_scores in scored_days:
+            t0 = time.perf_counter()
+            _, evaluation = select_best_menu_set(menu_scores, profile, recommender, **params)
+            ms.append((time.perf_counter() - t0) * 1000)
+            errors.append(evaluation["error"] if evaluation else float("inf"))
+    return {
+        **params,
+        "errors": errors,
+        "evaluations": tracer.counters["set_search.evaluations"] / max(len(scored_days), 1),
+        "local_moves": tracer.counters["set_search.local_moves"] / max(len(scored_days), 1),
+        "local_evaluations": tracer.counters["set_search.local_evaluations"] / max(len(scored_days), 1),
+        "ms_mean": float(np.mean(ms)),
+        "ms_p95": float(np.percentile(ms, 95)),
+    }
+
+
+def pareto_front(results: list) -> list:
+    """regret と p95 所要時間のパレート最適な設定（所要時間の昇順）"""
+    front = []
+    for r in sorted(results, key=lambda r: (r["ms_p95"], r["regret"])):
+        if not front or r["regret"] < front[-1]["regret"]:
+            front.append(r)
+    return front
+
+
+def choose_setting(results: list, budget_ms: float):
+    """予算内で regret 最小（同じなら速い方）の設定。予算内になければ最速の設定"""
+    within = [r for r in results if r["ms_p95"] <= budget_ms]
+    if not within:
+        return min(results, key=lambda r: r["ms_p95"]), False
+    return min(within, key=lambda r: (r["regret"], r["ms_p95"])), True
+
+
+def local_search_gain(results: list) -> list:
+    """局所探索の有無だけが違う設定の組ごとの regret・所要時間の差（局所探索の効果）"""
+    without = {
+        (r["candidate_pool_size"], r["beam_width"], r["count_window"]): r
+        for r in results if not r["local_search"]
+    }
+    gains = []
+    for r in results:
+        base = without.get((r["candidate_pool_size"], r["beam_width"], r["count_window"]))
+        if r["local_search"] and base is not None:
+            gains.append({"with": r, "without": base,
+                          "regret_gain": base["regret"] - r["regret"],
+                          "ms_cost": r["ms_mean"] - base["ms_mean"]})
+    return gains
+
+
+def tune(recommender, days: list, profile: dict, pool_sizes=POOL_SIZES, beam_widths=BEAM_WIDTHS,
+         count_windows=COUNT_WINDOWS, budget_ms: float = DEFAULT_BUDGET_MS,
+         local_searches=LOCAL_SEARCH) -> dict:
+    """
+    設定の組み合わせを総当たりで評価し、予算内の最良設定を選ぶ
+
+    Returns:
+        {'chosen', 'within_budget', 'pareto', 'results', 'baseline', 'local_search_gain'}
+    """
+    from generate_ai_selections import DEFAULT_BEAM_WIDTH, DEFAULT_COUNT_WINDOW
+
+    scored_days = score_days(recommender, days)
+    grid = list(itertools.product(pool_sizes, beam_widths, count_windows, local_searches))
+    # 本番の既定値（候補数は平均品数から決定）も比較対象に含める
+    settings = [{"candidate_pool_size": None, "beam_width": DEFAULT_BEAM_WIDTH,
+                 "count_window": DEFAULT_COUNT_WINDOW, "local_search": ls} for ls in local_searches]
+    settings += [{"candidate_pool_size": p, "beam_width": b, "count_window": w, "local_search": ls}
+                 for p, b, w, ls in grid]
+
+    results = []
+    for i, params in enumerate(settings, 1):
+        results.append(run_setting(scored_days, profile, recommender, **params))
+        r = results[-1]
+        print(f"   [{i:3d}/{len(settings)}] pool={str(params['candidate_pool_size'] or '既定'):>4s} "
+              f"beam={params['beam_width']:3d} window={params['count_window']} "
+              f"ls={'on ' if params['local_search'] else 'off'} → {r['ms_mean']:7.1f}ms/日 (p95 {r['ms_p95']:7.1f}) {r['evaluations']:8.0f}回", flush=True)
+
+    best = np.min([r["errors"] for r in results], axis=0)
+    for r in results:
+        r["regret"] = float(np.mean(np.asarray(r.pop("errors")) - best))
+    chosen, within_budget = choose_setting(results, budget_ms)
+    return {
+        "chosen": chosen,
+        "within_budget": within_budget,
+        "pareto": pareto_front(results),
+        "results": results,
+        "baseline": results[0],
+        "local_search_gain": local_search_gain(results),
+    }
+
+
+def _print_setting(r: dict, mark: str = " "):
+    print(f" {mark} pool={str(r['candidate_pool_size'] or '既定'):>4s} beam={r['beam_width']:3d} "
+          f"window={r['count_window']} ls={'on ' if r['local_search'] else 'off'}  regret {r['regret']:.4f}  "
+          f"{r['ms_mean']:7.1f}ms/日 (p95 {r['ms_p95']:7.1f})  {r['evaluations']:8.0f}回")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="セット最適化のパラメータ自動調整")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help="再生する直近の日数")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="1日あたりの所要時間（p95）の予算")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=POOL_SIZES)
+    parser.add_argument("--beam-widths", type=int, nargs="+", default=BEAM_WIDTHS)
+    parser.add_argument("--count-windows", type=int, nargs="+", default=COUNT_WINDOWS)
+    parser.add_argument("--local-search", choices=["both", "on", "off"], default="both",
+                        help="局所探索あり・なしのどちらを評価するか（both なら効果も表示）")
+    parser.add_argument("--local", action="store_true", help="Supabaseではなく data/training_data.json を使う")
+    parser.add_argument("--dry-run", action="store_true", help="モデルの manifest.json に保存しない")
+    parser.add_argument("--output", type=str, default=str(RESULT_FILE), help="全設定の結果の JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    from generate_ai_selections import set_profile_from_days
+    from menu_recommender import MenuRecommender
+    from model_artifact import find_model_path, is_artifact, update_manifest
+
+    print("=" * 70)
+    print("🎛️  セット最適化のパラメータ自動調整")
+    print("=" * 70)
+
+    model_path = find_model_path()
+    if model_path is None:
+        print("✗ モデルが見つかりません。先に学習を実行してください（python ml/menu_recommender.py）")
+        return
+    recommender = MenuRecommender.load_model(model_path)
+    training_data = recommender.load_data(str(ML_DIR / "data" / "training_data.json"),
+                                          use_supabase=not args.local)
+    # 目標プロファイルは本番（build_historical_set_profile）と同じく直近120日から作る
+    profile = set_profile_from_days(training_data[-120:])
+    if profile is None:
+        print("✗ 選択履歴がないためセット目標を作れません")
+        return
+    days = training_data[-args.days:]
+    print(f"\n📅 {len(days)}日を再生（予算 p95 {args.budget_ms:.0f}ms/日）\n")
+
+    local_searches = {"both": LOCAL_SEARCH, "on": [True], "off": [False]}[args.local_search]
+    tuning = tune(recommender, days, profile, args.pool_sizes, args.beam_widths, args.count_windows,
+                  args.budget_ms, local_searches)
+    chosen = tuning["chosen"]
+
+    print("\n📈 パレート最適な設定（regret と p95 所要時間）:")
+    for r in tuning["pareto"]:
+        _print_setting(r, "→" if r is chosen else " ")
+    print("\n   本番の既定値:")
+    _print_setting(tuning["baseline"])
+    gains = tuning["local_search_gain"]
+    if gains:
+        default_gain = gains[0]
+        print("\n🔁 局所探索の効果（同じ設定で局所探索なしとの比較）:")
+        print(f"   本番の既定値: regret {default_gain['without']['regret']:.4f} → "
+              f"{default_gain['with']['regret']:.4f}、+{default_gain['ms_cost']:.2f}ms/日")
+        print(f"   全{len(gains)}設定の平均: regret -{np.mean([g['regret_gain'] for g in gains]):.4f}、"
+              f"+{np.mean([g['ms_cost'] for g in gains]):.2f}ms/日"
+              f"（改善した設定 {sum(g['regret_gain'] > 0 for g in gains)}/{len(gains)}）")
+    if not tuning["within_budget"]:
+        print(f"\n⚠️  予算 {args.budget_ms:.0f}ms 内の設定がないため、最速の設定を選びました")
+    print()
+    _print_setting(chosen, "✅")
+
+    output = {
+        "tuned_at": datetime.now().isoformat(timespec="seconds"),
+        "days": len(days),
+        "budget_ms": args.budget_ms,
+        **{k: v for k, v in tuning.items() if k not in ("baseline", "local_search_gain")},
+        "local_search_gain": [
+            {"candidate_pool_size": g["with"]["candidate_pool_size"], "beam_width": g["with"]["beam_width"],
+             "count_window": g["with"]["count_window"], "regret_gain": g["regret_gain"],
+             "ms_cost": g["ms_cost"]}
+            for g in tuning["local_search_gain"]
+        ],
+    }
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(output, f, ensure_ascii=False, indent=1)
+    print(f"\n✅ 全設定の結果を保存: {args.output}")
+
+    if args.dry_run:
+        return
+    if not is_artifact(model_path):
+        print("⚠️  旧形式（pickle）のモデルには保存できません。python ml/model_artifact.py で変換してください")
+        return
+    update_manifest(model_path, set_optimizer={
+        "beam_width": chosen["beam_width"],
+        "candidate_pool_size": chosen["candidate_pool_size"],
+        "count_window": chosen["count_window"],
+        "local_search": chosen["local_search"],
+        "regret": chosen["regret"],
+        "ms_p95": chosen["ms_p95"],
+        "budget_ms": args.budget_ms,
+        "days": len(days),
+        "tuned_at": output["tuned_at"],
+    })
+    print(f"✅ モデルに保存: {model_path}（generate_ai_selections で使用）")
+
+
+if __name__ == "__main__":
+    main()
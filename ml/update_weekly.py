@@ -25,8 +25,24 @@ AI推薦を再生成します。既存キャッシュを最大限活用するた
     # Claude解析は実行するが、モデル再学習をスキップ
     python ml/update_weekly.py --skip-retrain
 
+    # 差分再学習を使わず全データで再学習
+    python ml/update_weekly.py --full-retrain
+
+    # テキスト特徴量をハッシュ方式に切り替えて全体再学習
+    python ml/update_weekly.py --text-mode hashed
+
+    # 比較するモデルを指定（現在のモデルが含まれなければ全体再学習）
+    python ml/update_weekly.py --engines LogisticRegression HistGradientBoosting
+
+    # 段階別の所要時間・件数を計測（終了時にサマリー表示、ml/traces/ に JSON 出力）
+    KYOWA_TRACE=1 python ml/update_weekly.py
+
+    # プロファイラ下で実行（ml/profiles/ に .pstats とレポートを出力）
+    python ml/update_weekly.py --profile
+
 環境変数:
     ANTHROPIC_API_KEY: Claude API キー
+    KYOWA_TRACE: 設定すると段階別計測を有効化（instrumentation.py を参照）
 """
 
 import argparse
@@ -34,6 +50,7 @@ import json
 import math
 import os
 import sys
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -42,8 +59,13 @@ PROJECT_ROOT = Path(__file__).parent.parent
 ML_DIR = Path(__file__).parent
 sys.path.insert(0, str(ML_DIR))
 
+from instrumentation import traced
+from profiling import add_profile_arguments, run_main
+
 
 def parse_args():
+    from menu_recommender import MODEL_ENGINES
+
     parser = argparse.ArgumentParser(
         description="週次メニュー更新（新規メニューのみClaude解析）"
     )
@@ -69,11 +91,30 @@ def parse_args():
         action="store_true",
         help="Claude解析は実行するが、モデル再学習をスキップ",
     )
+    parser.add_argument(
+        "--full-retrain",
+        action="store_true",
+        help="差分再学習を使わず、全データでモデルを再学習",
+    )
+    parser.add_argument(
+        "--text-mode",
+        choices=["vocab", "hashed"],
+        default=None,
+        help="テキスト特徴量の方式。現在のモデルと異なる場合は全体再学習（未指定時は現在のモデルと同じ）",
+    )
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=MODEL_ENGINES,
+        default=None,
+        help="全体再学習で比較するモデル。現在のモデルが含まれない場合は全体再学習（未指定時は既定の候補）",
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
         help="実際のAPI呼び出しを行わず、処理対象メニューと推定コストのみ表示",
     )
+    add_profile_arguments(parser)
     return parser.parse_args()
 
 
@@ -137,6 +178,7 @@ def estimate_cost(new_menu_count: int) -> str:
     return f"${total:.4f} (約{num_batches}回のAPIコール)"
 
 
+@traced("step_analyze")
 def step_analyze(all_menus: list, new_menus: list):
     """Step: Claude 解析（新規メニューのみ）"""
     from claude_analyzer import ClaudeMenuAnalyzer
@@ -152,33 +194,128 @@ def step_analyze(all_menus: list, new_menus: list):
     analyzer.print_stats()
 
 
-def step_retrain():
-    """Step: モデル再学習"""
-    from menu_recommender import MenuRecommender, MenuFeatureExtractor  # noqa: F401 (pickle needs this)
+def _print_timings(title: str, timings: dict):
+    print(f"\n⏱️  {title}:")
+    for phase, sec in timings.items():
+        print(f"   {phase:20s}: {sec:7.2f}s")
+    print(f"   {'合計':20s}: {sum(timings.values()):7.2f}s")
+
+
+def _current_text_mode():
+    """現在の学習済みモデルのテキスト特徴量方式（モデルがなければ None）"""
+    from model_artifact import find_model_path, is_artifact, read_manifest
+
+    path = find_model_path()
+    if path is None:
+        return None
+    return read_manifest(path).get("text_mode", "vocab") if is_artifact(path) else "vocab"
+
+
+def _current_model_name():
+    """現在の学習済みモデルの採用モデル名（アーティファクトがなければ None）"""
+    from model_artifact import find_model_path, is_artifact, read_manifest
+
+    path = find_model_path()
+    if path is None or not is_artifact(path):
+        return None
+    return read_manifest(path).get("best_model_name")
+
+
+@traced("step_retrain")
+def step_retrain(full_retrain: bool = False, text_mode: str = None, engines: list = None):
+    """
+    Step: モデル再学習
+
+    既定では追加された日だけの差分再学習（incremental_training）を試み、
+    条件を満たさない場合や full_retrain=True の場合は全体を再学習する。
+    text_mode が現在のモデルと異なる場合や、engines に現在のモデルが含まれない場合も全体を再学習する
+    """
+    from menu_recommender import DEFAULT_TEXT_MODE, MenuRecommender, MenuFeatureExtractor  # noqa: F401 (pickle needs this)
+    from distilled_scorer import export_distilled
+    from incremental_training import incremental_retrain, save_training_state
+
+    current_mode = _current_text_mode()
+    text_mode = text_mode or current_mode or DEFAULT_TEXT_MODE
+    if current_mode is not None and text_mode != current_mode and not full_retrain:
+        print(f"ℹ️  テキスト特徴量の方式を変更するため全体再学習します: {current_mode} → {text_mode}")
+        full_retrain = True
+    current_model = _current_model_name()
+    if engines and current_model is not None and current_model not in engines and not full_retrain:
+        print(f"ℹ️  現在のモデル {current_model} が --engines に含まれないため全体再学習します")
+        full_retrain = True
+
+    if not full_retrain:
+        print("\n🤖 差分再学習を確認中...")
+        recommender, result = incremental_retrain()
+        if recommender is not None and result["mode"] == "unchanged":
+            print("✅ 新しい学習日がないため再学習をスキップ")
+            return
+        if recommender is not None:
+            timings = result["timings"]
+            print(f"   新しい日: {result['new_days']}日 / {result['new_rows']}行")
+            print(f"   語彙の変化: {result['vocab_change']:.1%} / 栄養素のずれ: {result['drift']:.2f}σ")
+            print(f"   更新前モデルの新しい日でのAUC-ROC: {result['holdout_auc']:.4f}")
+            print(f"   {recommender.best_model_name}: {result['detail']}")
+            t0 = time.perf_counter()
+            recommender.save_model()
+            save_training_state(recommender, incremental_rounds=result["incremental_rounds"])
+            export_distilled(recommender)
+            timings["save"] = time.perf_counter() - t0
+            _print_timings("差分再学習の所要時間", timings)
+            print(f"✅ 差分再学習・保存完了（連続 {result['incremental_rounds']} 回目）")
+            return
+        print(f"ℹ️  全体再学習に切り替えます: {result['reason']}")
 
     print("\n🤖 モデル再学習中...")
-    recommender = MenuRecommender()
+    timings = {}
+    t0 = time.perf_counter()
+    recommender = MenuRecommender(text_mode=text_mode)
     recommender.load_data()
+    timings["load_data"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
     recommender.prepare_features()
-    recommender.train_models()
+    timings["prepare_features"] = time.perf_counter() - t0
+
+    # 保存されるのは最良モデルのみなので、他の候補の最終学習は省略
+    t0 = time.perf_counter()
+    recommender.train_models(refit_all=False, engines=engines)
+    timings["train_models"] = time.perf_counter() - t0
+
     recommender.analyze_feature_importance()
+    t0 = time.perf_counter()
     recommender.save_model()
+    save_training_state(recommender)
+    timings["save_model"] = time.perf_counter() - t0
+
+    # 推論用の蒸留スコアラーも更新（generate_ai_selections --distilled 用）
+    t0 = time.perf_counter()
+    export_distilled(recommender)
+    timings["export_distilled"] = time.perf_counter() - t0
+
+    _print_timings("再学習の所要時間", timings)
     print("✅ モデル再学習・保存完了")
 
 
+@traced("step_regen")
 def step_regen(menu_files: list):
     """Step: 指定日付のAI推薦を再生成してSupabaseに保存"""
     from menu_recommender import MenuRecommender, MenuFeatureExtractor  # noqa: F401 (pickle needs this)
     from supabase_data_loader import SupabaseDataLoader
     from generate_ai_selections import generate_ai_selections_for_date, upload_to_supabase
 
-    model_path = ML_DIR / "model" / "menu_recommender.pkl"
-    if not model_path.exists():
+    from model_artifact import find_model_path
+    from score_cache import ScoreCache
+
+    model_path = find_model_path()
+    if model_path is None:
         print("❌ モデルが見つかりません。先に学習を実行してください")
         print("   python ml/menu_recommender.py")
         return
 
-    recommender = MenuRecommender.load_model(str(model_path))
+    recommender = MenuRecommender.load_model(model_path)
+    # 繰り返し登場する料理はモデルの評価を1回にする（再学習後はモデルの識別子が変わるので作り直し）
+    score_cache = ScoreCache.load(model_path, recommender)
 
     try:
         loader = SupabaseDataLoader()
@@ -193,13 +330,15 @@ def step_regen(menu_files: list):
         with open(menu_file, "r", encoding="utf-8") as f:
             menus_data = json.load(f)
 
-        result = generate_ai_selections_for_date(recommender, date_str, menus_data)
+        result = generate_ai_selections_for_date(recommender, date_str, menus_data, score_cache=score_cache)
         if result:
             generated += 1
             if upload_to_supabase(loader, result):
                 uploaded += 1
 
-    print(f"✅ {generated}日分の推薦を生成、{uploaded}日分をSupabaseに保存")
+    score_cache.save()
+    print(f"✅ {generated}日分の推薦を生成、{uploaded}日分をSupabaseに保存"
+          f"（モデル評価 {score_cache.stats['evaluated']}メニュー、キャッシュヒット {score_cache.stats['hits']}件）")
 
 
 def main():
@@ -262,7 +401,7 @@ def main():
 
     # Step 4: モデル再学習
     if not args.skip_retrain:
-        step_retrain()
+        step_retrain(full_retrain=args.full_retrain, text_mode=args.text_mode, engines=args.engines)
     else:
         print("\n⏩ --skip-retrain モード: 再学習をスキップ")
 
@@ -276,4 +415,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    run_main(main, "update_weekly")
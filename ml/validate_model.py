@@ -6,29 +6,233 @@
 - 過学習の有無を確認
 - 未来データへの汎化性能を測定
 - モデルの信頼性を評価
+
+既定では高速エンジン（fast_validation.py）で全日分の特徴量を1回だけ作り、各フォールドでは
+1モデルだけを学習してフォールドを並列に実行する。--full を付けると従来どおりフォールドごとに
+MenuRecommender を作り直し、prepare_features と train_models（モデル選択を含む）を実行する。
+
+どちらのエンジンでも、スコア上位「実際の選択数」件による評価に加えて、本番のセット最適化
+（generate_ai_selections.select_best_menu_set）で選んだセットの Jaccard・栄養素誤差と
+1日あたりの最適化時間を報告する。パラメータは本番と同じく学習済みモデルの manifest に保存された
+調整値（tune_set_optimizer.py）から始め、--beam-width / --pool-size で上書きして品質と速度の
+トレードオフを比較できる。
+
+使い方:
+    python ml/validate_model.py                      # 高速エンジン（学習済みモデルと同じモデル）
+    python ml/validate_model.py --model RandomForest --n-jobs 4
+    python ml/validate_model.py --full               # 従来方式
+    python ml/validate_model.py --beam-width 10 --pool-size 16
 """
 
 import json
+import time
 import numpy as np
-import pandas as pd
 from pathlib import Path
 from datetime import datetime
 import sys
 from collections import defaultdict
-import matplotlib.pyplot as plt
 import warnings
 warnings.filterwarnings('ignore')
 
 sys.path.insert(0, str(Path(__file__).parent))
 
-from menu_recommender import MenuRecommender
+from menu_recommender import MODEL_ENGINES, MenuRecommender
+from profiling import add_profile_arguments, run_main
+
+# 栄養素 RMSE の対象
+RMSE_NUTRITION_KEYS = ['エネルギー', 'たんぱく質', '脂質', '炭水化物']
+# NDCG の上位件数
+NDCG_K = 5
+
+
+def pad_day_arrays(test_data, day_scores):
+    """
+    評価日ごとの可変長データを「日 × メニュー」のパディング配列にまとめる
+
+    Returns:
+        scores (D, M): スコア（パディングは -inf）
+        selected (D, M): 実際に選択されたか
+        nutrition (D, M, len(RMSE_NUTRITION_KEYS)): メニューの栄養素（パディングは 0）
+    """
+    n_days = len(test_data)
+    width = max((len(day_data['allMenus']) for day_data in test_data), default=0)
+    scores = np.full((n_days, width), -np.inf)
+    selected = np.zeros((n_days, width), dtype=bool)
+    nutrition = np.zeros((n_days, width, len(RMSE_NUTRITION_KEYS)))
+    for d, (day_data, s) in enumerate(zip(test_data, day_scores)):
+        menus = day_data['allMenus']
+        scores[d, :len(menus)] = s
+        selected[d, :len(menus)] = [bool(m['selected']) for m in menus]
+        nutrition[d, :len(menus)] = [
+            [m.get('nutrition', {}).get(key, 0) or 0 for key in RMSE_NUTRITION_KEYS] for m in menus
+        ]
+    return scores, selected, nutrition
+
+
+def _set_metrics(test_data, selected, chosen, nutrition):
+    """実際の選択と予測セット（いずれも日 × メニューのマスク）の一致度・栄養素誤差"""
+    n_selected = selected.sum(axis=1)
+    n_chosen = chosen.sum(axis=1)
+    hits = (selected & chosen).sum(axis=1)
+    has_selected = n_selected > 0
+
+    menu_accuracy = hits.sum() / n_selected.sum() if n_selected.sum() > 0 else 0
+    jaccard = hits[has_selected] / (n_selected + n_chosen - hits)[has_selected]
+
+    # 予測セットの栄養素合計と実際の合計の RMSE
+    predicted_nutrition = (nutrition * chosen[:, :, None]).sum(axis=1)
+    actual = [day_data.get('totalNutrition') for day_data in test_data]
+    has_actual = np.array([bool(a) for a in actual], dtype=bool)
+    actual_nutrition = np.array([
+        [(a or {}).get(key, 0) or 0 for key in RMSE_NUTRITION_KEYS] for a in actual
+    ], dtype=float).reshape(len(actual), len(RMSE_NUTRITION_KEYS))
+    rmse = np.sqrt(np.mean((actual_nutrition - predicted_nutrition) ** 2, axis=1))[has_actual]
+
+    return {
+        'menu_accuracy': float(menu_accuracy),
+        'set_jaccard': float(jaccard.mean()) if len(jaccard) else 0.0,
+        'nutrition_rmse': float(rmse.mean()) if len(rmse) else 0.0,
+    }
+
+
+def evaluate_scores(test_data, day_scores, k=NDCG_K):
+    """
+    評価日ごとのスコアからメトリクスを一括計算
+
+    各日の予測セットはスコア上位「実際の選択数」件（同点は元の並び順）。
+    - menu_accuracy: 実際に選択されたメニューのうち予測セットに入った割合（全日合計）
+    - set_jaccard: 予測セットと実際のセットの Jaccard（選択のある日の平均）
+    - nutrition_rmse: 予測セットと実際の栄養素合計の RMSE（合計栄養素のある日の平均）
+    - ndcg: 選択を関連度 1 とした NDCG@k（選択のある日の平均）
+    - map: 選択を関連とした Average Precision の平均（選択のある日）
+    """
+    scores, selected, nutrition = pad_day_arrays(test_data, day_scores)
+    n_days, width = scores.shape
+    if n_days == 0 or width == 0:
+        return {'menu_accuracy': 0, 'set_jaccard': 0, 'nutrition_rmse': 0,
+                'ndcg': 0, 'map': 0, 'num_predictions': n_days}
+
+    # 順位（安定ソートなので同点は元の並び順。パディングは末尾）
+    order = np.argsort(-scores, axis=1, kind='stable')
+    ranked_selected = np.take_along_axis(selected, order, axis=1)
+    n_selected = selected.sum(axis=1)
+    has_selected = n_selected > 0
+    chosen = np.zeros_like(selected)
+    np.put_along_axis(chosen, order, np.arange(width)[None, :] < n_selected[:, None], axis=1)
+    metrics = _set_metrics(test_data, selected, chosen, nutrition)
+
+    # ランキング指標
+    discounts = 1.0 / np.log2(np.arange(2, width + 2))
+    top_k = min(k, width)
+    dcg = (ranked_selected[:, :top_k] * discounts[:top_k]).sum(axis=1)
+    ideal = np.cumsum(discounts[:top_k])[np.minimum(n_selected, top_k) - 1]
+    ndcg = dcg[has_selected] / ideal[has_selected]
+    precision_at_hit = np.cumsum(ranked_selected, axis=1) / np.arange(1, width + 1)
+    average_precision = ((precision_at_hit * ranked_selected).sum(axis=1)[has_selected]
+                         / n_selected[has_selected])
+
+    return {
+        **metrics,
+        'ndcg': float(ndcg.mean()) if len(ndcg) else 0.0,
+        'map': float(average_precision.mean()) if len(average_precision) else 0.0,
+        'num_predictions': n_days,
+    }
+
+
+def _optimize_days(days, profile, cooccurrence_analyzer, set_params):
+    """評価日ごとにセット最適化を実行（joblib のワーカーで実行される）"""
+    from generate_ai_selections import _extract_nutrition_totals, select_best_menu_set
+
+    # セット最適化が参照するのは共起分析だけ
+    recommender = MenuRecommender()
+    recommender.cooccurrence_analyzer = cooccurrence_analyzer
+    results = []
+    for menus, scores in days:
+        menu_scores = [
+            {'name': menu['name'], 'score': float(score),
+             'nutritionTotals': _extract_nutrition_totals(menu.get('nutrition', {}))}
+            for menu, score in zip(menus, scores)
+        ]
+        menu_scores.sort(key=lambda x: x['score'], reverse=True)
+        t0 = time.perf_counter()
+        chosen, _ = select_best_menu_set(menu_scores, profile, recommender, **set_params)
+        results.append(([menu['name'] for menu in chosen], (time.perf_counter() - t0) * 1000))
+    return results
+
+
+def evaluate_set_optimizer(train_data, test_data, day_scores, cooccurrence_analyzer,
+                           set_params=None, n_jobs=1):
+    """
+    本番のセット最適化（select_best_menu_set）で評価日のセットを選び、実際の選択と比較
+
+    目標プロファイルと共起は学習フォールドの日だけから作る。評価日は n_jobs 個に分けて並列に実行し、
+    1日あたりの最適化時間（ワーカー内で計測）も返す。
+
+    Args:
+        set_params: select_best_menu_set のキーワード引数（generate_ai_selections.SET_OPTIMIZER_PARAMS。
+                    省略したものは select_best_menu_set の既定値）
+
+    Returns:
+        メトリクス dict。セット最適化を読み込めない・プロファイルを作れない場合は None
+    """
+    try:
+        from generate_ai_selections import DEFAULT_BEAM_WIDTH, set_profile_from_days
+    except ImportError as e:
+        print(f"⚠️  セット最適化を読み込めないためセット単位の評価をスキップ: {e}")
+        return None
+    from joblib import Parallel, delayed, effective_n_jobs
+
+    profile = set_profile_from_days(train_data)
+    if profile is None or not test_data:
+        return None
+    set_params = {key: value for key, value in (set_params or {}).items() if value is not None}
+    days = [(day_data['allMenus'], s) for day_data, s in zip(test_data, day_scores)]
+    n_chunks = min(effective_n_jobs(n_jobs), len(days))
+    chunks = np.array_split(np.arange(len(days)), n_chunks)
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_optimize_days)([days[i] for i in chunk], profile, cooccurrence_analyzer, set_params)
+        for chunk in chunks
+    )
+    results = [r for chunk_results in results for r in chunk_results]
+
+    _, selected, nutrition = pad_day_arrays(test_data, day_scores)
+    chosen = np.zeros_like(selected)
+    for d, (day_data, (names, _)) in enumerate(zip(test_data, results)):
+        names = set(names)
+        chosen[d, :len(day_data['allMenus'])] = [m['name'] in names for m in day_data['allMenus']]
+    optimizer_ms = np.array([ms for _, ms in results])
+    return {
+        **_set_metrics(test_data, selected, chosen, nutrition),
+        'count_error': float(np.mean(np.abs(chosen.sum(axis=1) - selected.sum(axis=1)))),
+        'optimizer_ms_mean': float(optimizer_ms.mean()),
+        'optimizer_ms_p95': float(np.percentile(optimizer_ms, 95)),
+        'beam_width': set_params.get('beam_width', DEFAULT_BEAM_WIDTH),
+        'candidate_pool_size': set_params.get('candidate_pool_size'),
+        'set_params': set_params,
+        'num_days': len(results),
+    }
 
 
 class ValidationStrategy:
     """検証戦略クラス"""
     
-    def __init__(self):
+    def __init__(self, fast=True, model_name=None, n_jobs=-1, set_eval=True, set_params=None):
+        """
+        Args:
+            fast: True なら高速エンジン（特徴量を1回だけ作り、フォールドごとに1モデルを並列学習）
+            model_name: 高速エンジンで学習するモデル（省略時は学習済みモデルの採用モデル）
+            n_jobs: 高速エンジンのフォールド並列数・セット最適化の評価日並列数
+            set_eval: True なら本番のセット最適化でも評価する（evaluate_set_optimizer）
+            set_params: セット最適化のパラメータ（select_best_menu_set のキーワード引数。
+                        省略時は select_best_menu_set の既定値。main() は本番と同じ調整値を渡す）
+        """
         self.training_data = None
+        self.fast = fast
+        self.model_name = model_name
+        self.n_jobs = n_jobs
+        self.set_eval = set_eval
+        self.set_params = set_params or {}
+        self._feature_store = None
         self.results = {
             'time_series_split': {},
             'leave_future_out': [],
@@ -118,19 +322,9 @@ class ValidationStrategy:
         print(f"📚 学習データ: {len(train_data)}日分 ({train_data[0]['date']} ~ {train_data[-1]['date']})")
         print(f"🧪 検証データ: {len(test_data)}日分 ({test_data[0]['date']} ~ {test_data[-1]['date']})\n")
         
-        # モデルを学習
+        # モデルを学習して検証データで評価
         print("🤖 モデルを学習中...")
-        recommender = MenuRecommender()
-        
-        # 学習データをセット
-        recommender.training_data = train_data
-        recommender.prepare_features()
-        recommender.train_models()
-        
-        # 検証データで評価
-        print("\n🧪 検証データで評価中...\n")
-        
-        metrics = self._evaluate_on_data(recommender, test_data)
+        metrics = self._run_folds([(range(split_point), range(split_point, len(self.training_data)))])[0]
         
         self.results['time_series_split'] = {
             'train_size': len(train_data),
@@ -155,29 +349,24 @@ class ValidationStrategy:
         n_samples = len(self.training_data)
         fold_size = n_samples // (n_splits + 1)  # テスト用を確保
         
+        folds = []
         for fold in range(n_splits):
             train_size = (fold + 1) * fold_size
             test_start = train_size
             test_end = min(test_start + fold_size, n_samples)
-            
-            train_data = self.training_data[:train_size]
-            test_data = self.training_data[test_start:test_end]
-            
-            if len(test_data) == 0:
-                continue
+            if test_end > test_start:
+                folds.append((fold, range(train_size), range(test_start, test_end)))
+        
+        fold_metrics = self._run_folds([(train, test) for _, train, test in folds])
+        
+        for (fold, train, test), metrics in zip(folds, fold_metrics):
+            train_data = self.training_data[train.start:train.stop]
+            test_data = self.training_data[test.start:test.stop]
             
             print(f"\n📍 Fold {fold + 1}/{n_splits}:")
             print(f"   学習: {train_data[0]['date']} ~ {train_data[-1]['date']} ({len(train_data)}日)")
             print(f"   検証: {test_data[0]['date']} ~ {test_data[-1]['date']} ({len(test_data)}日)")
             
-            # モデルを学習
-            recommender = MenuRecommender()
-            recommender.training_data = train_data
-            recommender.prepare_features()
-            recommender.train_models()
-            
-            # 検証
-            metrics = self._evaluate_on_data(recommender, test_data)
             self.results['leave_future_out'].append({
                 'fold': fold + 1,
                 'train_size': len(train_data),
@@ -190,85 +379,52 @@ class ValidationStrategy:
             print(f"   ✅ Menu Accuracy: {metrics['menu_accuracy']:.1%}")
             print(f"   ✅ Set Jaccard: {metrics['set_jaccard']:.3f}")
             print(f"   ✅ Nutrition RMSE: {metrics['nutrition_rmse']:.2f}")
+            print(f"   ✅ NDCG@{NDCG_K}: {metrics['ndcg']:.3f} / MAP: {metrics['map']:.3f}")
+            if 'set_optimizer' in metrics:
+                self._print_set_metrics(metrics['set_optimizer'])
     
-    def _evaluate_on_data(self, recommender, test_data):
-        """テストデータで評価"""
-        menu_predictions = []  # 個別メニューの予測
-        set_predictions = []   # セットの予測
-        nutrition_predictions = []  # 栄養素の予測
-        
-        for day_data in test_data:
-            all_menus = day_data['allMenus']
-            selected_names = set(m['name'] for m in all_menus if m['selected'])
-            
-            # 個別メニューのスコアを予測
-            predictions = recommender.predict(all_menus)
-            pred_names = set(p['name'] for p in predictions[:len(selected_names)])
-            
-            # 個別メニュー精度
-            menu_predictions.append({
-                'actual': [m['name'] for m in all_menus if m['selected']],
-                'predicted': [p['name'] for p in predictions[:len(selected_names)]],
-                'scores': [p['score'] for p in predictions]
-            })
-            
-            # セット類似度（Jaccard）
-            if len(selected_names) > 0:
-                jaccard = len(selected_names & pred_names) / len(selected_names | pred_names)
-                set_predictions.append(jaccard)
-            
-            # 栄養素の誤差
-            actual_nutrition = day_data['totalNutrition']
-            if actual_nutrition:
-                # 予測栄養素を計算
-                pred_nutrition = {
-                    'エネルギー': 0,
-                    'たんぱく質': 0,
-                    '脂質': 0,
-                    '炭水化物': 0
-                }
-                
-                for pred in predictions[:len(selected_names)]:
-                    menu = next((m for m in all_menus if m['name'] == pred['name']), None)
-                    if menu:
-                        for key in pred_nutrition:
-                            pred_nutrition[key] += menu['nutrition'].get(key, 0)
-                
-                # RMSE計算
-                rmse = np.sqrt(np.mean([
-                    (actual_nutrition.get(key, 0) - pred_nutrition.get(key, 0)) ** 2
-                    for key in pred_nutrition.keys()
-                ]))
-                nutrition_predictions.append(rmse)
-        
-        # メトリクスを計算
-        menu_accuracy = self._calculate_menu_accuracy(menu_predictions)
-        set_jaccard = np.mean(set_predictions) if set_predictions else 0
-        nutrition_rmse = np.mean(nutrition_predictions) if nutrition_predictions else 0
-        
-        return {
-            'menu_accuracy': menu_accuracy,
-            'set_jaccard': set_jaccard,
-            'nutrition_rmse': nutrition_rmse,
-            'num_predictions': len(menu_predictions)
-        }
-    
-    def _calculate_menu_accuracy(self, predictions):
-        """個別メニューの予測精度を計算"""
-        correct = 0
-        total = 0
-        
-        for pred in predictions:
-            actual_set = set(pred['actual'])
-            pred_set = set(pred['predicted'][:len(pred['actual'])])
-            
-            # 各メニューについて評価
-            for menu in pred['actual']:
-                total += 1
-                if menu in pred_set:
-                    correct += 1
+    def _run_folds(self, folds):
+        """
+        フォールド [(学習日 range, 評価日 range)] ごとに学習・評価し、メトリクスのリストを返す
+        """
+        if self.fast:
+            from fast_validation import FoldFeatureStore, default_model_name, run_folds
+
+            if self._feature_store is None:
+                print("🔧 全日分の特徴量を構築中...")
+                self._feature_store = FoldFeatureStore(self.training_data)
+            model_name = self.model_name or default_model_name()
+            print(f"🤖 {model_name} を {len(folds)} フォールドで学習中（n_jobs={self.n_jobs}）...")
+            fold_days = [(np.arange(train.start, train.stop), np.arange(test.start, test.stop))
+                         for train, test in folds]
+            fold_scores = run_folds(self._feature_store, fold_days, model_name=model_name, n_jobs=self.n_jobs)
+            fold_cooccurrence = [self._feature_store.fold_cooccurrence(train) for train, _ in fold_days]
+        else:
+            fold_scores, fold_cooccurrence = [], []
+            for train, test in folds:
+                recommender = MenuRecommender()
+                recommender.training_data = self.training_data[train.start:train.stop]
+                recommender.prepare_features()
+                # 同じフォールドの再検証ではCVの結果を再利用する
+                recommender.train_models(use_cv_cache=True)
+                fold_scores.append(recommender.predict_scores_batch(
+                    [day_data['allMenus'] for day_data in self.training_data[test.start:test.stop]]
+                ))
+                fold_cooccurrence.append(recommender.cooccurrence_analyzer)
         
-        return correct / total if total > 0 else 0
+        fold_metrics = []
+        for (train, test), day_scores, cooccurrence in zip(folds, fold_scores, fold_cooccurrence):
+            test_data = self.training_data[test.start:test.stop]
+            metrics = evaluate_scores(test_data, day_scores)
+            if self.set_eval:
+                set_metrics = evaluate_set_optimizer(
+                    self.training_data[train.start:train.stop], test_data, day_scores, cooccurrence,
+                    set_params=self.set_params, n_jobs=self.n_jobs,
+                )
+                if set_metrics is not None:
+                    metrics['set_optimizer'] = set_metrics
+            fold_metrics.append(metrics)
+        return fold_metrics
     
     def _print_metrics(self, metrics, title):
         """メトリクスを表示"""
@@ -276,10 +432,25 @@ class ValidationStrategy:
         print(f"   ✅ 個別メニュー精度: {metrics['menu_accuracy']:.1%}")
         print(f"   ✅ セット類似度（Jaccard）: {metrics['set_jaccard']:.3f}")
         print(f"   ✅ 栄養素 RMSE: {metrics['nutrition_rmse']:.2f}")
+        print(f"   ✅ NDCG@{NDCG_K}: {metrics['ndcg']:.3f}")
+        print(f"   ✅ MAP: {metrics['map']:.3f}")
         print(f"   ✅ 評価サンプル数: {metrics['num_predictions']}")
+        if 'set_optimizer' in metrics:
+            self._print_set_metrics(metrics['set_optimizer'])
+    
+    def _print_set_metrics(self, set_metrics, indent="   "):
+        """セット最適化の評価結果を表示"""
+        print(f"{indent}🍱 セット最適化（beam={set_metrics['beam_width']}, "
+              f"pool={set_metrics['candidate_pool_size'] or '既定'}）: "
+              f"Jaccard {set_metrics['set_jaccard']:.3f} / 栄養素 RMSE {set_metrics['nutrition_rmse']:.2f} / "
+              f"品数誤差 {set_metrics['count_error']:.2f} / "
+              f"{set_metrics['optimizer_ms_mean']:.1f}ms/日 (p95 {set_metrics['optimizer_ms_p95']:.1f}ms)")
     
     def plot_results(self):
         """結果をグラフで表示"""
+        # matplotlib はグラフ描画時のみ読み込む
+        import matplotlib.pyplot as plt
+
         print("\n" + "=" * 70)
         print("📊 結果をグラフで可視化中...")
         print("=" * 70 + "\n")
@@ -353,13 +524,48 @@ class ValidationStrategy:
         print(f"✅ 結果を保存: {output_path}\n")
 
 
+def _production_set_params(**overrides):
+    """本番（generate_ai_selections）と同じセット最適化パラメータに、指定された値（None 以外）を上書き"""
+    try:
+        from generate_ai_selections import set_optimizer_params
+        from model_artifact import find_model_path
+        set_params = set_optimizer_params(find_model_path())
+    except ImportError:
+        set_params = {}
+    set_params.update({key: value for key, value in overrides.items() if value is not None})
+    if set_params:
+        print("✓ セット最適化パラメータ: " + ", ".join(f"{key}={value}" for key, value in set_params.items()))
+    return set_params
+
+
 def main():
     """メイン処理"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="時系列分割検証と Leave-Future-Out 交差検証")
+    parser.add_argument("--full", action="store_true",
+                        help="従来方式（フォールドごとに prepare_features と train_models を実行）")
+    parser.add_argument("--model", choices=MODEL_ENGINES, default=None,
+                        help="高速エンジンで学習するモデル（省略時は学習済みモデルの採用モデル）")
+    parser.add_argument("--n-jobs", type=int, default=-1,
+                        help="高速エンジンのフォールド並列数・セット最適化の評価日並列数")
+    parser.add_argument("--no-set-eval", action="store_true",
+                        help="本番のセット最適化（select_best_menu_set）による評価を行わない")
+    parser.add_argument("--beam-width", type=int, default=None,
+                        help="セット最適化のビーム幅（既定: 本番と同じく学習済みモデルの調整値、なければ既定値）")
+    parser.add_argument("--pool-size", type=int, default=None,
+                        help="セット最適化の候補数（既定: 本番と同じく学習済みモデルの調整値、なければ平均品数から決定）")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
     print("\n" + "=" * 70)
     print("🔍 検証スクリプト: 過学習と汎化性能の診断")
     print("=" * 70 + "\n")
     
-    validator = ValidationStrategy()
+    validator = ValidationStrategy(
+        fast=not args.full, model_name=args.model, n_jobs=args.n_jobs, set_eval=not args.no_set_eval,
+        set_params=_production_set_params(beam_width=args.beam_width, candidate_pool_size=args.pool_size),
+    )
     
     # データを読み込み
     validator.load_data_from_files()
@@ -402,4 +608,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    run_main(main, 'validate_model')
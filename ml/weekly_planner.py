@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+週間（複数日）のセット同時計画
+
+generate_ai_selections は日付ごとに独立してセットを最適化するため、スコアの高い同じ料理が
+毎日推薦されることがあり、1週間の栄養素合計も考慮されない。ここでは1週間の全日付のセットを
+まとめて選ぶ。目的関数は
+
+    Σ_日 _score_set の誤差
+    + 週間の栄養素誤差   Σ_k weekly_weight · w_k · |Σ_日 合計_k − 日数 · 目標_k| / (日数 · 目標_k)
+    + 重複ペナルティ     variety_penalty · Σ_料理 max(0, 週内の登場日数 − 1)
+
+（目標_k は build_historical_set_profile の1日あたり目標。k はエネルギー・P・F・C・野菜）。
+
+日をまたぐ項をラグランジュ緩和で日ごとの問題に分解して解く:
+
+1. 各日を従来どおり独立に最適化（select_best_menu_set と同じ。これが初期解）
+2. 週間の栄養素誤差は |x| = max_{|λ|≤w} λx と書けるので、乗数 λ_k を射影劣勾配法で更新し、
+   各料理に栄養素の「価格」Σ_k λ_k · 栄養素_k / (日数 · 目標_k) を付ける
+3. 重複ペナルティは他の日のセットを固定して、他の日に選ばれている料理に variety_penalty を付ける
+4. 価格を付けた各日の問題を前回のセットから局所探索（O(1) の差分評価）で解き直す
+5. 2〜4 を繰り返し、目的関数が最良の週間計画を返す
+
+2〜4 は局所探索だけなので、全体の所要時間は日ごとの独立最適化の 1〜2 倍程度に収まる。
+
+使い方:
+    python ml/generate_ai_selections.py --weekly
+"""
+
+import time
+from collections import Counter
+from datetime import date
+
+import numpy as np
+
+from generate_ai_selections import (
+    DEFAULT_BEAM_WIDTH,
+    DEFAULT_COUNT_WINDOW,
+    NUTRITION_ERROR_WEIGHTS,
+    TARGET_NUTRITION_KEYS,
+    _new_set_search,
+    _run_set_search,
+    _score_set,
+)
+from instrumentation import traced
+
+# 週間の栄養素誤差の重み（1日分の _score_set の栄養素誤差の重み 0.55 に対する相対値）
+DEFAULT_WEEKLY_WEIGHT = 0.55
+# 同じ料理が週内に2日目以降に登場するごとのペナルティ（_score_set の誤差と同じ単位）
+DEFAULT_VARIETY_PENALTY = 0.15
+DEFAULT_ITERATIONS = 10
+# 正規化した乗数（-1〜1）の劣勾配ステップ（反復 t では LAGRANGE_STEP / √t）
+LAGRANGE_STEP = 2.0
+
+
+def week_key(date_str):
+    """ISO 週（年, 週番号）。--weekly で日付をまとめる単位"""
+    return tuple(date.fromisoformat(date_str).isocalendar()[:2])
+
+
+def group_dates_by_week(date_strs):
+    """日付（YYYY-MM-DD）を ISO 週ごとにまとめる（週・日付とも昇順）"""
+    weeks = {}
+    for date_str in sorted(date_strs):
+        weeks.setdefault(week_key(date_str), []).append(date_str)
+    return [weeks[key] for key in sorted(weeks)]
+
+
+class _WeeklyObjective:
+    """週間計画の目的関数（各日の探索の候補インデックスで表した計画を評価）"""
+
+    def __init__(self, searches, profile, weekly_weight, variety_penalty):
+        self.searches = searches
+        self.variety_penalty = variety_penalty
+        n_days = len(searches)
+        target = np.array([profile['targetTotals'][key] for key in TARGET_NUTRITION_KEYS])
+        self.weekly_target = n_days * target
+        self.scale = n_days * np.maximum(target, 1.0)
+        self.weights = weekly_weight * np.array([NUTRITION_ERROR_WEIGHTS[key] for key in TARGET_NUTRITION_KEYS])
+
+    def totals(self, plan):
+        return sum(search.nutrition[indices].sum(axis=0) for search, indices in zip(self.searches, plan))
+
+    def deviation(self, plan):
+        """週間の栄養素合計の目標からの相対偏差（劣勾配）"""
+        return (self.totals(plan) - self.weekly_target) / self.scale
+
+    def names(self, plan):
+        return [[search.candidates[i]['name'] for i in indices] for search, indices in zip(self.searches, plan)]
+
+    def evaluate(self, plan):
+        """目的関数とその内訳"""
+        daily = [
+            _score_set([search.candidates[i] for i in indices], search.profile, search.recommender)['error']
+            for search, indices in zip(self.searches, plan)
+        ]
+        nutrition_error = float((self.weights * np.abs(self.deviation(plan))).sum())
+        day_counts = Counter(name for names in self.names(plan) for name in set(names))
+        repeats = sum(c - 1 for c in day_counts.values())
+        return {
+            'objective': float(sum(daily) + nutrition_error + self.variety_penalty * repeats),
+            'dailyError': float(sum(daily)),
+            'weeklyNutritionError': nutrition_error,
+            'repeatedMenus': int(repeats),
+        }
+
+
+@traced("plan_week")
+def plan_week(day_menu_scores, profile, recommender, variety_penalty=DEFAULT_VARIETY_PENALTY,
+              weekly_weight=DEFAULT_WEEKLY_WEIGHT, iterations=DEFAULT_ITERATIONS,
+              beam_width=DEFAULT_BEAM_WIDTH, candidate_pool_size=None, count_window=DEFAULT_COUNT_WINDOW,
+              time_budget_ms=None, local_search=True):
+    """
+    1週間分の日付のセットを同時に選ぶ（ラグランジュ緩和 + 日ごとの局所探索）
+
+    Args:
+        day_menu_scores: 日ごとの menu_scores（select_best_menu_set と同じ。スコア降順）
+        variety_penalty: 同じ料理が週内に2日目以降に登場するごとのペナルティ
+        weekly_weight: 週間の栄養素誤差の重み（0 なら重複ペナルティだけを考慮）
+        iterations: 乗数の更新と日ごとの解き直しの最大反復回数
+        beam_width 以降: 初期解（日ごとの独立最適化）の select_best_menu_set のパラメータ。
+            time_budget_ms は初期解では1日あたり、解き直しでは週全体で日数 × time_budget_ms
+
+    Returns:
+        (日ごとの (セットのメニュー, 評価) のリスト, 週間計画のサマリー)。
+        メニューのない日は ([], None)
+    """
+    start = time.perf_counter()
+    days = [d for d, menu_scores in enumerate(day_menu_scores) if menu_scores]
+    searches = [
+        _new_set_search(day_menu_scores[d], profile, recommender, candidate_pool_size, count_window,
+                        time_budget_ms)
+        for d in days
+    ]
+
+    # 1. 日ごとの独立最適化（初期解）
+    independent = [_run_set_search(search, beam_width, local_search) for search in searches]
+    plan = [sorted(search.best[0]) for search in searches]
+    for search in searches:
+        search.prepare_arrays()
+
+    objective = _WeeklyObjective(searches, profile, weekly_weight, variety_penalty)
+    independent_eval = objective.evaluate(plan)
+    best_plan, best_eval = [list(indices) for indices in plan], independent_eval
+    deadline = None if time_budget_ms is None else start + len(days) * time_budget_ms / 1000
+
+    multipliers = np.zeros(len(TARGET_NUTRITION_KEYS))  # 正規化した乗数（-1〜1）
+    n_iterations = 0
+    for t in range(1, iterations + 1):
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        # 2. 週間の栄養素誤差の乗数を射影劣勾配法で更新
+        previous = multipliers
+        multipliers = np.clip(multipliers + LAGRANGE_STEP / np.sqrt(t) * objective.deviation(plan), -1.0, 1.0)
+        prices = objective.weights * multipliers / objective.scale
+
+        changed = False
+        for d, search in enumerate(searches):
+            # 3. 他の日に選ばれている料理には重複ペナルティ
+            other_names = Counter(
+                name for e, names in enumerate(objective.names(plan)) if e != d for name in set(names)
+            )
+            costs = search.nutrition @ prices + variety_penalty * np.array(
+                [other_names[menu['name']] > 0 for menu in search.candidates], dtype=float
+            )
+            # 4. 価格付きの問題を前回のセットから局所探索で解き直す
+            remaining_ms = None if deadline is None else max((deadline - time.perf_counter()) * 1000, 0.0)
+            search.restart(plan[d], costs, remaining_ms)
+            search.local_search()
+            new_indices = sorted(search.best[0])
+            changed |= new_indices != plan[d]
+            plan[d] = new_indices
+        n_iterations = t
+
+        # 5. 目的関数が最良の計画を記録
+        evaluation = objective.evaluate(plan)
+        if evaluation['objective'] < best_eval['objective']:
+            best_plan, best_eval = [list(indices) for indices in plan], evaluation
+        if not changed and np.allclose(multipliers, previous):
+            break  # 乗数も計画も変わらない（これ以上の反復は同じ結果になる）
+
+    selections = [([], None)] * len(day_menu_scores)
+    for d, search, indices, (_, independent_evaluation) in zip(days, searches, best_plan, independent):
+        chosen = [search.candidates[i] for i in indices]
+        evaluation = _score_set(chosen, profile, recommender)
+        selections[d] = (chosen, {**evaluation, 'search': independent_evaluation['search']})
+
+    summary = {
+        'days': len(days),
+        'iterations': n_iterations,
+        'variety_penalty': variety_penalty,
+        'weekly_weight': weekly_weight,
+        **best_eval,
+        'independent': independent_eval,
+        'weeklyTotals': dict(zip(TARGET_NUTRITION_KEYS, objective.totals(best_plan).tolist())),
+        'weeklyTargets': dict(zip(TARGET_NUTRITION_KEYS, objective.weekly_target.tolist())),
+        'multipliers': dict(zip(TARGET_NUTRITION_KEYS, (objective.weights * multipliers).tolist())),
+        'elapsed_ms': (time.perf_counter() - start) * 1000,
+    }
+    return selections, summary